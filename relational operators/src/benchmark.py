@@ -0,0 +1,461 @@
+# Author: Gkovaris Christos-Grigorios
+
+
+
+# Importing required modules
+import os
+import sys
+import time
+import random
+import string
+import tempfile
+import block_io
+from block_io import BlockWriter, open_cursor, read_lines, read_pairs, write_lines
+from external_sort import parse_size, sorted_lines, external_sort
+from hash_operators import hash_join, hash_group_and_sum
+from parallel import parallel_group_and_sum
+from binary_format import tsv_to_binary
+from query_plan import run_plan
+from relational_operators import merge_join, union, intersection, set_difference, merge_all, group_and_sum, execute
+from relational_operators import intersection_stream, set_difference_stream
+
+
+
+# Writes a random unsorted relation with the same schema as R.tsv (2-character key, integer value)
+# A smaller number of distinct keys can be requested to simulate a dimension table
+def generate_relation(path, rows, seed=0, keys=None):
+    rng = random.Random(seed)
+    letters = string.ascii_lowercase
+    domain = [a + b for a in letters for b in letters][:keys]
+
+    with open(path, 'w') as f:
+        for _ in range(rows):
+            f.write(f"{rng.choice(domain)}\t{rng.randint(10, 99)}\n")
+
+
+
+# Times a function call and returns the elapsed seconds
+def timed(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+
+# Current approach: read every line into a Python list and sort it in memory
+def in_memory_sort(input_file):
+    with open(input_file, 'r') as f:
+        data = [line.strip() for line in f if line.strip()]
+
+    data.sort()
+    return len(data)
+
+
+
+# External merge sort with the given memory budget, consuming the sorted stream
+def external_merge_sort(input_file, memory_limit):
+    count = 0
+
+    for _ in sorted_lines(input_file, memory_limit):
+        count += 1
+
+    return count
+
+
+
+# Compares the in-memory sort with the external sort under several memory budgets
+def bench_sort(rows, budgets):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "R.tsv")
+        generate_relation(path, rows)
+
+        elapsed = timed(in_memory_sort, path)
+        print(f"in-memory sort:              {elapsed:.4f} s ({rows / elapsed:,.0f} rows/s)")
+
+        for budget in budgets:
+            elapsed = timed(external_merge_sort, path, budget)
+            print(f"external sort ({budget:>10} B): {elapsed:.4f} s ({rows / elapsed:,.0f} rows/s)")
+
+
+
+# Sort-based plan: external sort of both inputs followed by merge join
+def sort_merge_join(r_file, s_file, output_file, temp_dir):
+    r_sorted = os.path.join(temp_dir, "R_sorted.tsv")
+    s_sorted = os.path.join(temp_dir, "S_sorted.tsv")
+    external_sort(r_file, r_sorted)
+    external_sort(s_file, s_sorted)
+    merge_join(r_sorted, s_sorted, output_file)
+
+
+
+# Compares sort-merge and hash implementations of join (large R, small S) and group-by
+def bench_hash(rows, budgets):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        r_path = os.path.join(temp_dir, "R.tsv")
+        s_path = os.path.join(temp_dir, "S.tsv")
+        out_path = os.path.join(temp_dir, "out.tsv")
+        generate_relation(r_path, rows, seed=1)
+        generate_relation(s_path, max(1, rows // 1000), seed=2)
+
+        elapsed = timed(sort_merge_join, r_path, s_path, out_path, temp_dir)
+        print(f"sort-merge join:             {elapsed:.4f} s")
+
+        for budget in budgets:
+            elapsed = timed(hash_join, r_path, s_path, out_path, budget)
+            print(f"hash join ({budget:>10} B):     {elapsed:.4f} s")
+
+        elapsed = timed(group_and_sum, r_path, out_path)
+        print(f"sort-merge group-by:         {elapsed:.4f} s")
+
+        for budget in budgets:
+            elapsed = timed(hash_group_and_sum, r_path, out_path, budget)
+            print(f"hash group-by ({budget:>10} B): {elapsed:.4f} s")
+
+
+
+# Previous I/O pattern: one readline, strip and split per row and one write call per output tuple
+def per_row_copy(input_file, output_file):
+    with open(input_file, 'r') as f, open(output_file, 'w') as out:
+        line = f.readline().strip()
+
+        while line:
+            parts = line.split('\t')
+            out.write(f"{parts[0]}\t{int(parts[1])}\n")
+            line = f.readline().strip()
+
+
+
+# Block I/O pattern: large block reads with chunked parsing and batched output
+def block_copy(input_file, output_file):
+    with BlockWriter(output_file) as out:
+        for key, value in read_pairs(input_file):
+            out.write(f"{key}\t{value}\n")
+
+
+
+# Measures read/write throughput in rows/sec for both I/O patterns and for every operator
+def bench_io(rows):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        r_path = os.path.join(temp_dir, "R.tsv")
+        s_path = os.path.join(temp_dir, "S.tsv")
+        out_path = os.path.join(temp_dir, "out.tsv")
+        generate_relation(r_path, rows, seed=1)
+
+        # A smaller S keeps the join output proportional to the input size
+        s_rows = max(1, rows // 100)
+        generate_relation(s_path, s_rows, seed=2)
+
+        elapsed = timed(per_row_copy, r_path, out_path)
+        print(f"per-row readline/write copy: {rows / elapsed:>12,.0f} rows/s")
+
+        for use_mmap in (False, True):
+            block_io.USE_MMAP = use_mmap
+            elapsed = timed(block_copy, r_path, out_path)
+            print(f"block copy (mmap={use_mmap!s:<5}):    {rows / elapsed:>12,.0f} rows/s")
+
+        block_io.USE_MMAP = False
+
+        # Operators 1-4 need sorted inputs
+        external_sort(r_path, r_path + ".sorted")
+        external_sort(s_path, s_path + ".sorted")
+
+        for operator in (merge_join, union, intersection, set_difference):
+            elapsed = timed(operator, r_path + ".sorted", s_path + ".sorted", out_path)
+            print(f"{operator.__name__ + ':':<28} {(rows + s_rows) / elapsed:>12,.0f} input rows/s")
+
+        elapsed = timed(group_and_sum, r_path, out_path)
+        print(f"{'group_and_sum:':<28} {rows / elapsed:>12,.0f} input rows/s")
+
+
+
+# Runs operators 1-4 one after the other, scanning both inputs four times
+def separate_operators(r_file, s_file, temp_dir):
+    merge_join(r_file, s_file, os.path.join(temp_dir, "join.tsv"))
+    union(r_file, s_file, os.path.join(temp_dir, "union.tsv"))
+    intersection(r_file, s_file, os.path.join(temp_dir, "intersection.tsv"))
+    set_difference(r_file, s_file, os.path.join(temp_dir, "difference.tsv"))
+
+
+
+# Runs operators 1-4 fused into a single pass over both inputs
+def fused_operators(r_file, s_file, temp_dir):
+    merge_all(r_file, s_file, *[os.path.join(temp_dir, f"{name}.tsv") for name in ("join", "union", "intersection", "difference")])
+
+
+
+# Compares the four separate scans with the fused single-pass execution
+def bench_fused(rows):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        r_path = os.path.join(temp_dir, "R.tsv")
+        s_path = os.path.join(temp_dir, "S.tsv")
+        generate_relation(r_path, rows, seed=1)
+        generate_relation(s_path, max(1, rows // 100), seed=2)
+        external_sort(r_path, r_path + ".sorted")
+        external_sort(s_path, s_path + ".sorted")
+
+        elapsed = timed(separate_operators, r_path + ".sorted", s_path + ".sorted", temp_dir)
+        print(f"separate operators (4 scans): {elapsed:.4f} s")
+
+        elapsed = timed(fused_operators, r_path + ".sorted", s_path + ".sorted", temp_dir)
+        print(f"fused operators (1 scan):     {elapsed:.4f} s")
+
+
+
+# Compares the streaming operators with the NumPy columnar backend
+def bench_columnar(rows):
+    import columnar
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        r_path = os.path.join(temp_dir, "R.tsv")
+        s_path = os.path.join(temp_dir, "S.tsv")
+        out_path = os.path.join(temp_dir, "out.tsv")
+        generate_relation(r_path, rows, seed=1)
+        generate_relation(s_path, rows, seed=2)
+        external_sort(r_path, r_path + ".sorted")
+        external_sort(s_path, s_path + ".sorted")
+
+        pairs = [
+            (union, columnar.columnar_union),
+            (intersection, columnar.columnar_intersection),
+            (set_difference, columnar.columnar_difference),
+        ]
+
+        for streaming, vectorized in pairs:
+            elapsed = timed(streaming, r_path + ".sorted", s_path + ".sorted", out_path)
+            print(f"{streaming.__name__ + ':':<24} {elapsed:.4f} s")
+            # The columnar operators do not need sorted inputs
+            elapsed = timed(vectorized, r_path, s_path, out_path)
+            print(f"{vectorized.__name__ + ':':<24} {elapsed:.4f} s")
+
+        elapsed = timed(group_and_sum, r_path, out_path)
+        print(f"{'group_and_sum:':<24} {elapsed:.4f} s")
+        elapsed = timed(columnar.columnar_group_and_sum, r_path, out_path)
+        print(f"{'columnar_group_and_sum:':<24} {elapsed:.4f} s")
+
+
+
+# Measures how the partitioned parallel mode scales from 1 to max_workers worker processes
+def bench_parallel(rows, max_workers):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        r_path = os.path.join(temp_dir, "R.tsv")
+        s_path = os.path.join(temp_dir, "S.tsv")
+        out_path = os.path.join(temp_dir, "out.tsv")
+        generate_relation(r_path, rows, seed=1)
+        generate_relation(s_path, max(1, rows // 100), seed=2)
+        files = [r_path + ".sorted", s_path + ".sorted"]
+        external_sort(r_path, files[0])
+        external_sort(s_path, files[1])
+
+        print(f"{'workers':>7} {'join':>9} {'union':>9} {'inter':>9} {'diff':>9} {'groupby':>9}")
+
+        for workers in range(1, max_workers + 1):
+            times = [timed(execute, operator, files, [out_path], workers) for operator in (merge_join, union, intersection, set_difference)]
+
+            if workers > 1:
+                times.append(timed(parallel_group_and_sum, r_path, out_path, workers))
+
+            else:
+                times.append(timed(group_and_sum, r_path, out_path))
+
+            print(f"{workers:>7} " + " ".join(f"{elapsed:>8.3f}s" for elapsed in times))
+
+
+
+# Writes a sorted relation in which one hot key holds `hot` of the rows
+# The remaining rows use 4-character keys, so they rarely match
+def generate_skewed(path, rows, hot, seed=0):
+    rng = random.Random(seed)
+    lines = [f"hk\t{rng.randint(10, 99)}" for _ in range(hot)]
+    lines += [f"{''.join(rng.choices(string.ascii_lowercase, k=4))}\t{rng.randint(10, 99)}" for _ in range(rows - hot)]
+    lines.sort()
+
+    with open(path, 'w') as f:
+        f.writelines(f"{line}\n" for line in lines)
+
+
+
+# Joins a relation with a single hot key against itself with several spill thresholds
+# and reports time, peak traced memory and the join buffer statistics
+def bench_skew(rows, hot, thresholds):
+    import json
+    import tracemalloc
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        r_path = os.path.join(temp_dir, "R.tsv")
+        s_path = os.path.join(temp_dir, "S.tsv")
+        out_path = os.path.join(temp_dir, "out.tsv")
+        generate_skewed(r_path, rows, 20, seed=1)
+        generate_skewed(s_path, rows, hot, seed=2)
+
+        for threshold in thresholds:
+            start = time.perf_counter()
+            stats = merge_join(r_path, s_path, out_path, threshold)
+            elapsed = time.perf_counter() - start
+
+            # Memory is traced in a second run, tracing slows the join down considerably
+            tracemalloc.start()
+            merge_join(r_path, s_path, out_path, threshold)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"threshold {threshold:>10}: {elapsed:.4f} s, peak {peak / 1024 / 1024:8.2f} MB, {json.dumps(stats)}")
+
+
+
+# Consumes all (key, value) pairs of an input
+def scan_pairs(input_file):
+    for _ in read_pairs(input_file):
+        pass
+
+
+
+# Compares the operators on TSV inputs with the same inputs converted once to the binary relation format
+def bench_binary(rows):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        r_path = os.path.join(temp_dir, "R.tsv")
+        s_path = os.path.join(temp_dir, "S.tsv")
+        out_path = os.path.join(temp_dir, "out.tsv")
+        generate_relation(r_path, rows, seed=1)
+        s_rows = max(1, rows // 100)
+        generate_relation(s_path, s_rows, seed=2)
+        external_sort(r_path, r_path + ".sorted")
+        external_sort(s_path, s_path + ".sorted")
+
+        elapsed = timed(tsv_to_binary, r_path + ".sorted", r_path + ".rbin")
+        tsv_to_binary(s_path + ".sorted", s_path + ".rbin")
+        print(f"{'conversion to binary:':<28} {rows / elapsed:>12,.0f} rows/s")
+
+        for extension in (".sorted", ".rbin"):
+            print(f"inputs {extension}: {os.path.getsize(r_path + extension):,} bytes")
+            elapsed = timed(scan_pairs, r_path + extension)
+            print(f"{'  read_pairs:':<28} {rows / elapsed:>12,.0f} rows/s")
+
+            for operator in (merge_join, union, intersection, set_difference):
+                elapsed = timed(operator, r_path + extension, s_path + extension, out_path)
+                print(f"{'  ' + operator.__name__ + ':':<28} {(rows + s_rows) / elapsed:>12,.0f} input rows/s")
+
+            elapsed = timed(group_and_sum, r_path + extension, out_path)
+            print(f"{'  group_and_sum:':<28} {rows / elapsed:>12,.0f} input rows/s")
+
+
+
+# Join followed by Group-By with the join result materialized in a file and read back
+def materialized_join_groupby(r_file, s_file, temp_dir):
+    join_file = os.path.join(temp_dir, "join.tsv")
+    merge_join(r_file, s_file, join_file)
+
+    # Sum the S.B column of the join result
+    with open(join_file, 'r') as f, open(join_file + ".projected", 'w') as out:
+        for line in f:
+            parts = line.split('\t')
+            out.write(f"{parts[0]}\t{parts[2]}")
+
+    group_and_sum(join_file + ".projected", os.path.join(temp_dir, "groupby.tsv"))
+
+
+
+# Compares join -> group-by and union -> difference through intermediate files with the pipelined plan executor
+def bench_pipeline(rows):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        r_path = os.path.join(temp_dir, "R.tsv")
+        s_path = os.path.join(temp_dir, "S.tsv")
+        t_path = os.path.join(temp_dir, "T.tsv")
+        out_path = os.path.join(temp_dir, "out.tsv")
+        generate_relation(r_path, rows, seed=1)
+        generate_relation(s_path, max(1, rows // 100), seed=2)
+        generate_relation(t_path, rows, seed=3)
+
+        for path in (r_path, s_path, t_path):
+            external_sort(path, path + ".sorted")
+
+        r_path, s_path, t_path = r_path + ".sorted", s_path + ".sorted", t_path + ".sorted"
+
+        elapsed = timed(materialized_join_groupby, r_path, s_path, temp_dir)
+        print(f"{'join -> group-by (files):':<34} {elapsed:.4f} s")
+        plan = {"op": "groupby", "column": 2, "input": {"op": "join", "inputs": [r_path, s_path]}}
+        elapsed = timed(run_plan, plan, out_path)
+        print(f"{'join -> group-by (pipelined):':<34} {elapsed:.4f} s")
+
+        union_file = os.path.join(temp_dir, "union.tsv")
+        start = time.perf_counter()
+        union(r_path, s_path, union_file)
+        set_difference(union_file, t_path, out_path)
+        print(f"{'union -> difference (files):':<34} {time.perf_counter() - start:.4f} s")
+        plan = {"op": "difference", "inputs": [{"op": "union", "inputs": [r_path, s_path]}, t_path]}
+        elapsed = timed(run_plan, plan, out_path)
+        print(f"{'union -> difference (pipelined):':<34} {elapsed:.4f} s")
+
+
+
+# Intersection and difference of a small sorted relation with a large one, with and without the sparse index
+def bench_skip(rows):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        large_path = os.path.join(temp_dir, "large.tsv")
+        small_path = os.path.join(temp_dir, "small.tsv")
+        out_path = os.path.join(temp_dir, "out.tsv")
+
+        # The small relation uses 4-character keys, so it matches only a few short ranges of the large one
+        rng = random.Random(3)
+        letters = string.ascii_lowercase
+
+        with open(large_path, 'w') as f:
+            f.write("".join(sorted(f"{''.join(rng.choices(letters, k=4))}\t{rng.randint(10, 99)}\n" for _ in range(rows))))
+
+        with open(small_path, 'w') as f:
+            f.write("".join(sorted(f"{''.join(rng.choices(letters, k=4))}\t{rng.randint(10, 99)}\n" for _ in range(100))))
+
+        for name, stream, r_path, s_path in (
+            ("intersection(small, large)", intersection_stream, small_path, large_path),
+            ("difference(small, large)", set_difference_stream, small_path, large_path),
+        ):
+            # Sequential scan of both inputs
+            elapsed = timed(write_lines, out_path, stream(read_lines(r_path), read_lines(s_path)))
+            print(f"{name + ' scan:':<38} {elapsed:.4f} s")
+
+            with open_cursor(r_path) as r, open_cursor(s_path) as s:
+                elapsed = timed(write_lines, out_path, stream(r, s))
+                print(f"{name + ' indexed:':<38} {elapsed:.4f} s, {s.blocks_skipped} of {s.blocks} blocks skipped")
+
+
+
+# MAIN function
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python benchmark.py <sort|hash|io|fused|numpy|parallel|skew|binary|pipeline|skip> <rows> [memory_limit ... | max_workers | spill_threshold ...]")
+        sys.exit(1)
+
+    experiment, rows = sys.argv[1], int(sys.argv[2])
+
+    budgets = [parse_size(arg) for arg in sys.argv[3:] if experiment not in ("parallel", "skew")] or [parse_size("1M"), parse_size("16M"), parse_size("256M")]
+
+    if experiment == "sort":
+        bench_sort(rows, budgets)
+
+    elif experiment == "hash":
+        bench_hash(rows, budgets)
+
+    elif experiment == "io":
+        bench_io(rows)
+
+    elif experiment == "fused":
+        bench_fused(rows)
+
+    elif experiment == "numpy":
+        bench_columnar(rows)
+
+    elif experiment == "skew":
+        bench_skew(rows, rows // 2, [int(arg) for arg in sys.argv[3:]] or [10 ** 9, 100000, 10000])
+
+    elif experiment == "binary":
+        bench_binary(rows)
+
+    elif experiment == "pipeline":
+        bench_pipeline(rows)
+
+    elif experiment == "skip":
+        bench_skip(rows)
+
+    elif experiment == "parallel":
+        bench_parallel(rows, int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count())
+
+    else:
+        print(f"Unknown experiment: {experiment}")
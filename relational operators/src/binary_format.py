@@ -0,0 +1,292 @@
+# Author: Gkovaris Christos-Grigorios
+
+
+
+# Importing required modules
+import sys
+import struct
+from array import array
+from itertools import chain
+
+
+
+# File layout (all integers little-endian):
+#   file header:  magic "RBIN\x01", number of value columns (uint16)
+#   every block:  rows (uint32), payload size (uint32), key code width (uint8),
+#                 length of the min key (uint16), length of the max key (uint16), min key, max key,
+#                 payload = dictionary size (uint32), dictionary (keys separated by "\n"),
+#                           key codes (rows x code width), value columns (columns x rows x int64)
+# The min/max keys in the block headers let readers skip whole blocks without decoding them
+MAGIC = b"RBIN\x01"
+FILE_HEADER = struct.Struct("<5sH")
+BLOCK_HEADER = struct.Struct("<IIBHH")
+
+# Extension of binary relation files
+EXTENSION = ".rbin"
+
+# Default number of rows stored in one block
+DEFAULT_BLOCK_ROWS = 65536
+
+# Array type codes of the key codes for each code width
+CODE_TYPES = {1: 'B', 2: 'H', 4: 'I'}
+
+
+
+# Checks whether a file is in the binary relation format
+def is_binary(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+
+    except OSError:
+        return False
+
+
+
+# Packs an array in little-endian byte order
+def to_bytes(values):
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+
+    return values.tobytes()
+
+
+
+# Unpacks a little-endian byte string into an array
+def from_bytes(typecode, data):
+    values = array(typecode)
+    values.frombytes(data)
+
+    if sys.byteorder != "little":
+        values.byteswap()
+
+    return values
+
+
+
+# Encodes one block of rows (key, value_1, ..., value_n) into its header and payload
+def encode_block(rows, columns):
+    dictionary = {}
+    codes = [dictionary.setdefault(row[0], len(dictionary)) for row in rows]
+    keys = list(dictionary)
+
+    width = 1 if len(keys) <= 0xFF else 2 if len(keys) <= 0xFFFF else 4
+    blob = "\n".join(keys).encode()
+    payload = [struct.pack("<I", len(blob)), blob, to_bytes(array(CODE_TYPES[width], codes))]
+
+    for column in range(1, columns + 1):
+        payload.append(to_bytes(array('q', [row[column] for row in rows])))
+
+    payload = b"".join(payload)
+    min_key, max_key = min(keys).encode(), max(keys).encode()
+    header = BLOCK_HEADER.pack(len(rows), len(payload), width, len(min_key), len(max_key))
+    return header + min_key + max_key + payload
+
+
+
+# Writes rows (key, value_1, ..., value_n) to a binary relation file
+def write_binary_rows(path, rows, columns=1, block_rows=DEFAULT_BLOCK_ROWS):
+    with BinaryWriter(path, columns, block_rows) as out:
+        out.write_rows(rows)
+
+
+
+# Reads the file header of a binary relation file and returns its number of value columns
+def read_file_header(f, path):
+    magic, columns = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a binary relation file")
+
+    return columns
+
+
+
+# Reads the next block header and returns (rows, payload size, key code width, min key, max key),
+# or None at the end of the file; the file is left at the start of the payload
+def read_block_header(f):
+    header = f.read(BLOCK_HEADER.size)
+
+    if not header:
+        return None
+
+    rows, payload_size, width, min_length, max_length = BLOCK_HEADER.unpack(header)
+    block_min = f.read(min_length).decode()
+    block_max = f.read(max_length).decode()
+    return rows, payload_size, width, block_min, block_max
+
+
+
+# Decodes the payload of one block into (keys, value columns)
+def decode_block(payload, rows, width, columns):
+    blob_size = struct.unpack_from("<I", payload)[0]
+    dictionary = payload[4:4 + blob_size].decode().split("\n")
+    position = 4 + blob_size
+
+    codes = from_bytes(CODE_TYPES[width], payload[position:position + rows * width])
+    position += rows * width
+
+    values = []
+
+    for _ in range(columns):
+        values.append(from_bytes('q', payload[position:position + rows * 8]))
+        position += rows * 8
+
+    return list(map(dictionary.__getitem__, codes)), values
+
+
+
+# Yields the decoded blocks of a binary relation file as (keys, value columns)
+# Blocks whose key range lies outside [min_key, max_key] are skipped without being decoded
+def read_binary_blocks(path, min_key=None, max_key=None):
+    with open(path, 'rb') as f:
+        columns = read_file_header(f, path)
+
+        while True:
+            header = read_block_header(f)
+
+            if header is None:
+                break
+
+            rows, payload_size, width, block_min, block_max = header
+
+            # Zone-map check on the block key range
+            if (min_key is not None and block_max < min_key) or (max_key is not None and block_min > max_key):
+                f.seek(payload_size, 1)
+                continue
+
+            yield decode_block(f.read(payload_size), rows, width, columns)
+
+
+
+# Returns an iterator over the rows (key, value_1, ..., value_n) of a binary relation file
+def read_binary_rows(path, min_key=None, max_key=None):
+    return chain.from_iterable(zip(keys, *values) for keys, values in read_binary_blocks(path, min_key, max_key))
+
+
+
+# Returns an iterator over the rows of a binary relation file formatted as TSV lines (without newline)
+def read_binary_lines(path, min_key=None, max_key=None):
+    return chain.from_iterable(map(format_block, read_binary_blocks(path, min_key, max_key)))
+
+
+
+# Formats one decoded block as TSV lines (the common two-column case uses a faster f-string path)
+def format_block(block):
+    keys, values = block
+
+    if len(values) == 1:
+        return [f"{key}\t{value}" for key, value in zip(keys, values[0])]
+
+    return ["\t".join(map(str, row)) for row in zip(keys, *values)]
+
+
+
+# Writer of binary relation files
+# Rows can be added directly with write_rows or as TSV lines through write/writelines,
+# so the relational operators can use it in place of a text writer
+class BinaryWriter:
+    def __init__(self, path, columns=None, block_rows=DEFAULT_BLOCK_ROWS):
+        self.file = open(path, 'wb')
+        self.columns = columns
+        self.block_rows = block_rows
+        self.pending_rows = []
+        self.pending_text = []
+        self.pending_lines = 0
+
+        if columns is not None:
+            self.file.write(FILE_HEADER.pack(MAGIC, columns))
+
+    # Adds rows (key, value_1, ..., value_n)
+    def write_rows(self, rows):
+        for row in rows:
+            if self.columns is None:
+                self.columns = len(row) - 1
+                self.file.write(FILE_HEADER.pack(MAGIC, self.columns))
+
+            self.pending_rows.append(row)
+
+            if len(self.pending_rows) >= self.block_rows:
+                self.flush_rows()
+
+    # Adds TSV text (one or more newline-terminated lines); text is parsed once every block_rows lines
+    def write(self, text):
+        self.pending_text.append(text)
+        self.pending_lines += text.count("\n")
+
+        if self.pending_lines >= self.block_rows:
+            self.flush_text()
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    # Parses the pending TSV text into rows
+    def flush_text(self):
+        if self.pending_text:
+            lines = "".join(self.pending_text).splitlines()
+            self.pending_text = []
+            self.pending_lines = 0
+            self.write_rows(
+                (parts[0], *map(int, parts[1:])) for parts in (line.split('\t') for line in lines if line)
+            )
+
+    # Encodes the pending rows as one block
+    def flush_rows(self):
+        if self.pending_rows:
+            self.file.write(encode_block(self.pending_rows, self.columns))
+            self.pending_rows = []
+
+    def close(self):
+        self.flush_text()
+        self.flush_rows()
+
+        # Empty relations still get a file header
+        if self.columns is None:
+            self.file.write(FILE_HEADER.pack(MAGIC, 1))
+
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+
+# Converts a TSV relation (key followed by integer columns) into a binary relation file
+def tsv_to_binary(tsv_file, binary_file, block_rows=DEFAULT_BLOCK_ROWS):
+    from block_io import read_lines
+
+    with BinaryWriter(binary_file, block_rows=block_rows) as out:
+        # Malformed lines (a single field) are skipped
+        out.write_rows(
+            (parts[0], *map(int, parts[1:])) for parts in (line.split('\t') for line in read_lines(tsv_file)) if len(parts) >= 2
+        )
+
+
+
+# Converts a binary relation file back into TSV, optionally keeping only the blocks of a key range
+def binary_to_tsv(binary_file, tsv_file, min_key=None, max_key=None):
+    from block_io import BlockWriter
+
+    with BlockWriter(tsv_file) as out:
+        for keys, values in read_binary_blocks(binary_file, min_key, max_key):
+            out.writelines([f"{line}\n" for line in format_block((keys, values))])
+
+
+
+# MAIN function
+if __name__ == "__main__":
+    if len(sys.argv) < 4 or sys.argv[1] not in ("encode", "decode"):
+        print("Usage: python binary_format.py encode <tsv_file> <rbin_file> | decode <rbin_file> <tsv_file> [min_key max_key]")
+        sys.exit(1)
+
+    if sys.argv[1] == "encode":
+        tsv_to_binary(sys.argv[2], sys.argv[3])
+
+    else:
+        bounds = sys.argv[4:6] if len(sys.argv) >= 6 else [None, None]
+        binary_to_tsv(sys.argv[2], sys.argv[3], *bounds)
@@ -0,0 +1,566 @@
+# Author: Gkovaris Christos-Grigorios
+
+
+
+# Importing required modules
+import os
+import mmap
+import tempfile
+from bisect import bisect_left
+from itertools import chain, islice
+from binary_format import EXTENSION, BinaryWriter, is_binary, read_binary_lines, read_binary_rows, \
+    read_file_header, read_block_header, decode_block, format_block
+
+
+
+# Size (in bytes) of one block read from an input file
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+
+# Number of output lines collected before they are handed to the file in one writelines call
+DEFAULT_BATCH_SIZE = 8192
+
+# Whether input files are read through a memory map instead of buffered read calls
+USE_MMAP = False
+
+# Size (in bytes) of one block of the sparse index of a sorted file
+DEFAULT_INDEX_BLOCK_SIZE = 64 * 1024
+
+
+
+# Splits an input source into (path, start, end)
+# A source is either a file path or a (path, start, end) byte range of a file (end=None reads to the end)
+def input_range(source):
+    if isinstance(source, tuple):
+        return source
+
+    return source, 0, None
+
+
+
+# Yields large text blocks of an input source, each one ending on a line boundary
+# The file is read either with buffered read calls or through a memory map
+def read_blocks(source, buffer_size=None, use_mmap=None):
+    path, start, end = input_range(source)
+    buffer_size = buffer_size or DEFAULT_BUFFER_SIZE
+    use_mmap = USE_MMAP if use_mmap is None else use_mmap
+    tail = b""
+
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        remaining = (size if end is None else min(end, size)) - start
+
+        # Empty files cannot be memory mapped
+        if use_mmap and size > 0:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            mapped.seek(start)
+
+        else:
+            mapped = None
+            f.seek(start)
+
+        try:
+            while remaining > 0:
+                count = min(buffer_size, remaining)
+                block = mapped.read(count) if mapped is not None else f.read(count)
+
+                if not block:
+                    break
+
+                remaining -= len(block)
+
+                # Keep the incomplete last line for the next block
+                cut = block.rfind(b"\n") + 1
+
+                if cut == 0:
+                    tail += block
+                    continue
+
+                yield (tail + block[:cut]).decode()
+                tail = block[cut:]
+
+        finally:
+            if mapped is not None:
+                mapped.close()
+
+    if tail:
+        yield tail.decode()
+
+
+
+# Returns the offset of the first line that starts at or after pos
+def line_start(f, pos):
+    if pos == 0:
+        return 0
+
+    f.seek(pos - 1)
+    f.readline()
+    return f.tell()
+
+
+
+# Checks whether an input source is a binary relation file (byte ranges are only supported for TSV files)
+def binary_source(source):
+    if isinstance(source, tuple):
+        if is_binary(source[0]):
+            raise ValueError("byte ranges are not supported for binary relation files")
+
+        return False
+
+    return is_binary(source)
+
+
+
+# Splits one block into its non-empty lines (both \n and \r\n line endings are accepted)
+def split_block(block):
+    return list(filter(None, block.splitlines()))
+
+
+
+# Returns an iterator over the non-empty lines of an input source
+# Lines are split a block at a time and handed out by a C-level iterator chain
+def read_lines(source, buffer_size=None, use_mmap=None):
+    if binary_source(source):
+        return read_binary_lines(source)
+
+    return chain.from_iterable(map(split_block, read_blocks(source, buffer_size, use_mmap)))
+
+
+
+# Yields the (key, value) pairs of an input source, skipping malformed lines
+# Lines are parsed straight from the blocks to avoid a second generator layer
+def read_pairs(source, buffer_size=None, use_mmap=None):
+    # Binary relations are already decoded, no text parsing is needed
+    if binary_source(source):
+        yield from read_binary_rows(source)
+        return
+
+    for block in read_blocks(source, buffer_size, use_mmap):
+        for line in block.split("\n"):
+            parts = line.strip().split('\t')
+
+            if len(parts) >= 2:
+                yield parts[0], int(parts[1])
+
+
+
+# Output writer with a large buffer that writes batches of lines as single preformatted strings
+# Single lines go straight to the buffered file, which avoids a Python-level call per output tuple
+class BlockWriter:
+    def __init__(self, path, buffer_size=None, batch_size=DEFAULT_BATCH_SIZE):
+        self.file = open(path, 'w', buffering=buffer_size or DEFAULT_BUFFER_SIZE)
+        self.batch_size = batch_size
+
+        # Adds one preformatted line (including its newline)
+        self.write = self.file.write
+
+    # Adds several preformatted lines, joining them batch by batch into one write call
+    def writelines(self, lines):
+        if isinstance(lines, list):
+            self.file.write("".join(lines))
+            return
+
+        lines = iter(lines)
+
+        while True:
+            chunk = list(islice(lines, self.batch_size))
+
+            if not chunk:
+                break
+
+            self.file.write("".join(chunk))
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+
+# Buffer of integer values that keeps at most `threshold` values in memory and spills the rest to disk
+# The values are handed out as text blocks "v1\nv2\n...\nvk" that can be re-read any number of times
+class SpillBuffer:
+    def __init__(self, threshold, temp_dir=None):
+        self.threshold = threshold
+        self.temp_dir = temp_dir
+        self.values = []
+        self.spill_file = None
+        self.spilled = 0
+        self.text = None
+
+    def __len__(self):
+        return self.spilled + len(self.values)
+
+    # Adds one value, spilling the in-memory part once it reaches the threshold
+    def append(self, value):
+        self.values.append(value)
+        self.text = None
+
+        if len(self.values) >= self.threshold:
+            self.spill()
+
+    # Appends the in-memory values to the spill file
+    def spill(self):
+        if self.spill_file is None:
+            fd, self.spill_file = tempfile.mkstemp(suffix=".spill", dir=self.temp_dir)
+            os.close(fd)
+
+        with open(self.spill_file, 'a') as f:
+            f.write("\n".join(map(str, self.values)) + "\n")
+
+        self.spilled += len(self.values)
+        self.values = []
+
+    # Yields the buffered values as newline-separated text blocks (without a trailing newline)
+    def blocks(self):
+        if self.spill_file is not None:
+            for block in read_blocks(self.spill_file):
+                yield block[:-1] if block.endswith("\n") else block
+
+        if self.values:
+            # The in-memory part is formatted once and reused by every caller
+            if self.text is None:
+                self.text = "\n".join(map(str, self.values))
+
+            yield self.text
+
+    # Empties the buffer and removes its spill file
+    def clear(self):
+        if self.spill_file is not None:
+            os.remove(self.spill_file)
+            self.spill_file = None
+
+        self.values = []
+        self.spilled = 0
+        self.text = None
+
+
+
+# Opens the writer matching the output file: binary relation files for the .rbin extension, TSV otherwise
+def open_writer(path):
+    if path.endswith(EXTENSION):
+        return BinaryWriter(path)
+
+    return BlockWriter(path)
+
+
+
+# Writes an iterator of lines (without newlines) to the output file, one batch per write call
+def write_lines(path, lines, batch_size=DEFAULT_BATCH_SIZE):
+    lines = iter(lines)
+
+    with open_writer(path) as out:
+        while True:
+            chunk = list(islice(lines, batch_size))
+
+            if not chunk:
+                break
+
+            out.write("\n".join(chunk) + "\n")
+
+
+
+# Cursor over an iterator of sorted lines
+# `line` is the current line ('' once the input is exhausted); seek moves forward to the first line >= target
+class LineCursor:
+    def __init__(self, lines):
+        self.lines = iter(lines)
+        self.line = next(self.lines, '')
+
+    # Moves to the next line and returns it
+    def advance(self):
+        self.line = next(self.lines, '')
+        return self.line
+
+    # Moves to the first line >= target and returns it
+    def seek(self, target):
+        line = self.line
+
+        while line and line < target:
+            line = next(self.lines, '')
+
+        self.line = line
+        return line
+
+    # Returns the current line and the following lines below target (all of them for an empty target)
+    # and moves past them
+    def take_below(self, target):
+        taken = []
+        line = self.line
+
+        while line and (not target or line < target):
+            taken.append(line)
+            line = next(self.lines, '')
+
+        self.line = line
+        return taken
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+
+# Cursor over a sorted TSV file (or byte range of one) with a sparse index of the file
+# The index holds the first line of every index block (about DEFAULT_INDEX_BLOCK_SIZE bytes, aligned to line starts)
+# and is filled lazily, one seek per probed block; seek gallops over the index and jumps past
+# whole ranges of lines below the target instead of reading them, then bisects inside the loaded block
+class IndexedLineCursor:
+    def __init__(self, source, block_size=None):
+        path, self.start, end = input_range(source)
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        self.end = size if end is None else min(end, size)
+        self.block_size = block_size or DEFAULT_INDEX_BLOCK_SIZE
+        self.blocks = max(1, -(-(self.end - self.start) // self.block_size))
+
+        # Sparse index: block number -> (offset of its first line, first line)
+        self.index = {}
+
+        # Loaded lines, position of the current line and offset of the next unread byte
+        self.lines = []
+        self.pos = 0
+        self.offset = self.start
+        self.blocks_skipped = 0
+        self.line = self.load(self.start)
+
+    # Returns the (offset, first line) entry of an index block; the first line is None past the end of the input
+    def entry(self, block):
+        entry = self.index.get(block)
+
+        if entry is None:
+            offset = max(line_start(self.file, self.start + block * self.block_size), self.start)
+            line = None
+
+            if offset < self.end:
+                self.file.seek(offset)
+                line = self.file.readline().rstrip(b"\r\n").decode()
+
+            entry = self.index[block] = (offset, line)
+
+        return entry
+
+    # Reads the lines of one index block starting at offset (at least one complete line)
+    def load(self, offset):
+        while offset < self.end:
+            self.file.seek(offset)
+            data = self.file.read(min(self.block_size, self.end - offset))
+
+            # Extend to the end of the last line that starts in the block
+            if offset + len(data) < self.end and not data.endswith(b"\n"):
+                data += self.file.readline()
+
+            offset += len(data)
+            self.lines = split_block(data.decode())
+            self.pos = 0
+
+            if self.lines:
+                self.offset = offset
+                return self.lines[0]
+
+        self.offset = self.end
+        self.lines = []
+        self.pos = 0
+        return ''
+
+    # Moves to the next line and returns it
+    def advance(self):
+        self.pos += 1
+
+        if self.pos < len(self.lines):
+            self.line = self.lines[self.pos]
+
+        else:
+            self.line = self.load(self.offset)
+
+        return self.line
+
+    # Moves to the first line >= target and returns it
+    def seek(self, target):
+        lines = self.lines
+
+        while lines:
+            # The target lies inside the loaded lines: bisect them
+            if lines[-1] >= target:
+                self.pos = bisect_left(lines, target, self.pos)
+                self.line = lines[self.pos]
+                return self.line
+
+            # Gallop over the index blocks after the loaded lines for the last block starting below the target
+            current = (self.offset - self.start) // self.block_size
+            low, step = current, 1
+
+            while low + step < self.blocks:
+                line = self.entry(low + step)[1]
+
+                if line is None or line >= target:
+                    break
+
+                low += step
+                step *= 2
+
+            high = min(low + step, self.blocks)
+
+            while high - low > 1:
+                middle = (low + high) // 2
+                line = self.entry(middle)[1]
+
+                if line is None or line >= target:
+                    high = middle
+
+                else:
+                    low = middle
+
+            # Jump only forward; lines equal to the target may start inside block `low`
+            offset = max(self.offset, self.entry(low)[0]) if low > current else self.offset
+            self.blocks_skipped += max(0, low - current - 1)
+
+            if not self.load(offset):
+                break
+
+            lines = self.lines
+
+        self.line = ''
+        return ''
+
+    # Returns the current line and the following loaded lines below target (all of them for an empty target)
+    # and moves past them; at most one loaded block is returned per call
+    def take_below(self, target):
+        lines = self.lines
+        end = bisect_left(lines, target, self.pos) if target else len(lines)
+        taken = lines[self.pos:end]
+
+        if end < len(lines):
+            self.pos = end
+            self.line = lines[end]
+
+        else:
+            self.line = self.load(self.offset)
+
+        return taken
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+
+# Cursor over a sorted binary relation file that uses the min/max keys of the block headers as a zone map
+# seek jumps over the payload of every block whose largest key is below the key of the target without
+# decoding it, so only the blocks that can hold lines >= target are read; inside a block it bisects
+class BinaryLineCursor:
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.columns = read_file_header(self.file, path)
+        self.lines = []
+        self.pos = 0
+        self.blocks_skipped = 0
+        self.line = self.load()
+
+    # Decodes the next block, skipping the blocks whose keys are all below target_key
+    # Returns its first line ('' once the file is exhausted)
+    def load(self, target_key=None):
+        while True:
+            header = read_block_header(self.file)
+
+            if header is None:
+                self.lines = []
+                self.pos = 0
+                return ''
+
+            rows, payload_size, width, _, block_max = header
+
+            # Zone-map check: every line of the block sorts before the target
+            if target_key is not None and block_max < target_key:
+                self.file.seek(payload_size, 1)
+                self.blocks_skipped += 1
+                continue
+
+            self.lines = format_block(decode_block(self.file.read(payload_size), rows, width, self.columns))
+            self.pos = 0
+
+            if self.lines:
+                return self.lines[0]
+
+    # Moves to the next line and returns it
+    def advance(self):
+        self.pos += 1
+
+        if self.pos < len(self.lines):
+            self.line = self.lines[self.pos]
+
+        else:
+            self.line = self.load()
+
+        return self.line
+
+    # Moves to the first line >= target and returns it
+    def seek(self, target):
+        lines = self.lines
+
+        while lines:
+            # The target lies inside the decoded block: bisect it
+            if lines[-1] >= target:
+                self.pos = bisect_left(lines, target, self.pos)
+                self.line = lines[self.pos]
+                return self.line
+
+            # A line sorts before the target when its key does: skip the blocks with smaller keys only
+            if not self.load(target.partition('\t')[0]):
+                break
+
+            lines = self.lines
+
+        self.line = ''
+        return ''
+
+    # Returns the current line and the following decoded lines below target (all of them for an empty target)
+    # and moves past them; at most one block is returned per call
+    def take_below(self, target):
+        lines = self.lines
+        end = bisect_left(lines, target, self.pos) if target else len(lines)
+        taken = lines[self.pos:end]
+
+        if end < len(lines):
+            self.pos = end
+            self.line = lines[end]
+
+        else:
+            self.line = self.load()
+
+        return taken
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+
+# Opens a seekable cursor over a sorted input source: indexed for TSV files, zone-mapped for binary relation files
+# Iterators of lines (e.g. operator streams) are wrapped as they are
+def open_cursor(source):
+    if not isinstance(source, (str, tuple)):
+        return source if isinstance(source, (LineCursor, IndexedLineCursor, BinaryLineCursor)) else LineCursor(source)
+
+    if binary_source(source):
+        return BinaryLineCursor(source)
+
+    return IndexedLineCursor(source)
@@ -0,0 +1,124 @@
+# Author: Gkovaris Christos-Grigorios
+
+
+
+# Importing required modules
+import csv
+import numpy as np
+import pandas as pd
+from block_io import open_writer
+from binary_format import is_binary, read_binary_blocks
+
+
+
+# Loads the two columns of a TSV relation into NumPy arrays using the C parser of pandas
+# Returns the keys as an object array of strings and the values as an int64 array
+# Malformed lines (missing or extra fields) are skipped
+def load_columns(input_file, value_type=None):
+    # Binary relation files already store the values as int64 columns
+    if is_binary(input_file):
+        blocks = list(read_binary_blocks(input_file))
+        keys = np.array([key for block_keys, _ in blocks for key in block_keys], dtype=object)
+        values = np.concatenate([np.frombuffer(columns[0], dtype='<i8') for _, columns in blocks] or [np.empty(0, np.int64)])
+        return keys, values.astype(np.int64)
+
+    types = {"A": object, "B": value_type} if value_type else {"A": object}
+    frame = pd.read_csv(
+        input_file, sep='\t', header=None, names=["A", "B"], dtype=types,
+        engine='c', quoting=csv.QUOTE_NONE, keep_default_na=False, na_values={"B": [""]},
+        on_bad_lines='skip',
+    )
+
+    # Lines without a value make the column non-integer; re-read them with a nullable integer type
+    if frame["B"].dtype != np.int64:
+        if value_type is None:
+            return load_columns(input_file, "Int64")
+
+        frame = frame.dropna(subset=["B"])
+
+    return frame["A"].to_numpy(dtype=object), frame["B"].to_numpy(dtype=np.int64)
+
+
+
+# Writes (key, value) columns as TSV lines to the output file
+def write_columns(keys, values, output_file):
+    with open_writer(output_file) as out:
+        out.writelines([f"{key}\t{value}\n" for key, value in zip(keys.tolist(), values.tolist())])
+
+
+
+# Encodes the rows of both relations as int64 codes of one shared, sorted dictionary
+# Keys are factorized in sorted order and values are ranked by their text, so comparing
+# codes is the same as comparing the TSV lines "A<tab>B" of the streaming operators
+def encode_rows(r_file, s_file):
+    r_keys, r_values = load_columns(r_file)
+    s_keys, s_values = load_columns(s_file)
+
+    key_codes, key_dictionary = pd.factorize(np.concatenate([r_keys, s_keys]), sort=True)
+    value_dictionary, value_codes = np.unique(np.concatenate([r_values, s_values]), return_inverse=True)
+
+    # Rank of every distinct value in text order
+    text_order = np.argsort(value_dictionary.astype(str), kind='stable')
+    value_rank = np.empty_like(text_order)
+    value_rank[text_order] = np.arange(len(text_order))
+
+    width = max(len(value_dictionary), 1)
+    codes = key_codes.astype(np.int64) * width + value_rank[value_codes.reshape(-1)]
+
+    # Decoder from a code back to its key and value
+    def decode(row_codes):
+        return np.asarray(key_dictionary, dtype=object)[row_codes // width], value_dictionary[text_order[row_codes % width]]
+
+    return np.unique(codes[:len(r_keys)]), np.unique(codes[len(r_keys):]), decode
+
+
+
+# Returns a mask marking the entries of the sorted codes a that also appear in the sorted codes b
+def member_mask(a, b):
+    if len(b) == 0:
+        return np.zeros(len(a), dtype=bool)
+
+    positions = np.searchsorted(b, a)
+    positions[positions == len(b)] = 0
+    return b[positions] == a
+
+
+
+# Union (Columnar)
+def columnar_union(r_file, s_file, output_file):
+    r_codes, s_codes, decode = encode_rows(r_file, s_file)
+    write_columns(*decode(np.union1d(r_codes, s_codes)), output_file)
+
+
+
+# Intersection (Columnar)
+def columnar_intersection(r_file, s_file, output_file):
+    r_codes, s_codes, decode = encode_rows(r_file, s_file)
+    write_columns(*decode(r_codes[member_mask(r_codes, s_codes)]), output_file)
+
+
+
+# Difference (Columnar)
+def columnar_difference(r_file, s_file, output_file):
+    r_codes, s_codes, decode = encode_rows(r_file, s_file)
+    write_columns(*decode(r_codes[~member_mask(r_codes, s_codes)]), output_file)
+
+
+
+# Group By (Columnar)
+# Keys are factorized to sorted integer codes and the values of each code are summed with np.add.reduceat
+def columnar_group_and_sum(input_file, output_file):
+    keys, values = load_columns(input_file)
+
+    if len(keys) == 0:
+        write_columns(keys, values, output_file)
+        return
+
+    codes, groups = pd.factorize(keys, sort=True)
+
+    # Bring the values of each group together and find where each group starts
+    order = np.argsort(codes, kind='stable')
+    starts = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(groups)))[:-1]])
+    sums = np.add.reduceat(values[order], starts)
+
+    write_columns(np.asarray(groups, dtype=object), sums, output_file)
@@ -0,0 +1,153 @@
+# Author: Gkovaris Christos-Grigorios
+
+
+
+# Importing required modules
+import os
+import sys
+import heapq
+import tempfile
+from block_io import open_writer, read_lines
+
+
+
+# Default memory budget (in bytes) for a single in-memory run
+DEFAULT_MEMORY_LIMIT = 64 * 1024 * 1024
+
+# Default number of runs merged together in one merge pass
+DEFAULT_FAN_IN = 16
+
+
+
+# Parses a memory size such as 512K, 64M or 2G into a number of bytes
+def parse_size(text):
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    text = text.strip().upper()
+
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+
+    return int(text)
+
+
+
+# Writes one sorted run to a new temporary file and returns its path
+def write_run(lines, temp_dir):
+    fd, path = tempfile.mkstemp(suffix=".run", dir=temp_dir)
+
+    with os.fdopen(fd, 'w') as run:
+        run.writelines(lines)
+
+    return path
+
+
+
+# Reads the input file (or an iterator of lines) and splits it into sorted runs that fit in the memory budget
+# Lines are kept newline-terminated so that runs can be merged without re-stripping
+# Returns the list of spilled run files, or the last in-memory run if nothing was spilled
+def generate_runs(input_file, temp_dir, memory_limit=DEFAULT_MEMORY_LIMIT):
+    runs = []
+    buffer = []
+    used = 0
+
+    # Empty lines are already skipped by the block reader
+    for line in read_lines(input_file) if isinstance(input_file, (str, tuple)) else input_file:
+        line += "\n"
+        buffer.append(line)
+
+        # String object plus its slot in the list
+        used += sys.getsizeof(line) + 8
+
+        # Spill the current run once the budget is exhausted
+        if used >= memory_limit:
+            buffer.sort()
+            runs.append(write_run(buffer, temp_dir))
+            buffer = []
+            used = 0
+
+    buffer.sort()
+
+    # The whole input fitted in memory, no run has to touch the disk
+    if not runs:
+        return [], buffer
+
+    if buffer:
+        runs.append(write_run(buffer, temp_dir))
+
+    return runs, []
+
+
+
+# Merges up to fan_in run files into a single new run file
+def merge_pass(run_files, temp_dir):
+    files = [open(path, 'r') for path in run_files]
+
+    try:
+        fd, path = tempfile.mkstemp(suffix=".run", dir=temp_dir)
+
+        with os.fdopen(fd, 'w') as out:
+            out.writelines(heapq.merge(*files))
+
+    finally:
+        for f in files:
+            f.close()
+
+        for run in run_files:
+            os.remove(run)
+
+    return path
+
+
+
+# Yields the lines of input_file (or of an iterator of lines) in sorted order (without trailing newline)
+# Uses bounded-memory run generation followed by k-way heap merging of the runs
+# Intermediate merge passes are performed while there are more runs than fan_in
+def sorted_lines(input_file, memory_limit=DEFAULT_MEMORY_LIMIT, fan_in=DEFAULT_FAN_IN, temp_dir=None):
+    if fan_in < 2:
+        raise ValueError("fan_in must be at least 2")
+
+    with tempfile.TemporaryDirectory(dir=temp_dir) as work_dir:
+        runs, in_memory = generate_runs(input_file, work_dir, memory_limit)
+
+        # Nothing was spilled, stream directly from memory
+        if not runs:
+            for line in in_memory:
+                yield line[:-1]
+
+            return
+
+        # Reduce the number of runs until a single final merge is possible
+        while len(runs) > fan_in:
+            runs = [merge_pass(runs[i:i + fan_in], work_dir) for i in range(0, len(runs), fan_in)]
+
+        # Final merge streams straight to the consumer
+        files = [open(path, 'r') for path in runs]
+
+        try:
+            for line in heapq.merge(*files):
+                yield line[:-1]
+
+        finally:
+            for f in files:
+                f.close()
+
+
+
+# Sorts input_file into output_file using the external merge sort
+def external_sort(input_file, output_file, memory_limit=DEFAULT_MEMORY_LIMIT, fan_in=DEFAULT_FAN_IN, temp_dir=None):
+    with open_writer(output_file) as out:
+        for line in sorted_lines(input_file, memory_limit, fan_in, temp_dir):
+            out.write(f"{line}\n")
+
+
+
+# MAIN function
+if __name__ == "__main__":
+    if len(sys.argv) not in (3, 4, 5):
+        print("Usage: python external_sort.py <input_file> <output_file> [memory_limit] [fan_in]")
+        sys.exit(1)
+
+    memory = parse_size(sys.argv[3]) if len(sys.argv) > 3 else DEFAULT_MEMORY_LIMIT
+    fan = int(sys.argv[4]) if len(sys.argv) > 4 else DEFAULT_FAN_IN
+
+    external_sort(sys.argv[1], sys.argv[2], memory, fan)
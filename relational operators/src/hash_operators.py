@@ -0,0 +1,200 @@
+# Author: Gkovaris Christos-Grigorios
+
+
+
+# Importing required modules
+import os
+import sys
+import zlib
+import heapq
+import tempfile
+from block_io import BlockWriter, open_writer, read_lines, read_pairs
+from external_sort import DEFAULT_MEMORY_LIMIT
+
+
+
+# Number of partitions created when a hash table does not fit in the memory budget
+DEFAULT_PARTITIONS = 16
+
+# Maximum number of recursive re-partitioning steps before giving up on the memory budget
+# (a single key larger than the budget can never be split further)
+MAX_DEPTH = 4
+
+
+
+# Assigns a key to one of the partitions
+# The depth is used as salt so that each recursion level splits the keys differently
+def partition_of(key, partitions, depth):
+    return zlib.crc32(key.encode(), depth) % partitions
+
+
+
+# Yields the (key, value) pairs of the Group-By input, skipping malformed lines
+# Only lines with exactly two columns are aggregated, as in group_and_sum
+def read_group_pairs(input_file):
+    for line in read_lines(input_file):
+        parts = line.split('\t')
+
+        if len(parts) == 2:
+            yield parts[0], int(parts[1])
+
+
+
+# Writes the rows of input_file, read as (key, value) pairs by reader, into hash partitions and returns the partition paths
+def partition_file(input_file, temp_dir, prefix, partitions, depth, reader=read_pairs):
+    paths = []
+    outputs = []
+
+    for _ in range(partitions):
+        fd, path = tempfile.mkstemp(prefix=prefix, suffix=".tsv", dir=temp_dir)
+        paths.append(path)
+        outputs.append(BlockWriter(path))
+        os.close(fd)
+
+    try:
+        for key, value in reader(input_file):
+            outputs[partition_of(key, partitions, depth)].write(f"{key}\t{value}\n")
+
+    finally:
+        for out in outputs:
+            out.close()
+
+    return paths
+
+
+
+# Builds an in-memory hash table key -> list of values from input_file
+# Returns None if the table grows beyond the memory budget
+def build_table(input_file, memory_limit):
+    table = {}
+    used = 0
+
+    for key, value in read_pairs(input_file):
+        values = table.get(key)
+
+        if values is None:
+            values = table[key] = []
+            used += sys.getsizeof(key) + 100
+
+        values.append(value)
+        used += 36
+
+        # Abort, the caller will partition the inputs instead
+        if used > memory_limit and memory_limit > 0:
+            return None
+
+    return table
+
+
+
+# Joins one pair of (possibly partitioned) inputs, writing (A, R.B, S.B) rows to out_f
+def join_partition(r_file, s_file, out_f, memory_limit, partitions, temp_dir, depth):
+    # Build on the smaller relation, probe with the larger one
+    build_r = os.path.getsize(r_file) < os.path.getsize(s_file)
+    build_file, probe_file = (r_file, s_file) if build_r else (s_file, r_file)
+
+    # Past the maximum depth the budget is ignored (heavy single keys)
+    table = build_table(build_file, memory_limit if depth < MAX_DEPTH else 0)
+
+    if table is not None:
+        for key, value in read_pairs(probe_file):
+            matches = table.get(key)
+
+            if not matches:
+                continue
+
+            if build_r:
+                out_f.writelines(f"{key}\t{r_value}\t{value}\n" for r_value in matches)
+
+            else:
+                out_f.writelines(f"{key}\t{value}\t{s_value}\n" for s_value in matches)
+
+        return
+
+    # Grace hash join: partition both sides on the join key and join each partition pair
+    r_parts = partition_file(r_file, temp_dir, "r", partitions, depth)
+    s_parts = partition_file(s_file, temp_dir, "s", partitions, depth)
+
+    for r_part, s_part in zip(r_parts, s_parts):
+        if os.path.getsize(r_part) and os.path.getsize(s_part):
+            join_partition(r_part, s_part, out_f, memory_limit, partitions, temp_dir, depth + 1)
+
+        os.remove(r_part)
+        os.remove(s_part)
+
+
+
+# Hash Join
+# Output tuples are (A, R.B, S.B); when S is the build side they follow the order of R
+def hash_join(r_file, s_file, output_file, memory_limit=DEFAULT_MEMORY_LIMIT, partitions=DEFAULT_PARTITIONS):
+    with tempfile.TemporaryDirectory() as temp_dir, open_writer(output_file) as out_f:
+        join_partition(r_file, s_file, out_f, memory_limit, partitions, temp_dir, 0)
+
+
+
+# Aggregates one (possibly partitioned) input and returns its groups sorted by key
+# Returns None if the groups do not fit in the memory budget
+def aggregate_table(input_file, memory_limit):
+    sums = {}
+    used = 0
+
+    # The partitions are written with the same reader, so spilling does not change which lines are aggregated
+    for key, value in read_group_pairs(input_file):
+        if key in sums:
+            sums[key] += value
+
+        else:
+            sums[key] = value
+            used += sys.getsizeof(key) + 100
+
+            if used > memory_limit and memory_limit > 0:
+                return None
+
+    return sorted(sums.items())
+
+
+
+# Writes the sorted groups of one (possibly partitioned) input to out
+def aggregate_into(input_file, out, memory_limit, partitions, temp_dir, depth):
+    groups = aggregate_table(input_file, memory_limit if depth < MAX_DEPTH else 0)
+
+    # Common case: all groups fit in memory
+    if groups is not None:
+        out.writelines(f"{key}\t{total}\n" for key, total in groups)
+        return
+
+    # Too many groups: partition on the key and aggregate each partition separately
+    parts = partition_file(input_file, temp_dir, "g", partitions, depth, read_group_pairs)
+    results = []
+
+    for part in parts:
+        if os.path.getsize(part):
+            fd, path = tempfile.mkstemp(suffix=".groups", dir=temp_dir)
+
+            with os.fdopen(fd, 'w') as part_out:
+                aggregate_into(part, part_out, memory_limit, partitions, temp_dir, depth + 1)
+
+            results.append(path)
+
+        os.remove(part)
+
+    files = [open(result, 'r') for result in results]
+
+    try:
+        # Partitions hold disjoint keys, so the merge only restores key order
+        out.writelines(heapq.merge(*files, key=lambda line: line.split('\t', 1)[0]))
+
+    finally:
+        for f in files:
+            f.close()
+
+        for result in results:
+            os.remove(result)
+
+
+
+# Group By (Hash Aggregation)
+# Produces the same (A, SUM(B)) output as the sort-based group_and_sum without sorting the input
+def hash_group_and_sum(input_file, output_file, memory_limit=DEFAULT_MEMORY_LIMIT, partitions=DEFAULT_PARTITIONS):
+    with tempfile.TemporaryDirectory() as temp_dir, open_writer(output_file) as out_f:
+        aggregate_into(input_file, out_f, memory_limit, partitions, temp_dir, 0)
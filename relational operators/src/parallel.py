@@ -0,0 +1,210 @@
+# Author: Gkovaris Christos-Grigorios
+
+
+
+# Importing required modules
+import os
+import heapq
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from block_io import line_start, open_writer, read_lines, read_pairs
+from external_sort import DEFAULT_MEMORY_LIMIT, DEFAULT_FAN_IN
+from binary_format import EXTENSION, is_binary
+
+
+
+# Number of partitions created per worker (more partitions than workers balance uneven key ranges)
+PARTITIONS_PER_WORKER = 4
+
+# Number of keys sampled from each input per partition when choosing the splitters
+SAMPLES_PER_PARTITION = 32
+
+
+
+# Returns the key of the first non-empty line starting at offset (None at the end of the file)
+def key_at(f, offset):
+    f.seek(offset)
+
+    for line in f:
+        line = line.rstrip(b"\r\n")
+
+        if line:
+            return line.decode().partition('\t')[0]
+
+    return None
+
+
+
+# Samples keys at evenly spaced offsets of every sorted input and picks the shared partition splitters
+# Partition i holds the keys in [splitters[i - 1], splitters[i])
+def sample_splitters(paths, partitions):
+    samples = set()
+    count = partitions * SAMPLES_PER_PARTITION
+
+    for path in paths:
+        size = os.path.getsize(path)
+
+        with open(path, 'rb') as f:
+            for i in range(count):
+                key = key_at(f, line_start(f, size * i // count))
+
+                if key is not None:
+                    samples.add(key)
+
+    samples = sorted(samples)
+    splitters = []
+
+    for i in range(1, partitions):
+        key = samples[len(samples) * i // partitions] if samples else None
+
+        # Keep the splitters strictly increasing
+        if key is not None and (not splitters or key > splitters[-1]):
+            splitters.append(key)
+
+    return splitters
+
+
+
+# Binary search for the offset of the first line of a sorted file whose key is >= key
+def find_offset(f, size, key):
+    low, high = 0, size
+
+    while low < high:
+        middle = (low + high) // 2
+        current = key_at(f, line_start(f, middle))
+
+        if current is None or current >= key:
+            high = middle
+
+        else:
+            low = middle + 1
+
+    return line_start(f, low)
+
+
+
+# Splits a sorted file into consecutive (path, start, end) byte ranges on the splitter keys
+def partition_ranges(path, splitters):
+    size = os.path.getsize(path)
+
+    with open(path, 'rb') as f:
+        offsets = [0] + [find_offset(f, size, key) for key in splitters] + [size]
+
+    return [(path, offsets[i], offsets[i + 1]) for i in range(len(offsets) - 1)]
+
+
+
+# Splits any file into line-aligned (path, start, end) byte ranges of about equal size
+def chunk_ranges(path, chunks):
+    size = os.path.getsize(path)
+
+    with open(path, 'rb') as f:
+        offsets = sorted({line_start(f, size * i // chunks) for i in range(chunks)} | {size})
+
+    return [(path, offsets[i], offsets[i + 1]) for i in range(len(offsets) - 1)]
+
+
+
+# Runs one operator of relational_operators.py on one partition (executed in a worker process)
+def run_partition(operator_name, r_range, s_range, output_files, args):
+    import relational_operators
+    return getattr(relational_operators, operator_name)(r_range, s_range, *output_files, *args)
+
+
+
+# Appends the partition outputs, in partition order, to the final output file
+# Binary outputs are re-encoded from the TSV partition outputs
+def concatenate(part_files, output_file):
+    if output_file.endswith(EXTENSION):
+        with open_writer(output_file) as out:
+            for part in part_files:
+                out.writelines(f"{line}\n" for line in read_lines(part))
+
+        return
+
+    with open(output_file, 'wb') as out:
+        for part in part_files:
+            with open(part, 'rb') as f:
+                shutil.copyfileobj(f, out)
+
+
+
+# Runs a binary operator (merge_join, union, intersection, set_difference or merge_all)
+# with any extra arguments
+# in parallel over range partitions of the two sorted inputs that share the same key boundaries
+# Returns the list of values returned by the operator for every partition
+def parallel_operator(operator_name, r_file, s_file, output_files, workers, partitions=None, args=()):
+    # Range partitions are byte ranges of text files
+    if is_binary(r_file) or is_binary(s_file):
+        raise ValueError("parallel execution needs TSV inputs")
+
+    partitions = partitions or workers * PARTITIONS_PER_WORKER
+    splitters = sample_splitters([r_file, s_file], partitions)
+    r_ranges = partition_ranges(r_file, splitters)
+    s_ranges = partition_ranges(s_file, splitters)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        part_outputs = [
+            [os.path.join(temp_dir, f"{i}_{j}.tsv") for j in range(len(output_files))]
+            for i in range(len(r_ranges))
+        ]
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(run_partition, operator_name, r_range, s_range, outputs, args)
+                for r_range, s_range, outputs in zip(r_ranges, s_ranges, part_outputs)
+            ]
+            results = [future.result() for future in futures]
+
+        # Partitions hold disjoint, increasing key ranges, so concatenation keeps the global order
+        for j, output_file in enumerate(output_files):
+            concatenate([outputs[j] for outputs in part_outputs], output_file)
+
+    return results
+
+
+
+# Runs the sort-based group_and_sum of relational_operators.py on one chunk of the input (executed in a worker process)
+# The chunk is sorted with the external merge sort, so every worker stays within the memory budget
+def group_partition(chunk, output_file, memory_limit, fan_in):
+    import relational_operators
+    relational_operators.group_and_sum(chunk, output_file, memory_limit, fan_in)
+
+
+
+# Group By in parallel: workers aggregate line-aligned chunks into sorted partial sums, which are then merged
+# and summed per key while streaming from the partial files
+# Works on sorted and unsorted inputs alike and writes the same output as group_and_sum
+def parallel_group_and_sum(input_file, output_file, workers, memory_limit=DEFAULT_MEMORY_LIMIT, fan_in=DEFAULT_FAN_IN,
+                           partitions=None):
+    if is_binary(input_file):
+        raise ValueError("parallel execution needs TSV inputs")
+
+    chunks = chunk_ranges(input_file, partitions or workers * PARTITIONS_PER_WORKER)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        part_files = [os.path.join(temp_dir, f"{i}.tsv") for i in range(len(chunks))]
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(group_partition, chunk, part, memory_limit, fan_in) for chunk, part in zip(chunks, part_files)]
+
+            for future in futures:
+                future.result()
+
+        with open_writer(output_file) as out:
+            prev_key = None
+            sum_value = 0
+
+            for key, value in heapq.merge(*map(read_pairs, part_files)):
+                if key == prev_key:
+                    sum_value += value
+
+                else:
+                    if prev_key is not None:
+                        out.write(f"{prev_key}\t{sum_value}\n")
+
+                    prev_key, sum_value = key, value
+
+            if prev_key is not None:
+                out.write(f"{prev_key}\t{sum_value}\n")
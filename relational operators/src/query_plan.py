@@ -0,0 +1,147 @@
+# Author: Gkovaris Christos-Grigorios
+
+
+
+# Importing required modules
+import os
+import sys
+import json
+from block_io import read_lines, read_pairs, write_lines
+from external_sort import sorted_lines
+from relational_operators import (
+    new_join_stats, merge_join_stream, union_stream, intersection_stream, set_difference_stream, group_and_sum_stream
+)
+
+
+
+# Query plans are trees of JSON nodes, executed as one pipeline of generators without intermediate files:
+#   "R_sorted.tsv"                                         scan of a sorted input file (TSV or binary)
+#   {"op": "sort", "input": "R.tsv" | child}               external sort of an unsorted input file or node
+#   {"op": "join", "inputs": [left, right]}                merge join, rows (A, R.B, S.B)
+#   {"op": "union" | "intersection" | "difference", "inputs": [left, right]}
+#   {"op": "project", "input": child, "column": N}         keeps the key and column N
+#   {"op": "groupby", "input": child, "column": N}         SUM of column N (default 1) per key
+# Every operator yields its rows sorted by key, so any node can feed a join or a group-by
+# The set operators merge whole lines and need them sorted: project keeps the key order but not the line order
+# (and neither does a join fed by it), so such an input is rejected unless it is wrapped in a sort node
+SET_OPERATORS = {
+    "union": union_stream,
+    "intersection": intersection_stream,
+    "difference": set_difference_stream,
+}
+
+
+
+# Yields "A<tab>column" lines from lines with several value columns, skipping lines without that column
+def project_stream(lines, column):
+    for line in lines:
+        parts = line.split('\t')
+
+        if len(parts) > column:
+            yield f"{parts[0]}\t{parts[column]}"
+
+
+
+# Parses lines into (key, value) rows for the join, skipping malformed lines
+def pairs_stream(lines):
+    for line in lines:
+        parts = line.split('\t')
+
+        if len(parts) >= 2:
+            yield parts[0], int(parts[1])
+
+
+
+# Checks whether a plan node yields whole lines in sorted order
+def lines_sorted(node):
+    if isinstance(node, str):
+        return True
+
+    op = node.get("op")
+
+    if op == "project":
+        return False
+
+    if op == "join":
+        return all(lines_sorted(child) for child in node["inputs"])
+
+    return True
+
+
+
+# Returns the iterator of lines produced by a plan node
+# Join buffer statistics of every join in the plan are accumulated in stats
+def open_lines(node, stats):
+    # Leaf: scan of a sorted input file
+    if isinstance(node, str):
+        return read_lines(node)
+
+    op = node.get("op")
+
+    if op == "sort":
+        child = node["input"]
+        return sorted_lines(child if isinstance(child, str) else open_lines(child, stats))
+
+    if op == "join":
+        left, right = node["inputs"]
+        return merge_join_stream(open_rows(left, stats), open_rows(right, stats), stats=stats)
+
+    if op in SET_OPERATORS:
+        left, right = node["inputs"]
+
+        if not (lines_sorted(left) and lines_sorted(right)):
+            raise ValueError(f"The inputs of {op} must be sorted lines: wrap project nodes in a sort node")
+
+        return SET_OPERATORS[op](open_lines(left, stats), open_lines(right, stats))
+
+    if op == "project":
+        return project_stream(open_lines(node["input"], stats), node["column"])
+
+    if op == "groupby":
+        child = node["input"]
+        column = node.get("column", 1)
+
+        # Input files are sorted first, operator outputs are already sorted by key
+        lines = sorted_lines(child) if isinstance(child, str) else open_lines(child, stats)
+        return group_and_sum_stream(project_stream(lines, column) if column != 1 else lines)
+
+    raise ValueError(f"Unknown plan operator: {op}")
+
+
+
+# Returns the iterator of (key, value) rows produced by a plan node (input of a join)
+def open_rows(node, stats):
+    # Files are parsed by the block reader directly
+    if isinstance(node, str):
+        return read_pairs(node)
+
+    return pairs_stream(open_lines(node, stats))
+
+
+
+# Executes a query plan and writes its result to output_file
+# Returns the join buffer statistics
+def run_plan(plan, output_file):
+    stats = new_join_stats()
+    write_lines(output_file, open_lines(plan, stats))
+    return stats
+
+
+
+# Loads a plan given either as a JSON file or as a JSON string
+def load_plan(text):
+    if os.path.isfile(text):
+        with open(text, 'r') as f:
+            return json.load(f)
+
+    return json.loads(text)
+
+
+
+# MAIN function
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Use: python query_plan.py <plan.json | plan JSON string> <output_file>")
+        sys.exit(1)
+
+    run_plan(load_plan(sys.argv[1]), sys.argv[2])
@@ -1,273 +1,582 @@
 # Author: Gkovaris Christos-Grigorios
 
 
-# Importing sys for MAIN function
+# Importing required modules
+import os
 import sys
+import json
+import tempfile
+import block_io
+from itertools import chain
+from block_io import SpillBuffer, open_cursor, open_writer, read_lines, read_pairs, write_lines
+from external_sort import DEFAULT_MEMORY_LIMIT, DEFAULT_FAN_IN, parse_size, sorted_lines, external_sort
+from hash_operators import DEFAULT_PARTITIONS, hash_join, hash_group_and_sum
+from parallel import parallel_operator, parallel_group_and_sum
+from binary_format import EXTENSION, is_binary
 
 
 
-# Merge and Join
-def merge_join(r_file, s_file, output_file):
-    # Open the input and output files
-    with open(r_file, 'r') as r_f, open(s_file, 'r') as s_f, open(output_file, 'w') as out_f:
-        # Read the first line from each input file
-        r_line = r_f.readline().strip()
-        s_line = s_f.readline().strip()
+# Default number of S values of one key kept in memory before the join buffer spills to disk
+DEFAULT_SPILL_THRESHOLD = 1000000
+
+
+
+# Returns an empty set of join buffer statistics
+def new_join_stats():
+    return {
+        "max_buffer_size": 0,      # Largest number of S values buffered for one key
+        "buffered_keys": 0,        # Number of S key groups loaded into the buffer
+        "spilled_keys": 0,         # Key groups that exceeded the spill threshold
+        "spilled_values": 0,       # S values written to spill files
+        "output_rows": 0,          # Number of joined tuples written
+    }
+
+
+
+# Combines the join statistics of several partitions
+def merge_join_stats(stats_list):
+    total = new_join_stats()
+
+    for stats in stats_list:
+        for name, value in stats.items():
+            total[name] = max(total[name], value) if name == "max_buffer_size" else total[name] + value
+
+    return total
 
-        # Stores matching values from s_file for a given key
-        buffer = []  
 
-        # Tracks the largest buffer size encountered
-        max_buffer_size = 0
 
-        # Keeps track of the previous key from r_file  
+# Merge and Join (block version)
+# Consumes two iterators of (key, value) rows sorted by key and yields the joined "A<tab>R.B<tab>S.B" lines
+# as text blocks of several lines (without the trailing newline)
+# The S values of the current key are held in a SpillBuffer, so a hot key with millions of matches
+# spills to disk instead of exhausting memory; duplicates on both sides (many-to-many) are joined
+# by streaming the buffered S values once per R tuple in large text blocks
+# Buffer statistics are accumulated in the optional stats dict
+def merge_join_blocks(r_rows, s_rows, spill_threshold, stats):
+    # Open the spill area
+    with tempfile.TemporaryDirectory() as spill_dir:
+        # Read the first row from s_rows
+        s_row = next(s_rows, None)
+
+        # Stores matching values from s_rows for a given key
+        buffer = SpillBuffer(spill_threshold, spill_dir)
+
+        # Keeps track of the previous key from r_rows  
         prev_r_key = None  
 
-        # Iterate over each line in r_file
-        while r_line:  
-            r_parts = r_line.split('\t')
-            
-            # Skip malformed lines
-            if len(r_parts) < 2:  
-                r_line = r_f.readline().strip()
-                continue
-            
-            # Extract key-value pair
-            r_key, r_value = r_parts[0], int(r_parts[1])
-            
+        # Iterate over each row in r_rows
+        for r_key, r_value in r_rows:
             # If the r_key has changed or the buffer is empty
             if r_key != prev_r_key or not buffer:
-                # Clear the buffer to store new matching values from s_file
+                # Clear the buffer to store new matching values from s_rows
                 buffer.clear()
 
-                # Iterate over s_file to find matching keys
-                while s_line:  
-                    s_parts = s_line.split('\t')
+                # Iterate over s_rows to find matching keys
+                while s_row is not None:
+                    s_key, s_value = s_row
 
-                    # Skip malformed lines
-                    if len(s_parts) < 2:  
-                        s_line = s_f.readline().strip()
-                        continue
-
-                    # Extract key-value pair
-                    s_key, s_value = s_parts[0], int(s_parts[1])  
-                    
-                    # Move forward in s_file if the key is smaller
+                    # Move forward in s_rows if the key is smaller
                     if s_key < r_key:  
-                        s_line = s_f.readline().strip()
+                        s_row = next(s_rows, None)
                     
-                    # Store matching values in buff er
+                    # Store matching values in buffer
                     elif s_key == r_key:  
                         buffer.append(s_value)
-                        s_line = s_f.readline().strip()
+                        s_row = next(s_rows, None)
                     
                     # Stop searching once s_key exceeds r_key
                     else:  
                         break
 
-                # Update max buffer size
-                max_buffer_size = max(max_buffer_size, len(buffer))  
+                # Update buffer statistics
+                stats["max_buffer_size"] = max(stats["max_buffer_size"], len(buffer))
+                stats["buffered_keys"] += 1 if buffer else 0
+
+                if buffer.spilled:
+                    stats["spilled_keys"] += 1
+                    stats["spilled_values"] += buffer.spilled
             
-            # Write all matches to the output file
-            for s_val in buffer:  
-                out_f.write(f"{r_key}\t{r_value}\t{s_val}\n")
+            # Yield all matches: every block of S values becomes one batch
+            # of "A<tab>R.B<tab>S.B" lines built by a single string replace
+            if buffer:
+                prefix = f"{r_key}\t{r_value}\t"
+                glue = "\n" + prefix
+
+                for block in buffer.blocks():
+                    yield prefix + block.replace("\n", glue)
+
+                stats["output_rows"] += len(buffer)
             
             # Update previous key reference
             prev_r_key = r_key  
 
-            # Read the next line from r_file
-            r_line = r_f.readline().strip()  
-            
-    # Return the maximum buffer size encountered
-    return max_buffer_size
+        buffer.clear()
 
 
 
-# Union
-def union(r_file, s_file, output_file):
-    # Open the input and output files
-    with open(r_file, 'r') as r, open(s_file, 'r') as s, open(output_file, 'w') as output:
-        # Read the first line from each input file
-        r_line = r.readline().strip()
-        s_line = s.readline().strip()
+# Merge and Join (stream version)
+# Yields the joined lines one at a time; buffer statistics are accumulated in the optional stats dict
+def merge_join_stream(r_rows, s_rows, spill_threshold=DEFAULT_SPILL_THRESHOLD, stats=None):
+    stats = new_join_stats() if stats is None else stats
+
+    for block in merge_join_blocks(r_rows, s_rows, spill_threshold, stats):
+        yield from block.split("\n")
+
+
+
+# Merge and Join
+# Joins two sorted files and returns the join buffer statistics
+def merge_join(r_file, s_file, output_file, spill_threshold=DEFAULT_SPILL_THRESHOLD):
+    stats = new_join_stats()
+
+    # The blocks are written as they are (malformed lines are skipped by the reader)
+    with open_writer(output_file) as out_f:
+        for block in merge_join_blocks(read_pairs(r_file), read_pairs(s_file), spill_threshold, stats):
+            out_f.write(block + "\n")
+
+    # Return the buffer statistics
+    return stats
+
+
+
+# Union (stream version)
+# Consumes two iterators of sorted lines and yields their sorted, duplicate-free union
+def union_stream(r, s):
+    # Read the first line from each input
+    r_line = next(r, '')
+    s_line = next(s, '')
+    
+    # Keeps track of the last yielded line to avoid duplicates
+    previous_line = None
+    
+    # Iterate over both inputs until both are fully processed
+    while r_line or s_line:
+        # If r is exhausted, take from s
+        if not r_line:
+            current_line = s_line
+            s_line = next(s, '')
         
-        # Keeps track of the last written line to avoid duplicates
-        previous_line = None
+        # If s is exhausted, take from r
+        elif not s_line:
+            current_line = r_line
+            r_line = next(r, '')
         
-        # Iterate over both files until both are fully processed
-        while r_line or s_line:
-            # If r_file is exhausted, take from s_file
-            if not r_line:
-                current_line = s_line
-                s_line = s.readline().strip()
-            
-            # If s_file is exhausted, take from r_file
-            elif not s_line:
+        else:
+            # Select the smaller line lexicographically to maintain sorted order
+            if r_line < s_line:
                 current_line = r_line
-                r_line = r.readline().strip()
+                r_line = next(r, '')
             
+            # If s_line is smaller, use it instead
+            elif s_line < r_line:
+                current_line = s_line
+                s_line = next(s, '')
+            
+            # If both lines are equal, yield only once and advance both inputs
             else:
-                # Select the smaller line lexicographically to maintain sorted order
-                if r_line < s_line:
-                    current_line = r_line
-                    r_line = r.readline().strip()
-                
-                # If s_line is smaller, use it instead
-                elif s_line < r_line:
-                    current_line = s_line
-                    s_line = s.readline().strip()
-                
-                # If both lines are equal, write only once and advance both files
-                else:
-                    current_line = r_line
-                    r_line = r.readline().strip()
-                    s_line = s.readline().strip()
+                current_line = r_line
+                r_line = next(r, '')
+                s_line = next(s, '')
+        
+        # Yield the line only if it hasn't been yielded before (to remove duplicates)
+        if current_line != previous_line:
+            yield current_line
+            previous_line = current_line
+
+
+
+# Union
+def union(r_file, s_file, output_file):
+    write_lines(output_file, union_stream(read_lines(r_file), read_lines(s_file)))
+
+
+
+# Intersection (stream version)
+# Consumes two iterators (or cursors) of sorted lines and yields the distinct lines found in both
+# The lagging side seeks straight to the current line of the other side, so on indexed files
+# whole ranges without a counterpart are skipped instead of read
+def intersection_stream(r, s):
+    r = open_cursor(r)
+    s = open_cursor(s)
+
+    # Current line of each input
+    r_line = r.line
+    s_line = s.line
+    
+    # Keeps track of the last yielded line to avoid duplicates
+    previous_line = None
+    
+    # Iterate through both inputs until one of them is fully read
+    while r_line and s_line:
+        # If the current lines match, yield the line (if not a duplicate)
+        if r_line == s_line:
+            # Avoid yielding duplicates
+            if r_line != previous_line:
+                yield r_line
             
-            # Write the line only if it hasn't been written before (to remove duplicates)
-            if current_line != previous_line:
-                output.write(f"{current_line}\n")
-                previous_line = current_line
+            # Update the last yielded line
+            previous_line = r_line
+
+            # Move forward in both inputs
+            r_line = r.advance()
+            s_line = s.advance()
+
+        # If r_line is smaller, skip forward in r to s_line
+        elif r_line < s_line:
+            r_line = r.seek(s_line)
+
+        # If s_line is smaller, skip forward in s to r_line
+        else:
+            s_line = s.seek(r_line)
 
 
 
 # Intersection
 def intersection(r_file, s_file, output_file):
-    # Open the input and output files
-    with open(r_file, 'r') as r, open(s_file, 'r') as s, open(output_file, 'w') as output:
-        # Read the first line from each input file
-        r_line = r.readline().strip()
-        s_line = s.readline().strip()
-        
-        # Keeps track of the last written line to avoid duplicates
-        previous_line = None
-        
-        # Iterate through both files until one of them is fully read
-        while r_line and s_line:
-            # If the current lines match, write to the output file (if not a duplicate)
-            if r_line == s_line:
-                # Avoid writing duplicates
-                if r_line != previous_line:
-                    output.write(f"{r_line}\n")
-                
-                # Update the last written line
-                previous_line = r_line
-
-                # Move forward in both files
-                r_line = r.readline().strip()
-                s_line = s.readline().strip()
-
-            # If r_line is smaller, move forward in r_file
-            elif r_line < s_line:
-                r_line = r.readline().strip()
-
-            # If s_line is smaller, move forward in s_file
-            else:
-                s_line = s.readline().strip()
+    with open_cursor(r_file) as r, open_cursor(s_file) as s:
+        write_lines(output_file, intersection_stream(r, s))
+
+
+
+# Difference (stream version)
+# Consumes two iterators (or cursors) of sorted lines and yields the distinct lines of r that are not in s
+# s seeks straight to the current line of r, skipping the ranges of s that lie between two lines of r
+def set_difference_stream(r, s):
+    r = open_cursor(r)
+    s = open_cursor(s)
+
+    # Current line of each input
+    r_line = r.line
+    s_line = s.line
+    
+    # Keeps track of the last yielded line to avoid duplicates
+    previous_line = None
+
+    # Iterate through r until it is fully read
+    while r_line:
+        # If s is exhausted or r_line is smaller, yield the run of r lines below s_line
+        if not s_line or r_line < s_line:
+            taken = r.take_below(s_line)
+
+            # Avoid yielding duplicates (equal lines are adjacent in sorted order)
+            distinct = dict.fromkeys(taken)
+            distinct.pop(previous_line, None)
+            yield from distinct
+            
+            # Update the last yielded line and move forward in r
+            previous_line = taken[-1]
+            r_line = r.line
+
+        # If r_line and s_line are equal, skip this value in both inputs (remove common elements)
+        elif r_line == s_line:
+            # Update previous line reference
+            previous_line = r_line
+            r_line = r.advance()
+            s_line = s.advance()
+
+        # If s_line is smaller, skip forward in s to r_line
+        else:
+            s_line = s.seek(r_line)
 
 
 
 # Difference
 def set_difference(r_file, s_file, output_file):
-    # Open the input and output files
-    with open(r_file, 'r') as r, open(s_file, 'r') as s, open(output_file, 'w') as output:
+    with open_cursor(r_file) as r, open_cursor(s_file) as s:
+        write_lines(output_file, set_difference_stream(r, s))
+
+
+
+# Returns the join key of a TSV line
+def line_key(line):
+    return line.partition('\t')[0]
+
+
+
+# Fused Join, Union, Intersection and Difference
+# Walks both sorted inputs once, one key group at a time, and writes all four outputs together
+# Produces the same files as running merge_join, union, intersection and set_difference separately
+# The S group of a key is held in SpillBuffers (its values for the join, its distinct lines for the set
+# operators) and the R group is streamed line by line, so neither side of a hot key is kept in memory
+def merge_all(r_file, s_file, join_file, union_file, intersection_file, difference_file, spill_threshold=DEFAULT_SPILL_THRESHOLD):
+    with open_writer(join_file) as join_out, open_writer(union_file) as union_out, \
+            open_writer(intersection_file) as intersection_out, open_writer(difference_file) as difference_out, \
+            tempfile.TemporaryDirectory() as spill_dir:
+        r = read_lines(r_file)
+        s = read_lines(s_file)
+
         # Read the first line from each input file
-        r_line = r.readline().strip()
-        s_line = s.readline().strip()
-        
-        # Keeps track of the last written line to avoid duplicates
-        previous_line = None
-
-        # Iterate through r_file until it is fully read
-        while r_line:
-            # If s_file is exhausted or r_line is smaller, write r_line to output
-            if not s_line or r_line < s_line:
-                
-                # Avoid writing duplicates
-                if r_line != previous_line:
-                    output.write(f"{r_line}\n")
-                
-                # Update the last written line
-                previous_line = r_line
-
-                # Move forward in r_file
-                r_line = r.readline().strip()
-
-            # If r_line and s_line are equal, skip this value in both files (remove common elements)
-            elif r_line == s_line:
-                # Update previous line reference
-                previous_line = r_line
-                r_line = r.readline().strip()
-                s_line = s.readline().strip()
-
-            # If s_line is smaller, move forward in s_file
+        r_line = next(r, None)
+        s_line = next(s, None)
+
+        # S values of the current key (join) and its distinct S lines (set operators)
+        s_values = SpillBuffer(spill_threshold, spill_dir)
+        s_lines = SpillBuffer(spill_threshold, spill_dir)
+
+        # Join buffer statistics
+        stats = new_join_stats()
+
+        # Iterate over both files until both are fully processed
+        while r_line is not None or s_line is not None:
+            # The next group is the one with the smallest key
+            if s_line is None:
+                key = line_key(r_line)
+
+            elif r_line is None:
+                key = line_key(s_line)
+
             else:
-                s_line = s.readline().strip()
+                key = min(line_key(r_line), line_key(s_line))
+
+            # Buffer the S group, skipping duplicate lines and malformed values
+            prev_line = None
+
+            while s_line is not None and line_key(s_line) == key:
+                if s_line != prev_line:
+                    s_lines.append(s_line)
+                    prev_line = s_line
+
+                parts = s_line.split('\t')
+
+                if len(parts) >= 2:
+                    s_values.append(int(parts[1]))
+
+                s_line = next(s, None)
+
+            if r_line is not None and line_key(r_line) == key:
+                # Update buffer statistics
+                stats["max_buffer_size"] = max(stats["max_buffer_size"], len(s_values))
+                stats["buffered_keys"] += 1 if s_values else 0
+
+                if s_values.spilled:
+                    stats["spilled_keys"] += 1
+                    stats["spilled_values"] += s_values.spilled
+
+            # Distinct S lines in sorted order, merged with the R lines below
+            pending = chain.from_iterable(block.split("\n") for block in s_lines.blocks())
+            pending_line = next(pending, None)
+            prev_line = None
+
+            # Stream the R group
+            while r_line is not None and line_key(r_line) == key:
+                # Join: every block of S values becomes one batch of "A<tab>R.B<tab>S.B" lines
+                parts = r_line.split('\t')
+
+                if s_values and len(parts) >= 2:
+                    prefix = f"{key}\t{int(parts[1])}\t"
+                    glue = "\n" + prefix
+
+                    for block in s_values.blocks():
+                        join_out.write(prefix + block.replace("\n", glue) + "\n")
+
+                    stats["output_rows"] += len(s_values)
+
+                # Set operators: merge the distinct R line with the distinct S lines
+                if r_line != prev_line:
+                    # S lines before the R line belong to the union only
+                    while pending_line is not None and pending_line < r_line:
+                        union_out.write(pending_line + "\n")
+                        pending_line = next(pending, None)
+
+                    union_out.write(r_line + "\n")
+
+                    if pending_line == r_line:
+                        intersection_out.write(r_line + "\n")
+                        pending_line = next(pending, None)
+
+                    else:
+                        difference_out.write(r_line + "\n")
+
+                    prev_line = r_line
+
+                r_line = next(r, None)
+
+            # The remaining S lines belong to the union only
+            while pending_line is not None:
+                union_out.write(pending_line + "\n")
+                pending_line = next(pending, None)
+
+            s_values.clear()
+            s_lines.clear()
+
+    # Return the join buffer statistics
+    return stats
+
+
+
+# Group By (stream version)
+# Consumes an iterator of lines sorted by key and yields one "A<tab>SUM(B)" line per group
+def group_and_sum_stream(lines):
+    # No group has been started yet
+    prev_key = None
+    sum_value = 0
+
+    # Merge and sum duplicates while streaming the sorted lines
+    for line in lines:
+        parts = line.split('\t')
+
+        # Skip malformed lines
+        if len(parts) != 2:
+            continue
+
+        current_key, current_value = parts[0], int(parts[1])
+
+        if current_key == prev_key:
+            # Aggregate sum
+            sum_value += current_value
+
+        else:
+            # Yield previous group
+            if prev_key is not None:
+                yield f"{prev_key}\t{sum_value}"
+
+            # Reset values for the next group
+            prev_key, sum_value = current_key, current_value
+
+    # Yield the last group
+    if prev_key is not None:
+        yield f"{prev_key}\t{sum_value}"
 
 
 
 # Group By (Sort-Merge Algorithm)
-def group_and_sum(input_file, output_file):
-    # Read all data into a list
-    data = []
-    
-    with open(input_file, 'r') as f:
-        for line in f:
-            parts = line.strip().split('\t')
-            
-            if len(parts) == 2:
-                key, value = parts[0], int(parts[1])
-                
-                # Store as tuple (key, value)
-                data.append((key, value))  
-    
-    # Sort the list based on the first field (key)
-    data.sort()
+# The input is sorted with the external merge sort, so it does not have to fit in memory
+def group_and_sum(input_file, output_file, memory_limit=DEFAULT_MEMORY_LIMIT, fan_in=DEFAULT_FAN_IN):
+    write_lines(output_file, group_and_sum_stream(sorted_lines(input_file, memory_limit, fan_in)))
 
-    # Merge and sum duplicates
-    with open(output_file, 'w') as f:
-        if not data:
-            # If data is empty, do nothing
-            return  
 
-        # Initialize first key-value pair
-        prev_key, sum_value = data[0]
 
-        for i in range(1, len(data)):
-            current_key, current_value = data[i]
-            
-            if current_key == prev_key:
-                # Aggregate sum
-                sum_value += current_value  
-            
-            else:
-                # Write previous group
-                f.write(f"{prev_key}\t{sum_value}\n")  
+# Splits command-line arguments into input files and --name=value options
+def parse_arguments(argv):
+    files = []
+    options = {}
+
+    for arg in argv:
+        if arg.startswith("--"):
+            name, _, value = arg[2:].partition("=")
+            options[name] = value
+
+        else:
+            files.append(arg)
+
+    return files, options
+
 
-                # Reset values for the next group
-                prev_key, sum_value = current_key, current_value  
-        
-        # Write the last group
-        f.write(f"{prev_key}\t{sum_value}\n")
+
+# Runs a binary operator on the two inputs, in parallel over range partitions when workers > 1
+# Extra arguments are passed after the output files; join statistics of the partitions are combined
+def execute(operator, files, output_files, workers=1, args=()):
+    if workers > 1:
+        results = parallel_operator(operator.__name__, files[0], files[1], output_files, workers, args=args)
+        return merge_join_stats(results) if results and isinstance(results[0], dict) else None
+
+    return operator(files[0], files[1], *output_files, *args)
+
+
+
+# Sorts an unsorted input into a temporary file so that the merge operators can consume it
+def sort_to_temp(input_file, temp_dir, memory_limit, fan_in):
+    output_file = os.path.join(temp_dir, os.path.basename(input_file) + ".sorted")
+    external_sort(input_file, output_file, memory_limit, fan_in)
+    return output_file
 
 
 
 # MAIN function
 if __name__ == "__main__":
     # Get command-line arguments (excluding script name)
-    files = sys.argv[1:]
+    files, options = parse_arguments(sys.argv[1:])
+
+    # Memory budget and merge fan-in of the external sort
+    memory_limit = parse_size(options["memory"]) if options.get("memory") else DEFAULT_MEMORY_LIMIT
+    fan_in = int(options["fan-in"]) if options.get("fan-in") else DEFAULT_FAN_IN
+
+    # Block size of the input reader and optional memory-mapped input
+    if options.get("buffer"):
+        block_io.DEFAULT_BUFFER_SIZE = parse_size(options["buffer"])
+
+    block_io.USE_MMAP = "mmap" in options
+
+    # Block size of the sparse index used by Intersection and Difference
+    if options.get("index-block"):
+        block_io.DEFAULT_INDEX_BLOCK_SIZE = parse_size(options["index-block"])
+
+    # Number of Grace partitions of the hash operators
+    partitions = int(options["partitions"]) if options.get("partitions") else DEFAULT_PARTITIONS
+
+    # Number of worker processes of the partitioned parallel mode
+    workers = int(options["workers"]) if options.get("workers") else 1
+
+    # The parallel mode splits text inputs into byte ranges, so binary inputs cannot be split across workers
+    # (with --sort the operators read sorted TSV copies of the inputs; Group-By falls back to one process)
+    parallel_binary = workers > 1 and any(map(is_binary, files))
+
+    # Number of S values of one key kept in memory by the merge join before spilling
+    spill_threshold = int(options["spill"]) if options.get("spill") else DEFAULT_SPILL_THRESHOLD
+
+    # Output files are written in the binary relation format with --binary
+    output_extension = EXTENSION if "binary" in options else ".tsv"
+    join_file, union_file, intersection_file, difference_file, groupby_file = (
+        name + output_extension for name in ("join", "union", "intersection", "difference", "groupby")
+    )
+
+    # Join buffer statistics, printed as JSON with --stats
+    join_stats = None
+
+    # The NumPy backend is optional and only imported when requested
+    columnar = None
+
+    if options.get("backend") == "numpy":
+        import columnar
 
     # If two files are provided, perform join, union, intersection, and difference operations
-    if len(files) == 2:
-        merge_join(files[0], files[1], "join.tsv")             # Compute merge join
-        union(files[0], files[1], "union.tsv")                 # Compute merge-based union
-        intersection(files[0], files[1], "intersection.tsv")   # Compute intersection
-        set_difference(files[0], files[1], "difference.tsv")   # Compute difference (R - S)
+    if len(files) == 2 and not (parallel_binary and "sort" not in options):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # The hash join does not need sorted inputs
+            if "hash" in options:
+                hash_join(files[0], files[1], join_file, memory_limit, partitions)
+
+            # Sort unsorted inputs first when requested
+            if "sort" in options:
+                files = [sort_to_temp(name, temp_dir, memory_limit, fan_in) for name in files]
+
+            # Compute all four operators in one pass over both inputs
+            if "fused" in options and "hash" not in options and not columnar:
+                join_stats = execute(merge_all, files, [join_file, union_file, intersection_file, difference_file], workers, (spill_threshold,))
+
+            else:
+                if "hash" not in options:
+                    join_stats = execute(merge_join, files, [join_file], workers, (spill_threshold,))   # Compute merge join
+
+                # Vectorized set operators on NumPy arrays
+                if columnar:
+                    columnar.columnar_union(files[0], files[1], union_file)
+                    columnar.columnar_intersection(files[0], files[1], intersection_file)
+                    columnar.columnar_difference(files[0], files[1], difference_file)
+
+                else:
+                    execute(union, files, [union_file], workers)                     # Compute merge-based union
+                    execute(intersection, files, [intersection_file], workers)       # Compute intersection
+                    execute(set_difference, files, [difference_file], workers)       # Compute difference (R - S)
     
+            if "stats" in options and join_stats is not None:
+                print(json.dumps(join_stats))
+
     # If only one file is provided, perform the group-by operation
     elif len(files) == 1:
         # Compute group by with sum aggregation
-        group_and_sum(files[0], "groupby.tsv")  
+        if columnar:
+            columnar.columnar_group_and_sum(files[0], groupby_file)
+
+        elif workers > 1 and not parallel_binary:
+            parallel_group_and_sum(files[0], groupby_file, workers, memory_limit, fan_in)
+
+        elif "hash" in options:
+            hash_group_and_sum(files[0], groupby_file, memory_limit, partitions)
+
+        else:
+            group_and_sum(files[0], groupby_file, memory_limit, fan_in)
     
     # If incorrect arguments are provided, display usage instructions
     else:
-        print("Use: python assignment.py <R_file> <S_file> (part 1 to 4) or python assignment.py <R_file> (part 5)")
\ No newline at end of file
+        print("Use: python relational_operators.py [--sort] [--fused] [--hash] [--memory=SIZE] [--fan-in=N] [--partitions=N] [--buffer=SIZE] [--mmap] [--index-block=SIZE] [--backend=numpy] [--workers=N] [--spill=N] [--stats] [--binary] <R_file> <S_file> (part 1 to 4) or python relational_operators.py [--hash] [--memory=SIZE] [--fan-in=N] [--partitions=N] [--buffer=SIZE] [--mmap] [--backend=numpy] [--workers=N] [--binary] <R_file> (part 5)")
@@ -0,0 +1,148 @@
+# Author: Gkovaris Christos-Grigorios
+
+
+
+# Importing required modules
+import sys
+import json
+import numpy as np
+from rtree_file import HEADER_SIZE, RtreeFile, is_rtree_file, page_dtype
+
+
+
+# Largest number of (query, node) pairs expanded at once (bounds the size of the temporary arrays)
+MAX_FRONTIER = 1 << 16
+
+
+
+# R-tree stored as NumPy arrays, one row per node:
+#   isnonleaf (n,), counts (n,), ids (n, capacity), mbrs (n, capacity, 4) with [x_low, x_high, y_low, y_high]
+# Unused slots of a node (index >= count) are ignored by the queries
+class ArrayRtree:
+    def __init__(self, isnonleaf, counts, ids, mbrs, root_id):
+        self.isnonleaf = isnonleaf
+        self.counts = counts
+        self.ids = ids
+        self.mbrs = mbrs
+        self.root_id = root_id
+        self.capacity = ids.shape[1]
+
+
+
+# Views the pages of a binary R-tree file as arrays without copying them
+def map_arrays(path):
+    rtree = RtreeFile(path)
+    pages = np.frombuffer(rtree.map, dtype=page_dtype(rtree.capacity), count=rtree.node_count, offset=HEADER_SIZE)
+    return ArrayRtree(pages["isnonleaf"], pages["count"], pages["ids"], pages["mbrs"], rtree.root_id)
+
+
+
+# Builds the arrays from an Rtree.txt file (one JSON node per line)
+def read_arrays(path):
+    with open(path, 'r') as f:
+        nodes = [json.loads(line) for line in f if line.strip()]
+
+    count = max(node[1] for node in nodes) + 1
+    capacity = max(len(node[2]) for node in nodes)
+    isnonleaf = np.zeros(count, dtype=np.uint8)
+    counts = np.zeros(count, dtype=np.uint32)
+    ids = np.zeros((count, capacity), dtype=np.int64)
+    mbrs = np.zeros((count, capacity, 4), dtype=np.float64)
+
+    for flag, node_id, entries in nodes:
+        isnonleaf[node_id] = flag
+        counts[node_id] = len(entries)
+
+        if entries:
+            ids[node_id, :len(entries)] = [entry_id for entry_id, _ in entries]
+            mbrs[node_id, :len(entries)] = [mbr for _, mbr in entries]
+
+    return ArrayRtree(isnonleaf, counts, ids, mbrs, count - 1)
+
+
+
+# Loads an R-tree in either file format as arrays
+def load_arrays(path):
+    return map_arrays(path) if is_rtree_file(path) else read_arrays(path)
+
+
+
+# Evaluates many range queries at once by expanding a frontier of (query, node) pairs level by level
+# rects is a (q, 4) array of [x_low, x_high, y_low, y_high] windows
+# Returns a list with the sorted object ids intersecting each window
+def batch_range_query(tree, rects):
+    rects = np.asarray(rects, dtype=np.float64).reshape(-1, 4)
+    slots = np.arange(tree.capacity)
+
+    frontier_queries = np.arange(len(rects))
+    frontier_nodes = np.full(len(rects), tree.root_id, dtype=np.int64)
+    hit_queries = []
+    hit_objects = []
+
+    while len(frontier_queries):
+        next_queries = []
+        next_nodes = []
+
+        for start in range(0, len(frontier_queries), MAX_FRONTIER):
+            queries = frontier_queries[start:start + MAX_FRONTIER]
+            nodes = frontier_nodes[start:start + MAX_FRONTIER]
+
+            # Test every entry of every frontier node against its query window at once
+            rect = rects[queries][:, None, :]
+            mbrs = tree.mbrs[nodes]
+            hit = (slots < tree.counts[nodes][:, None]) & ~(
+                (mbrs[..., 1] < rect[..., 0]) |      # entry.x_high < query.x_low
+                (mbrs[..., 0] > rect[..., 1]) |      # entry.x_low > query.x_high
+                (mbrs[..., 3] < rect[..., 2]) |      # entry.y_high < query.y_low
+                (mbrs[..., 2] > rect[..., 3])        # entry.y_low > query.y_high
+            )
+
+            pairs, entries = np.nonzero(hit)
+            children = tree.ids[nodes[pairs], entries]
+            queries = queries[pairs]
+            nonleaf = tree.isnonleaf[nodes[pairs]].astype(bool)
+
+            # Child nodes form the next frontier, leaf entries are results
+            next_queries.append(queries[nonleaf])
+            next_nodes.append(children[nonleaf])
+            hit_queries.append(queries[~nonleaf])
+            hit_objects.append(children[~nonleaf])
+
+        frontier_queries = np.concatenate(next_queries)
+        frontier_nodes = np.concatenate(next_nodes)
+
+    if not hit_queries:
+        return [[] for _ in range(len(rects))]
+
+    hit_queries = np.concatenate(hit_queries)
+    hit_objects = np.concatenate(hit_objects)
+
+    # Group the results by query, sorted by object id
+    order = np.lexsort((hit_objects, hit_queries))
+    hit_objects = hit_objects[order]
+    bounds = np.searchsorted(hit_queries[order], np.arange(len(rects) + 1))
+    return [hit_objects[bounds[i]:bounds[i + 1]].tolist() for i in range(len(rects))]
+
+
+
+# Reads the windows "x_low y_low x_high y_high" of a query file as a (q, 4) array [x_low, x_high, y_low, y_high]
+def read_queries(path):
+    windows = np.loadtxt(path, dtype=np.float64, ndmin=2)
+
+    if windows.size == 0:
+        return np.empty((0, 4))
+
+    return windows[:, [0, 2, 1, 3]]
+
+
+
+# MAIN function
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python batch_range_query.py Rtree.txt Rqueries.txt")
+        sys.exit()
+
+    tree = load_arrays(sys.argv[1])
+
+    for i, results in enumerate(batch_range_query(tree, read_queries(sys.argv[2]))):
+        print(f"{i} ({len(results)}): {','.join(map(str, results))}")
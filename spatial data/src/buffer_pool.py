@@ -0,0 +1,167 @@
+# Author: Gkovaris Christos-Grigorios
+
+
+
+# Importing required modules
+import os
+import sys
+from collections import OrderedDict
+from rtree_file import HEADER, MAGIC, VERSION, RtreeFile, page_size, page_struct
+
+
+
+# Default number of node pages held by the buffer pool
+DEFAULT_POOL_PAGES = 64
+
+
+
+# Counters of the buffer pool
+#   hits: node requests answered from the pool or from the pinned pages
+#   misses: node requests that had to read the page from the file
+#   reads: pages read from the file (misses and the pages loaded when pinning the upper levels)
+#   evictions: pages dropped from the pool to make room for another one
+class PoolStats:
+    def __init__(self, hits=0, misses=0, reads=0, evictions=0):
+        self.hits = hits
+        self.misses = misses
+        self.reads = reads
+        self.evictions = evictions
+
+    def copy(self):
+        return PoolStats(self.hits, self.misses, self.reads, self.evictions)
+
+    # Returns the counters accumulated since an earlier copy
+    def since(self, earlier):
+        return PoolStats(self.hits - earlier.hits, self.misses - earlier.misses, self.reads - earlier.reads, self.evictions - earlier.evictions)
+
+    def hit_ratio(self):
+        requests = self.hits + self.misses
+        return self.hits / requests if requests else 0.0
+
+    def __str__(self):
+        return f"hits {self.hits}, misses {self.misses}, reads {self.reads}, evictions {self.evictions}, hit ratio {self.hit_ratio():.3f}"
+
+
+
+# Disk-resident binary R-tree read through a bounded buffer pool
+# Nodes are fetched with one positioned read per page and kept decoded in an LRU pool of at most
+# pool_pages pages; the pinned_levels upper levels (1 = the root) are loaded once and never evicted,
+# they are kept outside the pool so they do not take its room
+# It is used like RtreeFile (rtree[node_id]) by range_query and knn_search
+class PagedRtree(RtreeFile):
+    def __init__(self, path, pool_pages=DEFAULT_POOL_PAGES, pinned_levels=0):
+        if pool_pages < 1:
+            raise ValueError("the buffer pool needs at least one page")
+
+        self.file = open(path, 'rb')
+        magic, version, self.capacity, self.node_count, self.root_id, self.height = HEADER.unpack(self.file.read(HEADER.size))
+
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a binary R-tree file (version {VERSION})")
+
+        self.page_size = page_size(self.capacity)
+        self.page = page_struct(self.capacity)
+        self.pool_pages = pool_pages
+        self.pool = OrderedDict()
+        self.pinned = {}
+        self.stats = PoolStats()
+
+        # Load the pinned levels top-down
+        level = [self.root_id]
+
+        for _ in range(min(pinned_levels, self.height)):
+            for node_id in level:
+                self.pinned[node_id] = self.load(node_id)
+
+            level = [entry_id for node_id in level if self.pinned[node_id]["isnonleaf"] for entry_id, _ in self.pinned[node_id]["entries"]]
+
+    # Reads and decodes one page from the file
+    def load(self, node_id):
+        values = self.page.unpack(os.pread(self.file.fileno(), self.page_size, self.offset(node_id)))
+        self.stats.reads += 1
+        count = values[1]
+        flat = values[2 + self.capacity:2 + self.capacity + 4 * count]
+        return {"isnonleaf": values[0], "entries": list(zip(values[2:2 + count], [flat[i:i + 4] for i in range(0, 4 * count, 4)]))}
+
+    def __getitem__(self, node_id):
+        node = self.pinned.get(node_id)
+
+        if node is None:
+            node = self.pool.get(node_id)
+
+            if node is None:
+                self.stats.misses += 1
+                node = self.load(node_id)
+
+                if len(self.pool) >= self.pool_pages:
+                    self.pool.popitem(last=False)
+                    self.stats.evictions += 1
+
+                self.pool[node_id] = node
+                return node
+
+            self.pool.move_to_end(node_id)
+
+        self.stats.hits += 1
+        return node
+
+    def read_node(self, node_id):
+        node = self[node_id]
+        ids = tuple(entry_id for entry_id, _ in node["entries"])
+        return node["isnonleaf"], ids, [mbr for _, mbr in node["entries"]]
+
+    # Memory held by the cached pages, in bytes of their on-disk size
+    def memory(self):
+        return (len(self.pool) + len(self.pinned)) * self.page_size
+
+    def close(self):
+        self.file.close()
+
+
+
+# Parses the buffer pool options --buffer=PAGES and --pin=LEVELS of the query tools
+# Returns the remaining arguments and (pages, levels), or None when no pool is requested
+def pool_options(argv):
+    args = [arg for arg in argv if not arg.startswith(("--buffer=", "--pin="))]
+    pages = [int(arg.split("=", 1)[1]) for arg in argv if arg.startswith("--buffer=")]
+    levels = [int(arg.split("=", 1)[1]) for arg in argv if arg.startswith("--pin=")]
+
+    if not pages and not levels:
+        return args, None
+
+    return args, (pages[-1] if pages else DEFAULT_POOL_PAGES, levels[-1] if levels else 0)
+
+
+
+# Runs the range query workload with every pool size and prints the hit ratio and page reads,
+# to choose how much memory a deployment needs
+def sweep(rtree_file, queries_file, sizes, pinned_levels=0):
+    from range_query import range_query
+
+    with open(queries_file, 'r') as f:
+        queries = [list(map(float, line.split())) for line in f if line.strip()]
+
+    print(f"{'pages':>8} {'memory (KB)':>12} {'hit ratio':>10} {'reads/query':>12}")
+
+    for size in sizes:
+        with PagedRtree(rtree_file, size, pinned_levels) as rtree:
+            start = rtree.stats.copy()
+
+            for x_low, y_low, x_high, y_high in queries:
+                range_query(rtree.root_id, [x_low, x_high, y_low, y_high], rtree, [])
+
+            stats = rtree.stats.since(start)
+            memory = (size + len(rtree.pinned)) * rtree.page_size / 1024
+            print(f"{size:>8} {memory:>12.1f} {stats.hit_ratio():>10.3f} {stats.reads / max(len(queries), 1):>12.2f}")
+
+
+
+# MAIN function
+if __name__ == "__main__":
+    args, pool = pool_options(sys.argv[1:])
+
+    if len(args) < 3:
+        print("Usage: python buffer_pool.py Rtree.bin Rqueries.txt pages [pages ...] [--pin=LEVELS]")
+        sys.exit()
+
+    sweep(args[0], args[1], [int(size) for size in args[2:]], pool[1] if pool else 0)
@@ -0,0 +1,404 @@
+# Author: Gkovaris Christos-Grigorios
+
+
+
+# Importing required modules
+import os
+import sys
+import json
+import math
+import heapq
+import tempfile
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from rtree_builder import MAX_ENTRIES, STRATEGIES, HILBERT_ORDER, fix_chunks
+from rtree_file import HEADER, HEADER_SIZE, MAGIC, VERSION, page_dtype
+
+
+
+# Size in bytes of the pieces of coords.txt parsed by one task
+CHUNK_SIZE = 32 * 1024 * 1024
+
+# Number of objects whose curve keys are computed by one task
+KEYS_PER_TASK = 1 << 20
+
+# Largest number of objects sorted in memory; larger inputs are sorted in runs spilled to disk and merged
+MAX_SORT_SIZE = 1 << 25
+
+# Number of keys read at once from every run during the merge
+MERGE_BLOCK = 1 << 16
+
+
+
+# Pipeline of the bulk loading for large inputs, with the same result as rtree_builder.py:
+#   1. coords.txt is cut into line-aligned byte chunks; workers count their lines, then parse them with NumPy
+#      and reduce the vertices of every object that overlaps the chunk to partial MBRs (minimum/maximum.reduceat)
+#   2. the partial MBRs of objects that span chunks are combined, and workers compute the curve keys of the
+#      MBR centers on array slices (exactly the Z-order / Hilbert values of rtree_builder.py)
+#   3. the keys are sorted in memory, or in runs on disk merged afterwards when there are too many objects
+#   4. the levels are packed with array operations and written as Rtree.txt or Rtree.bin
+
+
+
+# Returns the offset of the first line that starts at or after the given offset
+def line_start(f, offset):
+    if offset == 0:
+        return 0
+
+    f.seek(offset - 1)
+    f.readline()
+    return f.tell()
+
+
+
+# Cuts a file into line-aligned byte ranges of about chunk_size bytes
+def chunk_ranges(path, chunk_size=CHUNK_SIZE):
+    size = os.path.getsize(path)
+
+    with open(path, 'rb') as f:
+        offsets = sorted({line_start(f, offset) for offset in range(0, size, chunk_size)} | {size})
+
+    return list(zip(offsets, offsets[1:]))
+
+
+
+# Reads one byte range of a file
+def read_range(path, start, end):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return f.read(end - start)
+
+
+
+# Counts the lines of one byte range (executed in a worker process)
+def count_lines(path, start, end):
+    data = read_range(path, start, end)
+    return data.count(b"\n") + (1 if data and not data.endswith(b"\n") else 0)
+
+
+
+# Parses the "x,y" lines of one byte range into two arrays
+def parse_coords(path, start, end):
+    values = np.array(read_range(path, start, end).replace(b",", b" ").split(), dtype=np.float64)
+    return values[0::2], values[1::2]
+
+
+
+# Computes the partial MBRs of the objects that overlap one chunk of coords.txt (executed in a worker process)
+# first and last are the vertex ranges of these objects clipped to the chunk, relative to its first line
+# Returns a (k, 4) array [x_low, x_high, y_low, y_high]
+def chunk_mbrs(path, start, end, first, last):
+    xs, ys = parse_coords(path, start, end)
+
+    # reduceat over the pairs (first, last + 1) reduces every range; the extra element keeps last + 1 valid
+    bounds = np.empty(2 * len(first), dtype=np.int64)
+    bounds[0::2] = first
+    bounds[1::2] = last + 1
+    xs = np.append(xs, 0.0)
+    ys = np.append(ys, 0.0)
+
+    mbrs = np.empty((len(first), 4), dtype=np.float64)
+    mbrs[:, 0] = np.minimum.reduceat(xs, bounds)[0::2]
+    mbrs[:, 1] = np.maximum.reduceat(xs, bounds)[0::2]
+    mbrs[:, 2] = np.minimum.reduceat(ys, bounds)[0::2]
+    mbrs[:, 3] = np.maximum.reduceat(ys, bounds)[0::2]
+    return mbrs
+
+
+
+# Loads offsets.txt ("id,startOffset,endOffset" per line) as three arrays
+def read_offsets_array(path):
+    offsets = np.loadtxt(path, delimiter=',', dtype=np.int64, ndmin=2)
+    return offsets[:, 0].copy(), offsets[:, 1].copy(), offsets[:, 2].copy()
+
+
+
+# Computes the MBR of every object from coords.txt, chunk by chunk in the worker processes
+# Returns an (n, 4) array aligned with starts / ends
+def object_mbrs(coords_file, starts, ends, pool, chunk_size=CHUNK_SIZE):
+    ranges = chunk_ranges(coords_file, chunk_size)
+    lines = list(pool.map(count_lines, [coords_file] * len(ranges), *zip(*ranges))) if ranges else []
+    first_lines = np.concatenate([[0], np.cumsum(lines)]).astype(np.int64)
+
+    # Objects sorted by their first vertex; the running maximum of their last vertex finds
+    # the objects that end inside a chunk although they start before it
+    order = np.argsort(starts, kind="stable")
+    sorted_starts = starts[order]
+    reach = np.maximum.accumulate(ends[order]) if len(order) else ends
+
+    mbrs = np.empty((len(starts), 4), dtype=np.float64)
+    mbrs[:, 0::2] = np.inf
+    mbrs[:, 1::2] = -np.inf
+    futures = []
+
+    for (start, end), line_low, line_high in zip(ranges, first_lines, first_lines[1:]):
+        low = np.searchsorted(reach, line_low, side="left")
+        high = np.searchsorted(sorted_starts, line_high, side="left")
+        objects = order[low:high]
+        objects = objects[ends[objects] >= line_low]
+
+        if len(objects):
+            first = np.maximum(starts[objects], line_low) - line_low
+            last = np.minimum(ends[objects], line_high - 1) - line_low
+            futures.append((objects, pool.submit(chunk_mbrs, coords_file, start, end, first, last)))
+
+    # Objects that span several chunks get the union of their partial MBRs
+    for objects, future in futures:
+        partial = future.result()
+        np.minimum.at(mbrs[:, 0], objects, partial[:, 0])
+        np.maximum.at(mbrs[:, 1], objects, partial[:, 1])
+        np.minimum.at(mbrs[:, 2], objects, partial[:, 2])
+        np.maximum.at(mbrs[:, 3], objects, partial[:, 3])
+
+    return mbrs
+
+
+
+# Z-order values of pymorton.interleave_latlng(lat, lng), the key of rtree_builder.zorder_sort
+# interleave_latlng writes 32 base-4 digits (one bit of the latitude and one of the longitude each)
+# by subtracting 180 / 2^i from lat + 90 and lng + 180; every subtraction is exact, so the digits are
+# computed here with the same arithmetic on whole arrays and packed into one unsigned 64-bit key
+def zorder_keys(lat, lng):
+    x = np.where(lng > 180, np.mod(lng, 180) + 180.0, np.where(lng < -180, -np.mod(-lng, 180) + 180.0, lng + 180.0))
+    y = np.where(lat > 90, np.mod(lat, 90) + 90.0, np.where(lat < -90, -np.mod(-lat, 90) + 90.0, lat + 90.0))
+    keys = np.zeros(len(x), dtype=np.uint64)
+
+    for i in range(32):
+        divisor = 180.0 / 2 ** i
+        y_bit = y >= divisor
+        x_bit = x >= divisor
+        y = np.where(y_bit, y - divisor, y)
+        x = np.where(x_bit, x - divisor, x)
+        digit = (y_bit.astype(np.uint64) << np.uint64(1)) | x_bit.astype(np.uint64)
+        keys |= digit << np.uint64(2 * (31 - i))
+
+    return keys
+
+
+
+# Hilbert values of the cells (x, y) of an n x n grid, the array form of rtree_builder.hilbert_key
+def hilbert_keys(n, x, y):
+    x = x.astype(np.int64)
+    y = y.astype(np.int64)
+    keys = np.zeros(len(x), dtype=np.int64)
+    s = n // 2
+
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        keys += s * s * ((3 * rx.astype(np.int64)) ^ ry.astype(np.int64))
+
+        # Rotate the quadrant so that the curve inside it has the standard orientation
+        flip = ~ry & rx
+        x = np.where(flip, n - 1 - x, x)
+        y = np.where(flip, n - 1 - y, y)
+        x, y = np.where(ry, x, y), np.where(ry, y, x)
+        s //= 2
+
+    return keys
+
+
+
+# Computes the curve keys of one slice of MBRs (executed in a worker process)
+# extent is the MBR of all centers, used by the Hilbert grid
+def curve_keys(strategy, mbrs, extent):
+    cx = (mbrs[:, 0] + mbrs[:, 1]) / 2
+    cy = (mbrs[:, 2] + mbrs[:, 3]) / 2
+
+    if strategy == "zorder":
+        return zorder_keys(cy, cx)
+
+    x_low, x_high, y_low, y_high = extent
+    side = (1 << HILBERT_ORDER) - 1
+    x_scale = side / (x_high - x_low) if x_high > x_low else 0
+    y_scale = side / (y_high - y_low) if y_high > y_low else 0
+    return hilbert_keys(side + 1, (cx - x_low) * x_scale, (cy - y_low) * y_scale)
+
+
+
+# Yields the (key, position) pairs of one sorted run file block by block
+def read_run(path):
+    run = np.load(path, mmap_mode="r")
+
+    for i in range(0, len(run), MERGE_BLOCK):
+        block = run[i:i + MERGE_BLOCK]
+        yield from zip(block["key"].tolist(), block["position"].tolist())
+
+
+
+# Returns the stable sort order of the keys
+# Up to max_size keys are sorted in memory; more keys are sorted in runs of max_size written to
+# temporary files and merged with a k-way merge, ties keep their original order like sorted()
+def sort_order(keys, max_size=MAX_SORT_SIZE):
+    if len(keys) <= max_size:
+        return np.argsort(keys, kind="stable")
+
+    run_type = np.dtype([("key", keys.dtype), ("position", np.int64)])
+    order = np.empty(len(keys), dtype=np.int64)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = []
+
+        for start in range(0, len(keys), max_size):
+            part = keys[start:start + max_size]
+            run_order = np.argsort(part, kind="stable")
+            run = np.empty(len(part), dtype=run_type)
+            run["key"] = part[run_order]
+            run["position"] = run_order + start
+            paths.append(os.path.join(temp_dir, f"run{len(paths)}.npy"))
+            np.save(paths[-1], run)
+            del run
+
+        for i, (_, position) in enumerate(heapq.merge(*(read_run(path) for path in paths))):
+            order[i] = position
+
+    return order
+
+
+
+# Sort-Tile-Recursive order of MBRs, the array form of rtree_builder.str_sort
+def str_order(mbrs):
+    cx = (mbrs[:, 0] + mbrs[:, 1]) / 2
+    cy = (mbrs[:, 2] + mbrs[:, 3]) / 2
+    nodes = math.ceil(len(mbrs) / MAX_ENTRIES)
+    slice_size = math.ceil(math.sqrt(nodes)) * MAX_ENTRIES
+    by_x = np.argsort(cx, kind="stable")
+    by_y = np.lexsort((cy[by_x], np.arange(len(mbrs)) // slice_size))
+    return by_x[by_y]
+
+
+
+# Returns the sizes of the nodes rtree_builder.fix_chunks makes from n entries
+# Only the last few chunks depend on n, so fix_chunks runs on the tail alone
+def chunk_sizes(n):
+    full = max(0, n // MAX_ENTRIES - 2)
+    return [MAX_ENTRIES] * full + [len(chunk) for chunk in fix_chunks(list(range(n - full * MAX_ENTRIES)))]
+
+
+
+# Packs the ordered entries of a level into nodes
+# Returns the level as (node sizes, entry ids, entry MBRs) and the MBRs of its nodes
+def pack_level(ids, mbrs):
+    sizes = np.array(chunk_sizes(len(ids)), dtype=np.int64)
+    bounds = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    node_mbrs = np.empty((len(sizes), 4), dtype=np.float64)
+    node_mbrs[:, 0] = np.minimum.reduceat(mbrs[:, 0], bounds)
+    node_mbrs[:, 1] = np.maximum.reduceat(mbrs[:, 1], bounds)
+    node_mbrs[:, 2] = np.minimum.reduceat(mbrs[:, 2], bounds)
+    node_mbrs[:, 3] = np.maximum.reduceat(mbrs[:, 3], bounds)
+    return (sizes, ids, mbrs), node_mbrs
+
+
+
+# Builds all levels bottom-up from the object ids and MBRs in packing order
+# Returns the levels (leaves first) as (sizes, entry ids, entry MBRs) with consecutive node ids
+def build_levels(ids, mbrs, strategy):
+    levels = []
+    next_id = 0
+
+    while True:
+        level, node_mbrs = pack_level(ids, mbrs)
+        levels.append(level)
+        node_ids = np.arange(next_id, next_id + len(node_mbrs), dtype=np.int64)
+        next_id += len(node_mbrs)
+
+        if len(node_mbrs) <= 1:
+            return levels
+
+        ids, mbrs = node_ids, node_mbrs
+
+        if strategy == "str":
+            order = str_order(mbrs)
+            ids, mbrs = ids[order], mbrs[order]
+
+
+
+# Writes the levels as Rtree.txt (one JSON node per line, same text as rtree_builder.py)
+def write_text(levels, path):
+    node_id = 0
+
+    with open(path, 'w') as out:
+        for level, (sizes, ids, mbrs) in enumerate(levels):
+            isnonleaf = 1 if level else 0
+            ids = ids.tolist()
+            mbrs = mbrs.tolist()
+            position = 0
+
+            for size in sizes.tolist():
+                entries = [[ids[i], mbrs[i]] for i in range(position, position + size)]
+                out.write(json.dumps([isnonleaf, node_id, entries]) + "\n")
+                node_id += 1
+                position += size
+
+
+
+# Writes the levels as a binary R-tree file, filling the pages of each level with array assignments
+def write_binary(levels, path):
+    node_count = sum(len(sizes) for sizes, _, _ in levels)
+
+    with open(path, 'wb') as out:
+        out.write(HEADER.pack(MAGIC, VERSION, MAX_ENTRIES, node_count, node_count - 1, len(levels)).ljust(HEADER_SIZE, b"\0"))
+
+        for level, (sizes, ids, mbrs) in enumerate(levels):
+            pages = np.zeros(len(sizes), dtype=page_dtype(MAX_ENTRIES))
+            pages["isnonleaf"] = 1 if level else 0
+            pages["count"] = sizes
+
+            # Entry i goes to slot (i - first entry of its node) of its node
+            nodes = np.repeat(np.arange(len(sizes)), sizes)
+            slots = np.arange(len(ids)) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+            pages["ids"][nodes, slots] = ids
+            pages["mbrs"][nodes, slots] = mbrs
+            out.write(pages.tobytes())
+
+
+
+# Bulk loads an R-tree from coords.txt / offsets.txt with a pool of worker processes
+# Writes Rtree.txt, or the binary format when output_file ends with .bin; returns the number of nodes per level
+def bulk_load(coords_file, offsets_file, output_file, strategy="zorder", workers=None, chunk_size=CHUNK_SIZE, max_sort_size=MAX_SORT_SIZE):
+    if strategy not in STRATEGIES:
+        raise ValueError(f"unknown strategy {strategy}, expected one of {', '.join(STRATEGIES)}")
+
+    object_ids, starts, ends = read_offsets_array(offsets_file)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        mbrs = object_mbrs(coords_file, starts, ends, pool, chunk_size)
+
+        if strategy == "str":
+            order = str_order(mbrs)
+
+        else:
+            centers = np.column_stack(((mbrs[:, 0] + mbrs[:, 1]) / 2, (mbrs[:, 2] + mbrs[:, 3]) / 2))
+            extent = (centers[:, 0].min(), centers[:, 0].max(), centers[:, 1].min(), centers[:, 1].max())
+            slices = [mbrs[i:i + KEYS_PER_TASK] for i in range(0, len(mbrs), KEYS_PER_TASK)]
+            keys = np.concatenate(list(pool.map(curve_keys, [strategy] * len(slices), slices, [extent] * len(slices))))
+            order = sort_order(keys, max_sort_size)
+
+    levels = build_levels(object_ids[order], mbrs[order], strategy)
+
+    if output_file.endswith(".bin"):
+        write_binary(levels, output_file)
+
+    else:
+        write_text(levels, output_file)
+
+    return [len(sizes) for sizes, _, _ in levels]
+
+
+
+# MAIN function
+if __name__ == "__main__":
+    options = {arg.split("=", 1)[0]: arg.split("=", 1)[1] for arg in sys.argv[1:] if arg.startswith("--") and "=" in arg}
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    strategy = options.get("--strategy", "zorder")
+
+    if len(args) not in (2, 3) or strategy not in STRATEGIES or set(options) - {"--strategy", "--workers", "--chunk-size"}:
+        print("Usage: python bulk_loader.py coords.txt offsets.txt [Rtree.txt | Rtree.bin] [--strategy=zorder|str|hilbert] [--workers=N] [--chunk-size=BYTES]")
+        sys.exit()
+
+    workers = int(options["--workers"]) if "--workers" in options else None
+    chunk_size = int(options.get("--chunk-size", CHUNK_SIZE))
+    output_file = args[2] if len(args) == 3 else "Rtree.txt"
+
+    for i, count in enumerate(bulk_load(args[0], args[1], output_file, strategy, workers, chunk_size)):
+        print(f"{count} nodes at level {i}")
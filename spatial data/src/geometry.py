@@ -0,0 +1,205 @@
+# Author: Gkovaris Christos-Grigorios
+
+
+
+# Importing required modules
+import numpy as np
+
+
+
+# Exact polygon geometry for the refinement step of the queries
+# The R-tree only stores MBRs, so its answers are candidates: a window can intersect the MBR of a polygon
+# without touching the polygon, and the MBR distance of a point is only a lower bound of its polygon distance
+# The tests below treat polygons as closed areas (the interior and the boundary belong to the polygon)
+
+
+
+# Vertices of all polygons in flat arrays, as read from coords.txt / offsets.txt
+#   xs, ys (v,): vertex coordinates, the vertices of one polygon are consecutive
+#   starts, ends (n,): first and last vertex of each object id (ends is inclusive, -1 for missing ids)
+#   mbrs (n, 4): MBR [x_low, x_high, y_low, y_high] of each polygon
+# The last vertex of a polygon is connected back to its first one
+class PolygonStore:
+    def __init__(self, xs, ys, starts, ends):
+        self.xs = xs
+        self.ys = ys
+        self.starts = starts
+        self.ends = ends
+        self.mbrs = np.zeros((len(starts), 4), dtype=np.float64)
+
+        present = np.flatnonzero(ends >= starts)
+
+        if len(present):
+            vertices, first = self.vertex_index(present)
+            self.mbrs[present, 0] = np.minimum.reduceat(xs[vertices], first)
+            self.mbrs[present, 1] = np.maximum.reduceat(xs[vertices], first)
+            self.mbrs[present, 2] = np.minimum.reduceat(ys[vertices], first)
+            self.mbrs[present, 3] = np.maximum.reduceat(ys[vertices], first)
+
+    def __len__(self):
+        return len(self.starts)
+
+    # Returns the vertex indices of the given objects one polygon after the other,
+    # and the position of the first vertex of each polygon in that array (for reduceat)
+    def vertex_index(self, object_ids):
+        starts = self.starts[object_ids]
+        lengths = self.ends[object_ids] - starts + 1
+        first = np.zeros(len(object_ids), dtype=np.int64)
+        np.cumsum(lengths[:-1], out=first[1:])
+        vertices = np.arange(lengths.sum()) + np.repeat(starts - first, lengths)
+        return vertices, first
+
+    # Returns the edges (x1, y1, x2, y2) of the given objects and the position of the first edge of each polygon
+    def edges(self, object_ids):
+        vertices, first = self.vertex_index(object_ids)
+        following = vertices + 1
+        following[np.append(first[1:], len(vertices)) - 1] = self.starts[object_ids]
+        return self.xs[vertices], self.ys[vertices], self.xs[following], self.ys[following], first
+
+    # Returns the vertices of one polygon as a list of (x, y)
+    def polygon(self, object_id):
+        start, end = self.starts[object_id], self.ends[object_id] + 1
+        return list(zip(self.xs[start:end].tolist(), self.ys[start:end].tolist()))
+
+
+
+# Loads the polygons from coords.txt ("x,y" per line) and offsets.txt ("id,startOffset,endOffset" per line)
+def load_polygons(coords_file, offsets_file):
+    coords = np.loadtxt(coords_file, delimiter=',', dtype=np.float64, ndmin=2)
+    offsets = np.loadtxt(offsets_file, delimiter=',', dtype=np.int64, ndmin=2)
+    count = int(offsets[:, 0].max()) + 1 if len(offsets) else 0
+    starts = np.zeros(count, dtype=np.int64)
+    ends = np.full(count, -1, dtype=np.int64)
+    starts[offsets[:, 0]] = offsets[:, 1]
+    ends[offsets[:, 0]] = offsets[:, 2]
+    return PolygonStore(coords[:, 0].copy(), coords[:, 1].copy(), starts, ends)
+
+
+
+# Counts the crossings of the edges with the horizontal ray from (px, py) towards +x (even-odd rule)
+# Returns the number of crossings per polygon
+def ray_crossings(x1, y1, x2, y2, first, px, py):
+    straddles = (y1 > py) != (y2 > py)
+
+    # Only edges that straddle the ray are divided, so y2 - y1 is never 0 there
+    with np.errstate(divide='ignore', invalid='ignore'):
+        crossing_x = x1 + (py - y1) * (x2 - x1) / (y2 - y1)
+
+    return np.add.reduceat((straddles & (px < crossing_x)).astype(np.int64), first)
+
+
+
+# Checks which of the given polygons intersect the rectangle [x_low, x_high, y_low, y_high]
+# A polygon intersects the rectangle if one of its edges does, or if the rectangle lies inside it
+# Returns a boolean array aligned with object_ids
+def polygons_intersect_rect(polygons, object_ids, rect):
+    object_ids = np.asarray(object_ids, dtype=np.int64)
+
+    if len(object_ids) == 0:
+        return np.zeros(0, dtype=bool)
+
+    x_low, x_high, y_low, y_high = rect
+    x1, y1, x2, y2, first = polygons.edges(object_ids)
+
+    # Edge and rectangle overlap on both axes
+    overlaps = (
+        (np.minimum(x1, x2) <= x_high) & (np.maximum(x1, x2) >= x_low) &
+        (np.minimum(y1, y2) <= y_high) & (np.maximum(y1, y2) >= y_low)
+    )
+
+    # ... and the line of the edge does not leave all four corners on the same side
+    dx = x2 - x1
+    dy = y2 - y1
+    sides = [dx * (cy - y1) - dy * (cx - x1) for cx, cy in ((x_low, y_low), (x_low, y_high), (x_high, y_low), (x_high, y_high))]
+    above = (sides[0] > 0) & (sides[1] > 0) & (sides[2] > 0) & (sides[3] > 0)
+    below = (sides[0] < 0) & (sides[1] < 0) & (sides[2] < 0) & (sides[3] < 0)
+    edge_hits = np.logical_or.reduceat(overlaps & ~(above | below), first)
+
+    # No edge crosses the rectangle: it is either outside the polygon or completely inside it
+    return edge_hits | (ray_crossings(x1, y1, x2, y2, first, x_low, y_low) % 2 == 1)
+
+
+
+# Computes the Euclidean distance between a point and each of the given polygons (0 if the point is inside)
+# Returns a float array aligned with object_ids
+def point_polygon_distances(polygons, object_ids, point):
+    object_ids = np.asarray(object_ids, dtype=np.int64)
+
+    if len(object_ids) == 0:
+        return np.zeros(0, dtype=np.float64)
+
+    px, py = point
+    x1, y1, x2, y2, first = polygons.edges(object_ids)
+
+    # Closest point of every edge: projection of the point clamped to the segment
+    dx = x2 - x1
+    dy = y2 - y1
+    length = dx * dx + dy * dy
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.where(length > 0, ((px - x1) * dx + (py - y1) * dy) / length, 0.0)
+
+    t = np.clip(t, 0.0, 1.0)
+    ex = x1 + t * dx - px
+    ey = y1 + t * dy - py
+    distances = np.sqrt(np.minimum.reduceat(ex * ex + ey * ey, first))
+
+    distances[ray_crossings(x1, y1, x2, y2, first, px, py) % 2 == 1] = 0.0
+    return distances
+
+
+
+# Counters of the refinement step: candidates produced by the MBR filter and hits that survive the exact test
+# Candidates whose MBR lies inside the query window are hits without an exact test (accepted)
+class RefinementStats:
+    def __init__(self):
+        self.queries = 0
+        self.candidates = 0
+        self.accepted = 0
+        self.refined = 0
+        self.hits = 0
+
+    def add(self, candidates, hits, accepted=0, refined=None):
+        self.queries += 1
+        self.candidates += candidates
+        self.accepted += accepted
+        self.refined += candidates - accepted if refined is None else refined
+        self.hits += hits
+
+    def summary(self):
+        return {
+            "queries": self.queries,
+            "candidates": self.candidates,
+            "accepted_by_mbr": self.accepted,
+            "exact_tests": self.refined,
+            "hits": self.hits,
+            "false_positives": self.candidates - self.hits,
+            "precision": self.hits / self.candidates if self.candidates else 1.0,
+        }
+
+    def __str__(self):
+        summary = self.summary()
+        return (
+            f"{summary['queries']} queries: {summary['candidates']} candidates, {summary['hits']} hits "
+            f"({summary['false_positives']} false positives, precision {summary['precision']:.3f}), "
+            f"{summary['exact_tests']} exact tests, {summary['accepted_by_mbr']} accepted by MBR"
+        )
+
+
+
+# Refinement step of a range query: keeps the candidate ids whose polygons intersect the window
+# rect is [x_low, x_high, y_low, y_high]; the candidates keep their order
+def refine_range(polygons, candidates, rect, stats=None):
+    ids = np.asarray(candidates, dtype=np.int64)
+    mbrs = polygons.mbrs[ids]
+    x_low, x_high, y_low, y_high = rect
+
+    # Polygons whose MBR lies inside the window certainly intersect it
+    inside = (mbrs[:, 0] >= x_low) & (mbrs[:, 1] <= x_high) & (mbrs[:, 2] >= y_low) & (mbrs[:, 3] <= y_high)
+    hits = inside.copy()
+    hits[~inside] = polygons_intersect_rect(polygons, ids[~inside], rect)
+
+    if stats is not None:
+        stats.add(len(ids), int(hits.sum()), int(inside.sum()))
+
+    return ids[hits].tolist()
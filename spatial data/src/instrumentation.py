@@ -0,0 +1,177 @@
+# Author: Gkovaris Christos-Grigorios
+
+
+
+# Importing required modules
+import sys
+import time
+import math
+import cProfile
+import pstats
+from range_query import load_rtree, range_query
+from knn_query import knn_search
+from latency import percentile
+from rtree_file import RtreeFile
+
+
+
+# Counters of one query (or the sum over many queries)
+#   nodes_visited: nodes whose entries were examined
+#   mbr_tests: entry MBRs tested against the window or measured against the point
+#   heap_pushes / heap_pops: priority queue operations of kNN
+#   pruned: kNN entries never queued because they lie beyond the k-th distance
+#   results: objects returned
+class QueryCounters:
+    FIELDS = ("nodes_visited", "mbr_tests", "heap_pushes", "heap_pops", "pruned", "results")
+
+    def __init__(self):
+        for field in self.FIELDS:
+            setattr(self, field, 0)
+
+    def add(self, other):
+        for field in self.FIELDS:
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+
+    def __str__(self):
+        return ", ".join(f"{field.replace('_', ' ')} {getattr(self, field)}" for field in self.FIELDS)
+
+
+
+# Latencies of a workload: exact percentiles from the samples and a histogram with power-of-2 buckets (in microseconds)
+class LatencyHistogram:
+    def __init__(self):
+        self.samples = []
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def percentile(self, p):
+        return percentile(sorted(self.samples), p)
+
+    # Returns (upper bound in microseconds, count) for the buckets 1, 2, 4, ... that hold samples
+    def buckets(self):
+        counts = {}
+
+        for seconds in self.samples:
+            bound = 1 << max(0, math.ceil(math.log2(max(seconds * 1e6, 1))))
+            counts[bound] = counts.get(bound, 0) + 1
+
+        return sorted(counts.items())
+
+    def summary(self):
+        total = sum(self.samples)
+        return {
+            "queries": len(self.samples),
+            "throughput": len(self.samples) / total if total else 0.0,
+            "mean_ms": total / len(self.samples) * 1000 if self.samples else 0.0,
+            "p50_ms": self.percentile(50) * 1000,
+            "p90_ms": self.percentile(90) * 1000,
+            "p99_ms": self.percentile(99) * 1000,
+            "max_ms": max(self.samples) * 1000 if self.samples else 0.0,
+        }
+
+    def __str__(self):
+        summary = self.summary()
+        lines = [
+            f"{summary['queries']} queries, {summary['throughput']:.0f} queries/s, mean {summary['mean_ms']:.3f} ms, "
+            f"p50 {summary['p50_ms']:.3f} ms, p90 {summary['p90_ms']:.3f} ms, p99 {summary['p99_ms']:.3f} ms, max {summary['max_ms']:.3f} ms"
+        ]
+        width = max((count for _, count in self.buckets()), default=1)
+
+        for bound, count in self.buckets():
+            lines.append(f"  <= {bound:>8} us {count:>8} {'#' * max(1, round(40 * count / width))}")
+
+        return "\n".join(lines)
+
+
+
+# Runs queries with per-query counters and latencies
+# Every run_* method answers one query and returns (results, counters of the query, latency in seconds)
+class InstrumentedQueries:
+    def __init__(self, rtree):
+        self.rtree = rtree
+        self.root_id = rtree.root_id if isinstance(rtree, RtreeFile) else max(rtree.keys())
+        self.totals = {"range": QueryCounters(), "knn": QueryCounters()}
+        self.latencies = {"range": LatencyHistogram(), "knn": LatencyHistogram()}
+
+    def record(self, query_type, counters, latency):
+        self.totals[query_type].add(counters)
+        self.latencies[query_type].add(latency)
+
+    # Answers a range query on the window [x_low, x_high, y_low, y_high]
+    def run_range(self, query_rect):
+        counters = QueryCounters()
+        results = []
+        start = time.perf_counter()
+        range_query(self.root_id, query_rect, self.rtree, results, counters)
+        latency = time.perf_counter() - start
+        self.record("range", counters, latency)
+        return results, counters, latency
+
+    # Answers a kNN query for the point (x, y)
+    def run_knn(self, point, k):
+        counters = QueryCounters()
+        start = time.perf_counter()
+        results = knn_search(self.root_id, point, k, self.rtree, counters)
+        latency = time.perf_counter() - start
+        self.record("knn", counters, latency)
+        return results, counters, latency
+
+    # Prints the totals, the averages per query and the latency histogram of every query type that ran
+    def report(self, out=sys.stdout):
+        for query_type in ("range", "knn"):
+            queries = len(self.latencies[query_type].samples)
+
+            if queries:
+                totals = self.totals[query_type]
+                averages = ", ".join(f"{field.replace('_', ' ')} {getattr(totals, field) / queries:.2f}" for field in QueryCounters.FIELDS)
+                print(f"{query_type}: {self.latencies[query_type]}", file=out)
+                print(f"  per query: {averages}", file=out)
+
+
+
+# Runs a function under cProfile when a profile file is given, saving the statistics there
+# and printing the functions with the largest cumulative time to stderr
+def profiled(profile_file, function, *args):
+    if not profile_file:
+        return function(*args)
+
+    profiler = cProfile.Profile()
+    result = profiler.runcall(function, *args)
+    profiler.dump_stats(profile_file)
+    pstats.Stats(profile_file, stream=sys.stderr).sort_stats("cumulative").print_stats(15)
+    return result
+
+
+
+# Runs the range or kNN query file and prints the per-query counters and latencies and the summary
+def run_workload(command, rtree_file, queries_file, k=None):
+    queries = InstrumentedQueries(load_rtree(rtree_file))
+
+    with open(queries_file, 'r') as f:
+        for i, line in enumerate(f):
+            if command == "range":
+                x_low, y_low, x_high, y_high = map(float, line.split())
+                _, counters, latency = queries.run_range([x_low, x_high, y_low, y_high])
+
+            else:
+                x, y = map(float, line.split())
+                _, counters, latency = queries.run_knn((x, y), k)
+
+            print(f"{i}: {counters}, latency {latency * 1000:.3f} ms")
+
+    queries.report()
+
+
+
+# MAIN function
+if __name__ == "__main__":
+    profile_files = [arg.split("=", 1)[1] for arg in sys.argv[1:] if arg.startswith("--profile=")]
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--profile=")]
+
+    if not ((len(args) == 3 and args[0] == "range") or (len(args) == 4 and args[0] == "knn")):
+        print("Usage: python instrumentation.py range Rtree.txt Rqueries.txt [--profile=FILE]\n"
+              "       python instrumentation.py knn Rtree.txt NNqueries.txt k [--profile=FILE]")
+        sys.exit()
+
+    profiled(profile_files[-1] if profile_files else None, run_workload, args[0], args[1], args[2], int(args[3]) if len(args) == 4 else None)
@@ -5,14 +5,32 @@
 # Importing required modules
 import sys
 import ast
+from rtree_file import RtreeFile, is_rtree_file
+from geometry import RefinementStats, load_polygons, point_polygon_distances
+from batch_range_query import map_arrays, load_arrays
+from buffer_pool import PagedRtree, pool_options
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import heapq
 import math
 
 
 
+# Number of query points answered by one task of the worker processes
+POINTS_PER_TASK = 256
+
+# Trees opened by a worker process, by file name (every worker opens each tree once)
+open_trees = {}
+
+
+
 # Loads an R-tree from the given file
 # Returns a dictionary of nodes with node_id as key and its metadata as value
 def load_rtree(file_path):
+    # Binary R-tree files are memory mapped, nodes are decoded only when visited
+    if is_rtree_file(file_path):
+        return RtreeFile(file_path)
+
     rtree = {}
     
     with open(file_path, 'r') as f:
@@ -26,83 +44,285 @@ def load_rtree(file_path):
 
 
 
-# Computes the shortest Euclidean distance between a point and an MBR
-# If the point is inside the MBR, the distance is 0
-def point_mbr_distance(point, mbr):
+# Performs best-first (incremental) kNN search using a priority queue
+# Queue items are (squared distance, kind, id) tuples: squared distances order the items like the distances
+# and need no square root, and kind 0 (node) / 1 (object) keeps nodes before objects at equal distance
+# A tree reaches every node once, so no visited set is needed
+# The k smallest object distances queued so far bound the answer: entries farther away are never queued
+# The work is counted in the optional counters (instrumentation.QueryCounters); the queue operations follow
+# from the visited nodes and tested entries, so the search loop itself is not slowed down
+def knn_search(root_id, point, k, rtree, counters=None):
     x, y = point
-    x_low, x_high, y_low, y_high = mbr
-    dx = max(x_low - x, 0, x - x_high)
-    dy = max(y_low - y, 0, y - y_high)
-    return math.sqrt(dx*dx + dy*dy)
+    heap = [(0.0, 0, root_id)]
+    best = []
+    bound = math.inf
+    result = []
+    visited = 0
+    tested = 0
 
+    while heap and len(result) < k:
+        _, kind, item_id = heapq.heappop(heap)
 
+        if kind:
+            # Add object id to result list
+            result.append(item_id)
+            continue
 
-# Performs best-first (incremental) kNN search using a priority queue
-# Pushes both node and object MBRs into the queue, sorted by distance
-def knn_search(root_id, point, k, rtree):
-    heap = []
+        node = rtree[item_id]
+        leaf = not node["isnonleaf"]
+        visited += 1
+        tested += len(node["entries"])
+
+        for entry_id, (x_low, x_high, y_low, y_high) in node["entries"]:
+            dx = x_low - x if x < x_low else (x - x_high if x > x_high else 0.0)
+            dy = y_low - y if y < y_low else (y - y_high if y > y_high else 0.0)
+            d = dx * dx + dy * dy
+
+            if d > bound:
+                continue
+
+            heapq.heappush(heap, (d, leaf, entry_id))
+
+            # Keep the k smallest object distances in a max-heap (negated values)
+            if leaf:
+                if len(best) < k:
+                    heapq.heappush(best, -d)
 
-    # Start with root node at distance 0
-    heapq.heappush(heap, (0, ("node", root_id)))  
+                else:
+                    heapq.heapreplace(best, -d)
+
+                if len(best) == k:
+                    bound = -best[0]
+
+    # Every pop was a visited node or a result, and every push was popped or is still queued
+    if counters is not None:
+        pops = visited + len(result)
+        pushes = pops + len(heap)
+        counters.nodes_visited += visited
+        counters.mbr_tests += tested
+        counters.heap_pops += pops
+        counters.heap_pushes += pushes
+        counters.pruned += tested - (pushes - 1)
+        counters.results += len(result)
+
+    return result
 
+
+
+# kNN search on the array form of the tree (batch_range_query.ArrayRtree)
+# Same queue and bound as knn_search, but the distances of all entries of a node are computed
+# in one vectorized step on the (x, y) low and high corners of the entry MBRs
+def knn_search_arrays(tree, point, k):
+    query = np.array(point, dtype=np.float64)
+    lows = tree.mbrs[:, :, 0::2]
+    highs = tree.mbrs[:, :, 1::2]
+    heap = [(0.0, 0, tree.root_id)]
+    best = []
+    bound = math.inf
     result = []
-    visited = set()
 
     while heap and len(result) < k:
-        dist, (item_type, item_id) = heapq.heappop(heap)
+        _, kind, item_id = heapq.heappop(heap)
 
-        if (item_type, item_id) in visited:
+        if kind:
+            result.append(item_id)
             continue
-        
-        visited.add((item_type, item_id))
 
-        if item_type == "node":
+        count = tree.counts[item_id]
+        gaps = np.maximum(lows[item_id, :count] - query, 0.0) + np.maximum(query - highs[item_id, :count], 0.0)
+        leaf = not tree.isnonleaf[item_id]
+
+        for d, entry_id in zip((gaps * gaps).sum(axis=1).tolist(), tree.ids[item_id, :count].tolist()):
+            if d > bound:
+                continue
+
+            heapq.heappush(heap, (d, leaf, entry_id))
+
+            if leaf:
+                if len(best) < k:
+                    heapq.heappush(best, -d)
+
+                else:
+                    heapq.heapreplace(best, -d)
+
+                if len(best) == k:
+                    bound = -best[0]
+
+    return result
+
+
+
+# Best-first kNN search on the exact polygon distances (filter and refine)
+# Objects first enter the queue with their MBR distance, which is a lower bound of the polygon distance;
+# when such a candidate comes out of the queue its exact distance is computed and it is queued again
+# An object is reported only when it comes out with its exact distance, so the ranking is exact
+# As in knn_search the queue holds squared distances, and the k smallest exact distances found so far bound
+# the answer: entries and candidates farther away are neither queued nor refined
+def knn_search_exact(root_id, point, k, rtree, polygons, stats=None):
+    x, y = point
+    heap = [(0.0, 0, root_id)]
+    best = []
+    bound = math.inf
+    result = []
+    candidates = 0
+
+    # Queue items are (squared distance, kind, id) with kind 0 = node, 1 = object MBR, 2 = exact object distance
+    while heap and len(result) < k:
+        dist, kind, item_id = heapq.heappop(heap)
+
+        if kind == 0:
             node = rtree[item_id]
-            
-            for entry_id, entry_mbr in node["entries"]:
-                d = point_mbr_distance(point, entry_mbr)
-                entry_type = "node" if node["isnonleaf"] else "object"
+            entry_kind = 0 if node["isnonleaf"] else 1
 
-                # Add to heap
-                heapq.heappush(heap, (d, (entry_type, entry_id)))  
+            for entry_id, (x_low, x_high, y_low, y_high) in node["entries"]:
+                dx = x_low - x if x < x_low else (x - x_high if x > x_high else 0.0)
+                dy = y_low - y if y < y_low else (y - y_high if y > y_high else 0.0)
+                d = dx * dx + dy * dy
 
-        elif item_type == "object":
-            # Add object id to result list
-            result.append(item_id)  
+                if d <= bound:
+                    heapq.heappush(heap, (d, entry_kind, entry_id))
+
+        elif kind == 1:
+            # The bound may have shrunk since the candidate was queued
+            if dist > bound:
+                continue
+
+            # Refine the candidate together with the other candidates queued at the same distance
+            batch = [item_id]
+
+            while heap and heap[0][1] == 1 and heap[0][0] == dist:
+                batch.append(heapq.heappop(heap)[2])
+
+            candidates += len(batch)
+
+            for object_id, exact in zip(batch, point_polygon_distances(polygons, batch, point).tolist()):
+                d = exact * exact
+                heapq.heappush(heap, (d, 2, object_id))
+
+                # Keep the k smallest exact distances in a max-heap (negated values)
+                if len(best) < k:
+                    heapq.heappush(best, -d)
+
+                elif d < -best[0]:
+                    heapq.heapreplace(best, -d)
+
+                if len(best) == k:
+                    bound = -best[0]
+
+        else:
+            result.append(item_id)
+
+    if stats is not None:
+        stats.add(candidates, len(result), refined=candidates)
 
     return result
 
 
 
+# Answers one chunk of query points (executed in a worker process)
+# Binary trees are mapped as arrays without copying them, text trees are parsed once per worker
+def knn_chunk(rtree_file, points, k):
+    if rtree_file not in open_trees:
+        open_trees[rtree_file] = map_arrays(rtree_file) if is_rtree_file(rtree_file) else load_rtree(rtree_file)
+
+    rtree = open_trees[rtree_file]
+
+    if isinstance(rtree, dict):
+        root_id = max(rtree.keys())
+        return [knn_search(root_id, point, k, rtree) for point in points]
+
+    return [knn_search_arrays(rtree, point, k) for point in points]
+
+
+
+# Answers many kNN queries in parallel: the points are split into chunks of POINTS_PER_TASK
+# that worker processes answer independently; the results keep the order of the points
+def batch_knn(rtree_file, points, k, workers):
+    chunks = [points[i:i + POINTS_PER_TASK] for i in range(0, len(points), POINTS_PER_TASK)]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(knn_chunk, rtree_file, chunk, k) for chunk in chunks]
+        return [neighbors for future in futures for neighbors in future.result()]
+
+
+
 # Main function to parse arguments and process queries
 def main():
-    if len(sys.argv) != 4:
-        print("Usage: python knn_query.py Rtree.txt NNqueries.txt k")
+    args, pool = pool_options(sys.argv[1:])
+    workers = [int(arg.split("=", 1)[1]) for arg in args if arg.startswith("--workers=")]
+    args = [arg for arg in args if not arg.startswith("--workers=")]
+    workers = workers[-1] if workers else 1
+
+    if len(args) not in (3, 5) or (workers > 1 and (len(args) == 5 or pool)) or (pool and not is_rtree_file(args[0])):
+        print("Usage: python knn_query.py Rtree.txt NNqueries.txt k [coords.txt offsets.txt] [--workers=N | --buffer=PAGES --pin=LEVELS (Rtree.bin)]")
         return
 
     # Input file containing R-tree structure
-    rtree_file = sys.argv[1]      
+    rtree_file = args[0]
 
     # Input file with query points
-    queries_file = sys.argv[2]    
+    queries_file = args[1]
 
     # Number of nearest neighbors to return
-    k = int(sys.argv[3])          
+    k = int(args[2])
+
+    # Batched queries in parallel worker processes
+    if workers > 1:
+        with open(queries_file, 'r') as f:
+            points = [tuple(map(float, line.split())) for line in f if line.strip()]
+
+        for i, neighbors in enumerate(batch_knn(rtree_file, points, k, workers)):
+            print(f"{i}: {','.join(map(str, neighbors))}")
+
+        return
+
+    # With the polygon files the neighbors are ranked by their exact distance
+    polygons = load_polygons(args[3], args[4]) if len(args) == 5 else None
+    stats = RefinementStats()
+
+    # Plain queries run on the array form of the tree; read a binary tree through a buffer pool of the given size
+    if pool is None and polygons is None:
+        tree = load_arrays(rtree_file)
 
-    rtree = load_rtree(rtree_file)
+        with open(queries_file, 'r') as f:
+            for i, line in enumerate(f):
+                # Parse query point
+                x, y = map(float, line.strip().split())
 
-    # The root node is the one with the largest ID
-    root_id = max(rtree.keys())   
+                # Print kNN result
+                print(f"{i}: {','.join(map(str, knn_search_arrays(tree, (x, y), k)))}")
+
+        return
+
+    rtree = load_rtree(rtree_file) if pool is None else PagedRtree(rtree_file, *pool)
+
+    # The root node is the one with the largest ID; binary files store it in their header
+    root_id = rtree.root_id if isinstance(rtree, RtreeFile) else max(rtree.keys())
 
     with open(queries_file, 'r') as f:
         for i, line in enumerate(f):
             # Parse query point
             x, y = map(float, line.strip().split())  
-            neighbors = knn_search(root_id, (x, y), k, rtree)
+            before = rtree.stats.copy() if pool else None
+
+            if polygons is None:
+                neighbors = knn_search(root_id, (x, y), k, rtree)
+
+            else:
+                neighbors = knn_search_exact(root_id, (x, y), k, rtree, polygons, stats)
+
+            if pool:
+                print(f"{i}: {rtree.stats.since(before)}", file=sys.stderr)
 
             # Print kNN result
             print(f"{i}: {','.join(map(str, neighbors))}")  
 
+    if polygons is not None:
+        print(f"refinement: {stats}", file=sys.stderr)
+
+    if pool:
+        print(f"buffer pool ({pool[0]} pages, {len(rtree.pinned)} pinned): {rtree.stats}", file=sys.stderr)
+
 
 
 # MAIN function
@@ -0,0 +1,10 @@
+# Author: Gkovaris Christos-Grigorios
+
+
+
+# Returns the p-th percentile of a sorted list
+def percentile(values, p):
+    if not values:
+        return 0.0
+
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
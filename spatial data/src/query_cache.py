@@ -0,0 +1,269 @@
+# Author: Gkovaris Christos-Grigorios
+
+
+
+# Importing required modules
+import sys
+from collections import OrderedDict
+from range_query import load_rtree, mbr_intersects
+from rtree_builder import compute_mbr_union
+from rtree_file import RtreeFile
+
+
+
+# Default number of windows kept by the result cache
+DEFAULT_CACHE_SIZE = 256
+
+# Default number of grid cells per axis of the grid directory
+DEFAULT_GRID_SIZE = 64
+
+
+
+# Returns a window [x_low, x_high, y_low, y_high] as a hashable tuple of floats
+# The coordinates are kept as given, so a window selects the same objects as in range_query.py
+def normalize(rect):
+    return tuple(map(float, rect))
+
+
+
+# Range query that collects the (object id, MBR) leaf entries intersecting the window
+# Returns the number of nodes visited
+def range_entries(node_id, query_rect, rtree, results):
+    node = rtree[node_id]
+    visited = 1
+
+    for entry in node["entries"]:
+        if mbr_intersects(entry[1], query_rect):
+            if node["isnonleaf"]:
+                visited += range_entries(entry[0], query_rect, rtree, results)
+
+            else:
+                results.append(entry)
+
+    return visited
+
+
+
+# LRU cache of range query results, keyed by normalized windows
+# Every result keeps the MBRs of its objects, so a window that lies inside a cached window is answered
+# by filtering the cached entries instead of traversing the tree (containment reuse)
+class ResultCache:
+    def __init__(self, size=DEFAULT_CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.containment_hits = 0
+        self.misses = 0
+
+    # Returns the (object id, MBR) entries of a window, or None when the cache cannot answer it
+    def lookup(self, rect):
+        entries = self.entries.get(rect)
+
+        if entries is not None:
+            self.entries.move_to_end(rect)
+            self.hits += 1
+            return entries
+
+        # The smallest cached result of a window containing this one
+        x_low, x_high, y_low, y_high = rect
+        best = None
+
+        for (cached_x_low, cached_x_high, cached_y_low, cached_y_high), cached in self.entries.items():
+            if cached_x_low <= x_low and x_high <= cached_x_high and cached_y_low <= y_low and y_high <= cached_y_high:
+                if best is None or len(cached) < len(best):
+                    best, best_rect = cached, (cached_x_low, cached_x_high, cached_y_low, cached_y_high)
+
+        if best is None:
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(best_rect)
+        self.containment_hits += 1
+        return [entry for entry in best if not (
+            entry[1][1] < x_low or entry[1][0] > x_high or entry[1][3] < y_low or entry[1][2] > y_high
+        )]
+
+    def store(self, rect, entries):
+        self.entries[rect] = entries
+        self.entries.move_to_end(rect)
+
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def __str__(self):
+        requests = self.hits + self.containment_hits + self.misses
+        reused = (self.hits + self.containment_hits) / requests if requests else 0.0
+        return f"{self.hits} exact hits, {self.containment_hits} containment hits, {self.misses} misses (reuse {reused:.3f})"
+
+
+
+# Coarse uniform grid over the root MBR that gives, for every cell, the deepest node whose subtree holds
+# all the objects intersecting the cell (the lowest common ancestor of their leaves, None for empty cells)
+# A window can then start at the common ancestor of the nodes of the cells it covers instead of the root:
+# every object intersecting the window intersects one of these cells, so it lies below that node
+# The grid is kept as a quadtree pyramid (size x size cells, then size/2 x size/2, ... 1 x 1, a coarse
+# cell holding the common ancestor of its four children), and a window is looked up on the finest level
+# where it covers at most 2 x 2 cells
+class GridDirectory:
+    def __init__(self, rtree, root_id, size=DEFAULT_GRID_SIZE):
+        if size < 1 or size & (size - 1):
+            raise ValueError(f"the grid size must be a power of 2, not {size}")
+
+        self.root_id = root_id
+        self.parent = {root_id: None}
+        self.depth = {root_id: 0}
+        self.extent = compute_mbr_union([mbr for _, mbr in rtree[root_id]["entries"]])
+        cells = [None] * (size * size)
+
+        stack = [root_id]
+
+        while stack:
+            node_id = stack.pop()
+            node = rtree[node_id]
+
+            for entry_id, entry_mbr in node["entries"]:
+                if node["isnonleaf"]:
+                    self.parent[entry_id] = node_id
+                    self.depth[entry_id] = self.depth[node_id] + 1
+                    stack.append(entry_id)
+
+                else:
+                    columns, rows = self.spans(entry_mbr, size)
+
+                    for row in rows:
+                        for column in columns:
+                            cells[row * size + column] = self.common_ancestor(cells[row * size + column], node_id)
+
+        # Levels of the pyramid as (size, cells), finest first
+        self.levels = [(size, cells)]
+
+        while size > 1:
+            size //= 2
+            finer = cells
+            cells = [None] * (size * size)
+
+            for row in range(size):
+                for column in range(size):
+                    for child in (2 * row * 2 * size + 2 * column, 2 * row * 2 * size + 2 * column + 1,
+                                  (2 * row + 1) * 2 * size + 2 * column, (2 * row + 1) * 2 * size + 2 * column + 1):
+                        cells[row * size + column] = self.common_ancestor(cells[row * size + column], finer[child])
+
+            self.levels.append((size, cells))
+
+    # Returns the common ancestor of two nodes (either may be None)
+    def common_ancestor(self, a, b):
+        if a is None or a == b:
+            return b
+
+        if b is None:
+            return a
+
+        while self.depth[a] > self.depth[b]:
+            a = self.parent[a]
+
+        while self.depth[b] > self.depth[a]:
+            b = self.parent[b]
+
+        while a != b:
+            a = self.parent[a]
+            b = self.parent[b]
+
+        return a
+
+    # Returns the ranges of grid columns and rows a window covers on a size x size grid, clipped to the grid
+    def spans(self, rect, size):
+        x_step = (self.extent[1] - self.extent[0]) / size or 1.0
+        y_step = (self.extent[3] - self.extent[2]) / size or 1.0
+        columns = range(max(int((rect[0] - self.extent[0]) // x_step), 0), min(int((rect[1] - self.extent[0]) // x_step), size - 1) + 1)
+        rows = range(max(int((rect[2] - self.extent[2]) // y_step), 0), min(int((rect[3] - self.extent[2]) // y_step), size - 1) + 1)
+        return columns, rows
+
+    # Returns the node a range query on the window can start from, or None when no object can intersect it
+    def start_node(self, rect):
+        if not mbr_intersects(rect, self.extent):
+            return None
+
+        for size, cells in self.levels:
+            columns, rows = self.spans(rect, size)
+
+            if len(columns) <= 2 and len(rows) <= 2:
+                start = None
+
+                for row in rows:
+                    for column in columns:
+                        start = self.common_ancestor(start, cells[row * size + column])
+
+                return start
+
+        return self.root_id
+
+
+
+# Range queries through the result cache and the grid directory (either can be turned off with size 0)
+class CachedRangeQuery:
+    def __init__(self, rtree, root_id, cache_size=DEFAULT_CACHE_SIZE, grid_size=DEFAULT_GRID_SIZE):
+        self.rtree = rtree
+        self.root_id = root_id
+        self.cache = ResultCache(cache_size) if cache_size else None
+        self.grid = GridDirectory(rtree, root_id, grid_size) if grid_size else None
+        self.nodes_visited = 0
+        self.root_starts = 0
+        self.inner_starts = 0
+
+    # Returns the ids of the objects whose MBRs intersect the window [x_low, x_high, y_low, y_high]
+    def query(self, query_rect):
+        rect = normalize(query_rect)
+
+        # The cache and the grid assume low <= high: inverted windows are answered from the root, as range_query.py does
+        if rect[0] > rect[1] or rect[2] > rect[3]:
+            entries = []
+            self.nodes_visited += range_entries(self.root_id, rect, self.rtree, entries)
+            self.root_starts += 1
+            return [entry_id for entry_id, _ in entries]
+
+        entries = self.cache.lookup(rect) if self.cache else None
+
+        if entries is None:
+            start = self.grid.start_node(rect) if self.grid else self.root_id
+            entries = []
+
+            if start is not None:
+                self.nodes_visited += range_entries(start, rect, self.rtree, entries)
+
+                if start == self.root_id:
+                    self.root_starts += 1
+
+                else:
+                    self.inner_starts += 1
+
+            if self.cache:
+                self.cache.store(rect, entries)
+
+        return [entry_id for entry_id, _ in entries]
+
+    def __str__(self):
+        summary = f"{self.nodes_visited} nodes visited, {self.root_starts} traversals from the root, {self.inner_starts} from inner nodes"
+        return f"{summary}; cache: {self.cache}" if self.cache else summary
+
+
+
+# MAIN function
+if __name__ == "__main__":
+    options = {arg.split("=", 1)[0]: int(arg.split("=", 1)[1]) for arg in sys.argv[1:] if arg.startswith("--")}
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+
+    if len(args) != 2 or set(options) - {"--cache", "--grid"}:
+        print("Usage: python query_cache.py Rtree.txt Rqueries.txt [--cache=WINDOWS] [--grid=CELLS]")
+        sys.exit()
+
+    rtree = load_rtree(args[0])
+    root_id = rtree.root_id if isinstance(rtree, RtreeFile) else max(rtree.keys())
+    queries = CachedRangeQuery(rtree, root_id, options.get("--cache", DEFAULT_CACHE_SIZE), options.get("--grid", DEFAULT_GRID_SIZE))
+
+    with open(args[1], 'r') as f:
+        for i, line in enumerate(f):
+            x_low, y_low, x_high, y_high = map(float, line.split())
+            results = sorted(queries.query([x_low, x_high, y_low, y_high]))
+            print(f"{i} ({len(results)}): {','.join(map(str, results))}")
+
+    print(queries, file=sys.stderr)
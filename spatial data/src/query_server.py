@@ -0,0 +1,316 @@
+# Author: Gkovaris Christos-Grigorios
+
+
+
+# Importing required modules
+import sys
+import json
+import time
+import asyncio
+from range_query import load_rtree, range_query
+from knn_query import knn_search
+from rtree_file import RtreeFile
+from latency import percentile
+
+
+
+# Default TCP port of the server (it only listens on localhost)
+DEFAULT_PORT = 8765
+
+# Largest number of requests executed as one batch
+MAX_BATCH_SIZE = 256
+
+# Time (in seconds) the batching front-end waits for more requests after the first one of a batch
+BATCH_WINDOW = 0.002
+
+# Number of latencies kept per request type for the percentiles
+LATENCY_SAMPLES = 100000
+
+
+
+# Protocol: one JSON object per line in both directions
+#   {"id": 1, "type": "range", "rect": [x_low, y_low, x_high, y_high]}  ->  {"id": 1, "result": [object ids]}
+#   {"id": 2, "type": "knn", "point": [x, y], "k": 5}                    ->  {"id": 2, "result": [object ids]}
+#   {"id": 3, "type": "stats"}                                           ->  {"id": 3, "result": {latency stats}}
+# Every answer also carries the latency of the request in milliseconds; errors are returned as {"id": ..., "error": ...}
+# Answers on one connection may arrive in a different order than the requests, the id matches them
+
+
+
+# Latency statistics per request type
+class LatencyStats:
+    def __init__(self):
+        self.latencies = {}
+        self.counts = {}
+        self.batches = 0
+        self.batched_requests = 0
+
+    def add(self, request_type, latency):
+        samples = self.latencies.setdefault(request_type, [])
+        self.counts[request_type] = self.counts.get(request_type, 0) + 1
+
+        # Keep a bounded window of the most recent samples
+        if len(samples) >= LATENCY_SAMPLES:
+            del samples[:len(samples) // 2]
+
+        samples.append(latency)
+
+    def add_batch(self, size):
+        self.batches += 1
+        self.batched_requests += size
+
+    def summary(self):
+        summary = {
+            "batches": self.batches,
+            "average_batch_size": self.batched_requests / self.batches if self.batches else 0.0,
+        }
+
+        for request_type, samples in self.latencies.items():
+            ordered = sorted(samples)
+            summary[request_type] = {
+                "count": self.counts[request_type],
+                "mean_ms": sum(ordered) / len(ordered) * 1000,
+                "p50_ms": percentile(ordered, 50) * 1000,
+                "p99_ms": percentile(ordered, 99) * 1000,
+                "max_ms": ordered[-1] * 1000,
+            }
+
+        return summary
+
+
+
+# Answers one range or kNN request against the loaded tree
+def execute(request, rtree, root_id):
+    if request["type"] == "range":
+        x_low, y_low, x_high, y_high = request["rect"]
+        results = []
+        range_query(root_id, [x_low, x_high, y_low, y_high], rtree, results)
+        results.sort()
+        return results
+
+    if request["type"] == "knn":
+        return knn_search(root_id, tuple(request["point"]), int(request["k"]), rtree)
+
+    raise ValueError(f"unknown request type: {request['type']}")
+
+
+
+# Query server holding one R-tree in memory for its whole lifetime
+# Connections put their requests on a shared queue; the batching front-end takes up to MAX_BATCH_SIZE
+# requests that arrive within BATCH_WINDOW and answers them together in a worker thread, so the
+# event loop keeps accepting requests while a batch runs
+class QueryServer:
+    def __init__(self, rtree_file):
+        self.rtree = load_rtree(rtree_file)
+        self.root_id = self.rtree.root_id if isinstance(self.rtree, RtreeFile) else max(self.rtree.keys())
+        self.stats = LatencyStats()
+        self.queue = None
+
+    # Answers one batch of (request, received time, future) items
+    def run_batch(self, batch):
+        answers = []
+
+        for request, received, _ in batch:
+            try:
+                answers.append({"id": request.get("id"), "result": execute(request, self.rtree, self.root_id)})
+
+            except KeyError as error:
+                answers.append({"id": request.get("id"), "error": f"missing field {error}"})
+
+            # Any other failure (e.g. an OverflowError on k=1e400) only fails its own request
+            except Exception as error:
+                answers.append({"id": request.get("id"), "error": str(error) or type(error).__name__})
+
+        return answers
+
+    # Batching front-end: collects requests from the queue and executes them batch by batch
+    async def batcher(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + BATCH_WINDOW
+
+            while len(batch) < MAX_BATCH_SIZE:
+                timeout = deadline - loop.time()
+
+                if timeout <= 0:
+                    break
+
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+
+                except asyncio.TimeoutError:
+                    break
+
+            # A failed batch answers its pending requests with the error instead of stopping the front-end
+            try:
+                answers = await loop.run_in_executor(None, self.run_batch, batch)
+                self.stats.add_batch(len(batch))
+                finished = time.perf_counter()
+
+                for (request, received, future), answer in zip(batch, answers):
+                    latency = finished - received
+                    self.stats.add(request.get("type"), latency)
+                    answer["latency_ms"] = latency * 1000
+                    future.set_result(answer)
+
+            except Exception as error:
+                for request, _, future in batch:
+                    if not future.done():
+                        future.set_result({"id": request.get("id"), "error": f"batch failed: {error}"})
+
+    # Answers one request line of a connection
+    async def answer(self, line, writer, lock):
+        received = time.perf_counter()
+
+        try:
+            request = json.loads(line)
+
+            if request.get("type") == "stats":
+                answer = {"id": request.get("id"), "result": self.stats.summary()}
+
+            else:
+                future = asyncio.get_running_loop().create_future()
+                await self.queue.put((request, received, future))
+                answer = await future
+
+        except (ValueError, AttributeError) as error:
+            answer = {"id": None, "error": f"bad request: {error}"}
+
+        async with lock:
+            writer.write((json.dumps(answer) + "\n").encode())
+            await writer.drain()
+
+    # Serves one client connection; its requests are answered concurrently
+    async def handle(self, reader, writer):
+        lock = asyncio.Lock()
+        tasks = set()
+
+        try:
+            while True:
+                line = await reader.readline()
+
+                if not line:
+                    break
+
+                if line.strip():
+                    task = asyncio.create_task(self.answer(line, writer, lock))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+
+            if tasks:
+                await asyncio.gather(*tasks)
+
+        finally:
+            writer.close()
+
+    # Listens on localhost TCP (port) or on a Unix socket (path) until cancelled
+    async def serve(self, address=DEFAULT_PORT, ready=None):
+        self.queue = asyncio.Queue()
+        batcher = asyncio.create_task(self.batcher())
+
+        if isinstance(address, int):
+            server = await asyncio.start_server(self.handle, "127.0.0.1", address)
+
+        else:
+            server = await asyncio.start_unix_server(self.handle, address)
+
+        if ready is not None:
+            ready.set()
+
+        try:
+            async with server:
+                await server.serve_forever()
+
+        finally:
+            batcher.cancel()
+
+
+
+# Opens a connection to a server at a TCP port or a Unix socket path
+async def connect(address):
+    if isinstance(address, int):
+        return await asyncio.open_connection("127.0.0.1", address)
+
+    return await asyncio.open_unix_connection(address)
+
+
+
+# Sends all requests over one connection without waiting for the answers in between
+# Returns the answers in request order
+async def send_requests(address, requests):
+    reader, writer = await connect(address)
+    answers = {}
+
+    try:
+        for i, request in enumerate(requests):
+            writer.write((json.dumps(dict(request, id=i)) + "\n").encode())
+
+        await writer.drain()
+
+        while len(answers) < len(requests):
+            line = await reader.readline()
+
+            if not line:
+                break
+
+            answer = json.loads(line)
+            answers[answer["id"]] = answer
+
+    finally:
+        writer.close()
+
+    return [answers.get(i) for i in range(len(requests))]
+
+
+
+# Parses the optional address argument: a port number or a Unix socket path
+def parse_address(argument):
+    return int(argument) if argument.isdigit() else argument
+
+
+
+# MAIN function
+if __name__ == "__main__":
+    usage = (
+        "Usage: python query_server.py serve Rtree.txt [port | socket_path]\n"
+        "       python query_server.py range Rqueries.txt [port | socket_path]\n"
+        "       python query_server.py knn NNqueries.txt k [port | socket_path]\n"
+        "       python query_server.py stats [port | socket_path]"
+    )
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+
+    if command == "serve" and len(sys.argv) in (3, 4):
+        address = parse_address(sys.argv[3]) if len(sys.argv) == 4 else DEFAULT_PORT
+
+        try:
+            asyncio.run(QueryServer(sys.argv[2]).serve(address))
+
+        except KeyboardInterrupt:
+            pass
+
+    elif command == "range" and len(sys.argv) in (3, 4):
+        address = parse_address(sys.argv[3]) if len(sys.argv) == 4 else DEFAULT_PORT
+
+        with open(sys.argv[2], 'r') as f:
+            requests = [{"type": "range", "rect": list(map(float, line.split()))} for line in f if line.strip()]
+
+        for i, answer in enumerate(asyncio.run(send_requests(address, requests))):
+            print(f"{i} ({len(answer['result'])}): {','.join(map(str, answer['result']))}")
+
+    elif command == "knn" and len(sys.argv) in (4, 5):
+        address = parse_address(sys.argv[4]) if len(sys.argv) == 5 else DEFAULT_PORT
+
+        with open(sys.argv[2], 'r') as f:
+            requests = [{"type": "knn", "point": list(map(float, line.split())), "k": int(sys.argv[3])} for line in f if line.strip()]
+
+        for i, answer in enumerate(asyncio.run(send_requests(address, requests))):
+            print(f"{i}: {','.join(map(str, answer['result']))}")
+
+    elif command == "stats" and len(sys.argv) in (2, 3):
+        address = parse_address(sys.argv[2]) if len(sys.argv) == 3 else DEFAULT_PORT
+        print(json.dumps(asyncio.run(send_requests(address, [{"type": "stats"}]))[0]["result"], indent=2))
+
+    else:
+        print(usage)
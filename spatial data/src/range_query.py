@@ -5,6 +5,9 @@
 # Importing required modules
 import sys
 import ast
+from rtree_file import RtreeFile, is_rtree_file
+from geometry import RefinementStats, load_polygons, refine_range
+from buffer_pool import PagedRtree, pool_options
 
 
 
@@ -23,6 +26,10 @@ def mbr_intersects(mbr1, mbr2):
 # Loads an R-tree from a given file into a dictionary
 # Each node is stored with its ID and entries
 def load_rtree(file_path):
+    # Binary R-tree files are memory mapped, nodes are decoded only when visited
+    if is_rtree_file(file_path):
+        return RtreeFile(file_path)
+
     rtree = {}
     
     with open(file_path, 'r') as f:
@@ -38,32 +45,56 @@ def load_rtree(file_path):
 
 # Performs a range query starting from a specific node
 # Recursively visits relevant nodes whose MBRs intersect the query rectangle
-def range_query(node_id, query_rect, rtree, results):
+# The work is counted per node in the optional counters (instrumentation.QueryCounters)
+def range_query(node_id, query_rect, rtree, results, counters=None):
     node = rtree[node_id]
+    found = len(results)
     
     for entry_id, entry_mbr in node["entries"]:
         if mbr_intersects(entry_mbr, query_rect):
             if node["isnonleaf"]:
                 # Recurse on child node
-                range_query(entry_id, query_rect, rtree, results)  
+                range_query(entry_id, query_rect, rtree, results, counters)  
             
             else:
                 # Add object id to results
                 results.append(entry_id)  
 
+    if counters is not None:
+        counters.nodes_visited += 1
+        counters.mbr_tests += len(node["entries"])
+
+        if not node["isnonleaf"]:
+            counters.results += len(results) - found
+
 
 
 # Main function to handle input/output and invoke range query logic
 def main():
-    if len(sys.argv) != 3:
-        print("Usage: python range_query.py Rtree.txt Rqueries.txt")
+    args, pool = pool_options(sys.argv[1:])
+    cache = {arg.split("=", 1)[0]: int(arg.split("=", 1)[1]) for arg in args if arg.startswith(("--cache=", "--grid="))}
+    args = [arg for arg in args if not arg.startswith(("--cache=", "--grid="))]
+
+    if len(args) not in (2, 4) or (pool and not is_rtree_file(args[0])):
+        print("Usage: python range_query.py Rtree.txt Rqueries.txt [coords.txt offsets.txt] [--buffer=PAGES --pin=LEVELS (Rtree.bin)] [--cache=WINDOWS --grid=CELLS]")
         return
 
-    rtree_file = sys.argv[1]           # R-tree structure input file
-    queries_file = sys.argv[2]         # Query rectangles input file
+    rtree_file = args[0]               # R-tree structure input file
+    queries_file = args[1]             # Query rectangles input file
 
-    rtree = load_rtree(rtree_file)     # Load R-tree
-    root_id = max(rtree.keys())        # Root node is the last one created (as per construction order)
+    # Load R-tree, or read a binary tree through a buffer pool of the given size
+    rtree = load_rtree(rtree_file) if pool is None else PagedRtree(rtree_file, *pool)
+
+    # With the polygon files the MBR candidates are refined with the exact polygon geometry
+    polygons = load_polygons(args[2], args[3]) if len(args) == 4 else None
+    stats = RefinementStats()
+    # Root node is the last one created (as per construction order); binary files store it in their header
+    root_id = rtree.root_id if isinstance(rtree, RtreeFile) else max(rtree.keys())
+
+    # Repeated windows are answered from a result cache, new ones start below the root when the grid allows it
+    if cache:
+        from query_cache import CachedRangeQuery
+        queries = CachedRangeQuery(rtree, root_id, cache.get("--cache", 0), cache.get("--grid", 0))
 
     with open(queries_file, 'r') as f:
         for i, line in enumerate(f):
@@ -71,14 +102,34 @@ def main():
             x_low, y_low, x_high, y_high = map(float, line.strip().split())
             query_rect = [x_low, x_high, y_low, y_high]
             results = []
+            before = rtree.stats.copy() if pool else None
 
             # Perform the actual range query
-            range_query(root_id, query_rect, rtree, results)
+            if cache:
+                results = queries.query(query_rect)
+
+            else:
+                range_query(root_id, query_rect, rtree, results)
+
+            if pool:
+                print(f"{i}: {rtree.stats.since(before)}", file=sys.stderr)
+
+            if polygons is not None:
+                results = refine_range(polygons, results, query_rect, stats)
 
             # Sort and display the result object IDs
             results.sort()
             print(f"{i} ({len(results)}): {','.join(map(str, results))}")
 
+    if polygons is not None:
+        print(f"refinement: {stats}", file=sys.stderr)
+
+    if cache:
+        print(f"queries: {queries}", file=sys.stderr)
+
+    if pool:
+        print(f"buffer pool ({pool[0]} pages, {len(rtree.pinned)} pinned): {rtree.stats}", file=sys.stderr)
+
 
 
 # MAIN function
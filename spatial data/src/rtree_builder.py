@@ -4,8 +4,11 @@
 
 # Importing necessary modules
 import sys
-from math import floor, ceil
+import json
+from math import floor, ceil, sqrt
+from itertools import count
 from pymorton import interleave_latlng
+from rtree_file import write_rtree
 
 
 
@@ -13,6 +16,12 @@ from pymorton import interleave_latlng
 MAX_ENTRIES = 20
 MIN_ENTRIES = 8
 
+# Bulk-loading strategies: Z-order (Morton) packing, Sort-Tile-Recursive and Hilbert-curve packing
+STRATEGIES = ("zorder", "str", "hilbert")
+
+# Order of the Hilbert curve (the space is divided into a 2^order x 2^order grid)
+HILBERT_ORDER = 16
+
 
 
 # Reads coordinate points from the input file
@@ -119,53 +128,147 @@ def build_level(entries, is_leaf, node_id_counter):
 
 
 
-# Main execution of R-tree construction using bulk loading
-# Takes two input files: coordinates and offsets
-# Writes the constructed tree into Rtree.txt in the specified format
-# MAIN function
-if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python rtree_builder.py coords.txt offsets.txt")
-        sys.exit()
+# Computes the (object_id, MBR) entries of all objects
+def object_entries(coords, offsets):
+    return [(obj_id, compute_mbr(coords[start:end+1])) for obj_id, start, end in offsets]
 
-    coords_file, offsets_file = sys.argv[1], sys.argv[2]
-    coords = read_coords(coords_file)
-    offsets = read_offsets(offsets_file)
 
-    # Extract and compute MBRs with z-order values
-    objects = []
-    
-    for obj_id, start, end in offsets:
-        points = coords[start:end+1]
-        mbr = compute_mbr(points)
-        cx, cy = center(mbr)
-        zvalue = interleave_latlng(cy, cx)
-        objects.append((obj_id, mbr, zvalue))
 
-    # Sort objects by z-order value
-    objects.sort(key=lambda x: x[2])
+# Sorts entries by the Z-order (Morton) value of their MBR centers
+def zorder_sort(entries):
+    return sorted(entries, key=lambda entry: interleave_latlng(center(entry[1])[1], center(entry[1])[0]))
+
+
+
+# Computes the distance of cell (x, y) along the Hilbert curve that fills an n x n grid (n a power of 2)
+def hilbert_key(n, x, y):
+    d = 0
+    s = n // 2
+
+    while s > 0:
+        rx = 1 if x & s else 0
+        ry = 1 if y & s else 0
+        d += s * s * ((3 * rx) ^ ry)
+
+        # Rotate the quadrant so that the curve inside it has the standard orientation
+        if ry == 0:
+            if rx == 1:
+                x = n - 1 - x
+                y = n - 1 - y
+
+            x, y = y, x
+
+        s //= 2
+
+    return d
+
+
+
+# Sorts entries by the Hilbert value of their MBR centers on a 2^HILBERT_ORDER grid over the data extent
+def hilbert_sort(entries):
+    if not entries:
+        return []
+
+    centers = [center(entry[1]) for entry in entries]
+    x_low, x_high, y_low, y_high = compute_mbr(centers)
+    side = (1 << HILBERT_ORDER) - 1
+    x_scale = side / (x_high - x_low) if x_high > x_low else 0
+    y_scale = side / (y_high - y_low) if y_high > y_low else 0
+
+    keys = [
+        hilbert_key(side + 1, int((cx - x_low) * x_scale), int((cy - y_low) * y_scale))
+        for cx, cy in centers
+    ]
+    order = sorted(range(len(entries)), key=keys.__getitem__)
+    return [entries[i] for i in order]
+
+
+
+# Sort-Tile-Recursive order: entries are sorted by x center and cut into vertical slices of
+# ceil(sqrt(P)) nodes each (P = number of nodes), then each slice is sorted by y center
+# Packing consecutive entries of this order yields square-like tiles
+def str_sort(entries):
+    nodes = ceil(len(entries) / MAX_ENTRIES)
+    slice_size = ceil(sqrt(nodes)) * MAX_ENTRIES
+    by_x = sorted(entries, key=lambda entry: center(entry[1])[0])
+    ordered = []
+
+    for i in range(0, len(by_x), slice_size):
+        ordered.extend(sorted(by_x[i:i + slice_size], key=lambda entry: center(entry[1])[1]))
+
+    return ordered
+
+
+
+# Builds all levels of the R-tree bottom-up from the (object_id, MBR) entries with the given strategy
+# Z-order and Hilbert packing sort the objects once; STR tiles every level again
+# Returns the levels (leaves first) as lists of [isnonleaf, node_id, entries]
+def build_rtree(entries, strategy="zorder"):
+    if strategy not in STRATEGIES:
+        raise ValueError(f"unknown strategy {strategy}, expected one of {', '.join(STRATEGIES)}")
+
+    order = {"zorder": zorder_sort, "str": str_sort, "hilbert": hilbert_sort}[strategy]
 
     # Unique node IDs
-    node_id_counter = iter(range(1000000))
+    node_id_counter = count()
 
     # Build the leaf level
-    leaf_level = build_level([(obj[0], obj[1]) for obj in objects], 0, node_id_counter)
+    leaf_level = build_level(order(entries), 0, node_id_counter)
     levels = [[[node[0], node[1], node[2]] for node in leaf_level]]
     current_level = [(node[1], node[3]) for node in leaf_level]
 
     # Iteratively build the upper levels
     while len(current_level) > 1:
+        if strategy == "str":
+            current_level = str_sort(current_level)
+
         upper_level = build_level(current_level, 1, node_id_counter)
         levels.append([[node[0], node[1], node[2]] for node in upper_level])
         current_level = [(node[1], node[3]) for node in upper_level]
 
+    return levels
+
+
+
+# Writes the levels of a built R-tree (leaves first) to output_file: fixed-size binary pages when the
+# file name ends with .bin, otherwise one JSON node per line (JSON gives the proper list brackets)
+def write_levels(levels, output_file):
+    if output_file.endswith(".bin"):
+        write_rtree([node for level in levels for node in level], output_file, len(levels), MAX_ENTRIES)
+
+    else:
+        with open(output_file, 'w') as out:
+            for level in levels:
+                for node in level:
+                    out.write(json.dumps(node) + "\n")
+
+
+
+# Main execution of R-tree construction using bulk loading
+# Takes two input files: coordinates and offsets
+# Writes the constructed tree into Rtree.txt in the specified format,
+# or into the binary paged format when the output file name ends with .bin
+# The packing strategy is selected with --strategy=zorder|str|hilbert (default zorder)
+# MAIN function
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--strategy=")]
+    strategies = [arg.split("=", 1)[1] for arg in sys.argv[1:] if arg.startswith("--strategy=")]
+    strategy = strategies[-1] if strategies else "zorder"
+
+    if len(args) not in (2, 3) or strategy not in STRATEGIES:
+        print("Usage: python rtree_builder.py coords.txt offsets.txt [Rtree.txt | Rtree.bin] [--strategy=zorder|str|hilbert]")
+        sys.exit()
+
+    coords_file, offsets_file = args[0], args[1]
+    output_file = args[2] if len(args) == 3 else "Rtree.txt"
+    coords = read_coords(coords_file)
+    offsets = read_offsets(offsets_file)
+
+    # Extract the MBRs and pack them into the tree levels
+    levels = build_rtree(object_entries(coords, offsets), strategy)
+
     # Output the number of nodes at each level
     for i, level in enumerate(levels):
         print(f"{len(level)} nodes at level {i}")
 
-    # Write the R-tree structure to output file using JSON format for proper list brackets
-    import json
-    with open("Rtree.txt", 'w') as out:
-        for level in levels:
-            for node in level:
-                out.write(json.dumps(node) + "\n")
\ No newline at end of file
+    write_levels(levels, output_file)
@@ -0,0 +1,205 @@
+# Author: Gkovaris Christos-Grigorios
+
+
+
+# Importing required modules
+import os
+import sys
+import mmap
+import json
+import struct
+import numpy as np
+
+
+
+# File layout (all values little-endian):
+#   header (HEADER_SIZE bytes): magic "RTB1", version, node capacity, number of nodes, root id, height
+#   one fixed-size page per node, page i holds node i:
+#       isnonleaf (uint8), 3 padding bytes, number of entries (uint32),
+#       child / object ids (capacity x int64), MBRs (capacity x 4 float64: x_low, x_high, y_low, y_high)
+# Unused entry slots of a page are zero; pages released by deletions are marked with isnonleaf = FREE_PAGE
+# The root is the last page for trees written by the builder, and anywhere after dynamic updates
+MAGIC = b"RTB1"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIII")
+HEADER_SIZE = 64
+PAGE_HEADER = struct.Struct("<BxxxI")
+FREE_PAGE = 0xFF
+
+# Default number of entries per page (MAX_ENTRIES of rtree_builder.py)
+DEFAULT_CAPACITY = 20
+
+
+
+# Returns the size in bytes of one page for the given node capacity
+def page_size(capacity):
+    return PAGE_HEADER.size + capacity * 8 + capacity * 32
+
+
+
+# Returns the struct that decodes a whole page for the given node capacity
+def page_struct(capacity):
+    return struct.Struct(f"<BxxxI{capacity}q{capacity * 4}d")
+
+
+
+# Returns the NumPy record type of one page for the given node capacity (same layout as page_struct)
+def page_dtype(capacity):
+    return np.dtype([
+        ("isnonleaf", "u1"), ("padding", "V3"), ("count", "<u4"),
+        ("ids", "<i8", (capacity,)), ("mbrs", "<f8", (capacity, 4)),
+    ])
+
+
+
+# Checks whether a file is a binary R-tree file
+def is_rtree_file(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+
+    except OSError:
+        return False
+
+
+
+# Encodes one node (isnonleaf, [[entry_id, mbr], ...]) as a page
+def encode_page(isnonleaf, entries, capacity):
+    if len(entries) > capacity:
+        raise ValueError(f"node has {len(entries)} entries, the page capacity is {capacity}")
+
+    padding = capacity - len(entries)
+    ids = [entry_id for entry_id, _ in entries] + [0] * padding
+    mbrs = [value for _, mbr in entries for value in mbr] + [0.0] * (4 * padding)
+    return page_struct(capacity).pack(isnonleaf, len(entries), *ids, *mbrs)
+
+
+
+# Writes nodes [isnonleaf, node_id, entries] to a binary R-tree file
+# Node ids must be 0 .. n-1; the root is the node with the largest id and height is the number of levels
+def write_rtree(nodes, path, height, capacity=DEFAULT_CAPACITY):
+    nodes = sorted(nodes, key=lambda node: node[1])
+
+    if any(node[1] != i for i, node in enumerate(nodes)):
+        raise ValueError("node ids must be consecutive and start at 0")
+
+    with open(path, 'wb') as out:
+        header = HEADER.pack(MAGIC, VERSION, capacity, len(nodes), len(nodes) - 1, height)
+        out.write(header.ljust(HEADER_SIZE, b"\0"))
+
+        for isnonleaf, _, entries in nodes:
+            out.write(encode_page(isnonleaf, entries, capacity))
+
+
+
+# Read-only view of a binary R-tree file opened through mmap
+# Nodes are decoded straight from the mapped pages when they are accessed, so opening the tree
+# costs the same regardless of its size; rtree[node_id] returns {"isnonleaf": ..., "entries": [(id, mbr), ...]}
+# like the dictionaries built from Rtree.txt
+class RtreeFile:
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.capacity, self.node_count, self.root_id, self.height = HEADER.unpack_from(self.map)
+
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a binary R-tree file (version {VERSION})")
+
+        self.page_size = page_size(self.capacity)
+        self.page = page_struct(self.capacity)
+
+    # Returns the byte offset of the page of a node
+    def offset(self, node_id):
+        if not 0 <= node_id < self.node_count:
+            raise KeyError(node_id)
+
+        return HEADER_SIZE + node_id * self.page_size
+
+    # Decodes one page into (isnonleaf, ids, mbrs) with the MBRs as 4-tuples
+    def read_node(self, node_id):
+        values = self.page.unpack_from(self.map, self.offset(node_id))
+        count = values[1]
+        ids = values[2:2 + count]
+        flat = values[2 + self.capacity:2 + self.capacity + 4 * count]
+        return values[0], ids, [flat[i:i + 4] for i in range(0, 4 * count, 4)]
+
+    def __getitem__(self, node_id):
+        isnonleaf, ids, mbrs = self.read_node(node_id)
+        return {"isnonleaf": isnonleaf, "entries": list(zip(ids, mbrs))}
+
+    def __len__(self):
+        return self.node_count
+
+    def __contains__(self, node_id):
+        return 0 <= node_id < self.node_count
+
+    def keys(self):
+        return range(self.node_count)
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+
+# Returns the number of levels of a tree given as [isnonleaf, node_id, entries] nodes (root = largest id)
+def tree_height(nodes):
+    by_id = {node[1]: node for node in nodes}
+    node = by_id[max(by_id)]
+    height = 1
+
+    while node[0]:
+        node = by_id[node[2][0][0]]
+        height += 1
+
+    return height
+
+
+
+# Converts an Rtree.txt file (one JSON node per line) into the binary format
+def text_to_binary(text_file, binary_file, capacity=DEFAULT_CAPACITY):
+    with open(text_file, 'r') as f:
+        nodes = [json.loads(line) for line in f if line.strip()]
+
+    write_rtree(nodes, binary_file, tree_height(nodes), capacity)
+
+
+
+# Converts a binary R-tree file back into the Rtree.txt format
+# Trees changed by dynamic updates are renumbered level by level (leaves first), so the root gets the largest id
+def binary_to_text(binary_file, text_file):
+    with RtreeFile(binary_file) as rtree, open(text_file, 'w') as out:
+        levels = [[rtree.root_id]]
+
+        while rtree.read_node(levels[-1][0])[0]:
+            levels.append([child for node_id in levels[-1] for child in rtree.read_node(node_id)[1]])
+
+        order = [node_id for level in reversed(levels) for node_id in level]
+        new_ids = {node_id: i for i, node_id in enumerate(order)}
+
+        for node_id in order:
+            isnonleaf, ids, mbrs = rtree.read_node(node_id)
+            ids = [new_ids[entry_id] for entry_id in ids] if isnonleaf else ids
+            out.write(json.dumps([isnonleaf, new_ids[node_id], [[entry_id, list(mbr)] for entry_id, mbr in zip(ids, mbrs)]]) + "\n")
+
+
+
+# MAIN function
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] not in ("encode", "decode"):
+        print("Usage: python rtree_file.py encode Rtree.txt Rtree.bin | decode Rtree.bin Rtree.txt")
+        sys.exit()
+
+    if sys.argv[1] == "encode":
+        text_to_binary(sys.argv[2], sys.argv[3])
+
+    else:
+        binary_to_text(sys.argv[2], sys.argv[3])
+
+    print(f"{sys.argv[3]}: {os.path.getsize(sys.argv[3])} bytes")
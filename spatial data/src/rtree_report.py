@@ -0,0 +1,99 @@
+# Author: Gkovaris Christos-Grigorios
+
+
+
+# Importing required modules
+import sys
+import numpy as np
+from rtree_builder import STRATEGIES, read_coords, read_offsets, object_entries, build_rtree, compute_mbr_union
+from range_query import mbr_intersects
+
+
+
+# Returns the MBR of every node of a level as an (n, 4) array [x_low, x_high, y_low, y_high]
+def level_mbrs(level):
+    return np.array([compute_mbr_union([mbr for _, mbr in node[2]]) for node in level], dtype=np.float64)
+
+
+
+# Total area covered by the node MBRs of a level
+def coverage(mbrs):
+    return float(np.sum((mbrs[:, 1] - mbrs[:, 0]) * (mbrs[:, 3] - mbrs[:, 2])))
+
+
+
+# Total area of the pairwise intersections of the node MBRs of a level (each pair counted once)
+def overlap(mbrs):
+    total = 0.0
+
+    for i in range(len(mbrs) - 1):
+        others = mbrs[i + 1:]
+        width = np.minimum(mbrs[i, 1], others[:, 1]) - np.maximum(mbrs[i, 0], others[:, 0])
+        height = np.minimum(mbrs[i, 3], others[:, 3]) - np.maximum(mbrs[i, 2], others[:, 2])
+        total += float(np.sum(np.clip(width, 0, None) * np.clip(height, 0, None)))
+
+    return total
+
+
+
+# Counts the nodes a range query visits (the root and every child whose MBR intersects the window)
+def node_accesses(nodes, node_id, query_rect):
+    isnonleaf, _, entries = nodes[node_id]
+    visited = 1
+
+    if isnonleaf:
+        for entry_id, entry_mbr in entries:
+            if mbr_intersects(entry_mbr, query_rect):
+                visited += node_accesses(nodes, entry_id, query_rect)
+
+    return visited
+
+
+
+# Reads the windows "x_low y_low x_high y_high" of a query file as [x_low, x_high, y_low, y_high]
+def read_queries(path):
+    queries = []
+
+    with open(path, 'r') as f:
+        for line in f:
+            if line.strip():
+                x_low, y_low, x_high, y_high = map(float, line.split())
+                queries.append([x_low, x_high, y_low, y_high])
+
+    return queries
+
+
+
+# Builds the tree with every strategy and reports per-level overlap and coverage
+# and the average number of node accesses of the range query workload
+def report(coords_file, offsets_file, queries_file, strategies=STRATEGIES):
+    entries = object_entries(read_coords(coords_file), read_offsets(offsets_file))
+    queries = read_queries(queries_file)
+
+    for strategy in strategies:
+        levels = build_rtree(entries, strategy)
+        nodes = {node[1]: node for level in levels for node in level}
+        root_id = max(nodes)
+
+        print(f"strategy: {strategy}")
+        print(f"  {'level':>5} {'nodes':>7} {'coverage':>14} {'overlap':>14}")
+
+        for i, level in enumerate(levels):
+            mbrs = level_mbrs(level)
+            print(f"  {i:>5} {len(level):>7} {coverage(mbrs):>14.4f} {overlap(mbrs):>14.4f}")
+
+        if queries:
+            accesses = [node_accesses(nodes, root_id, query) for query in queries]
+            print(f"  average node accesses per query: {sum(accesses) / len(accesses):.2f}")
+
+        print()
+
+
+
+# MAIN function
+if __name__ == "__main__":
+    if len(sys.argv) != 4:
+        print("Usage: python rtree_report.py coords.txt offsets.txt Rqueries.txt")
+        sys.exit()
+
+    report(sys.argv[1], sys.argv[2], sys.argv[3])
@@ -0,0 +1,440 @@
+# Author: Gkovaris Christos-Grigorios
+
+
+
+# Importing required modules
+import os
+import sys
+import time
+import random
+from rtree_file import HEADER, HEADER_SIZE, MAGIC, VERSION, FREE_PAGE, page_size, page_struct, encode_page, write_rtree
+from rtree_builder import MIN_ENTRIES, read_coords, read_offsets, object_entries, build_rtree, compute_mbr_union, center
+
+
+
+# Fraction of the entries of an overflowing node that are removed and inserted again (R*-tree forced reinsert)
+REINSERT_FRACTION = 0.3
+
+
+
+# Area of an MBR [x_low, x_high, y_low, y_high]
+def area(mbr):
+    return (mbr[1] - mbr[0]) * (mbr[3] - mbr[2])
+
+
+
+# Half perimeter of an MBR
+def margin(mbr):
+    return (mbr[1] - mbr[0]) + (mbr[3] - mbr[2])
+
+
+
+# Smallest MBR that contains two MBRs
+def enlarge(mbr1, mbr2):
+    return [min(mbr1[0], mbr2[0]), max(mbr1[1], mbr2[1]), min(mbr1[2], mbr2[2]), max(mbr1[3], mbr2[3])]
+
+
+
+# Area of the intersection of two MBRs
+def intersection_area(mbr1, mbr2):
+    width = min(mbr1[1], mbr2[1]) - max(mbr1[0], mbr2[0])
+    height = min(mbr1[3], mbr2[3]) - max(mbr1[2], mbr2[2])
+    return width * height if width > 0 and height > 0 else 0.0
+
+
+
+# Increase of the overlap between entry i and the other entries when entry i grows to the MBR grown
+def overlap_enlargement(entries, i, grown):
+    x_low, x_high, y_low, y_high = grown
+    current = entries[i][1]
+    total = 0.0
+
+    for j, (_, other) in enumerate(entries):
+        # Entries that do not touch the grown MBR overlap neither before nor after
+        if j == i or other[1] <= x_low or other[0] >= x_high or other[3] <= y_low or other[2] >= y_high:
+            continue
+
+        total += intersection_area(grown, other) - intersection_area(current, other)
+
+    return total
+
+
+
+# Checks whether mbr1 contains mbr2
+def contains(mbr1, mbr2):
+    return mbr1[0] <= mbr2[0] and mbr2[1] <= mbr1[1] and mbr1[2] <= mbr2[2] and mbr2[3] <= mbr1[3]
+
+
+
+# R*-tree split: the axis with the smallest total margin over all distributions is chosen,
+# then the distribution on that axis with the least overlap (ties: least total area)
+# Returns the two groups of entries
+def rstar_split(entries, min_entries):
+    best = None
+
+    for axis in (0, 2):
+        distributions = []
+
+        # Sort by the lower and by the upper bound on this axis
+        for bound in (axis, axis + 1):
+            ordered = sorted(entries, key=lambda entry: (entry[1][bound], entry[1][2 * axis + 1 - bound]))
+
+            for k in range(min_entries, len(entries) - min_entries + 1):
+                distributions.append((ordered[:k], ordered[k:]))
+
+        margins = 0.0
+        scored = []
+
+        for first, second in distributions:
+            mbr1 = compute_mbr_union([mbr for _, mbr in first])
+            mbr2 = compute_mbr_union([mbr for _, mbr in second])
+            margins += margin(mbr1) + margin(mbr2)
+            scored.append((intersection_area(mbr1, mbr2), area(mbr1) + area(mbr2), first, second))
+
+        if best is None or margins < best[0]:
+            best = (margins, scored)
+
+    _, _, first, second = min(best[1], key=lambda item: (item[0], item[1]))
+    return first, second
+
+
+
+# R-tree stored in a binary R-tree file whose pages are updated in place
+# Nodes are read from and written to their pages directly; new nodes reuse freed pages or are appended,
+# and the header (number of pages, root, height) is rewritten on close
+class UpdatableRtree:
+    def __init__(self, path, min_entries=MIN_ENTRIES):
+        self.file = open(path, 'r+b')
+        magic, version, self.capacity, self.node_count, self.root_id, self.height = HEADER.unpack(self.file.read(HEADER.size))
+
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a binary R-tree file (convert Rtree.txt with rtree_file.py first)")
+
+        self.min_entries = min_entries
+        self.page_size = page_size(self.capacity)
+        self.page = page_struct(self.capacity)
+
+        # Pages released by deletions
+        self.free = []
+
+        for node_id in range(self.node_count):
+            self.file.seek(HEADER_SIZE + node_id * self.page_size)
+
+            if self.file.read(1)[0] == FREE_PAGE:
+                self.free.append(node_id)
+
+    # Reads one node as [isnonleaf, [(entry_id, mbr), ...]]
+    def read(self, node_id):
+        self.file.seek(HEADER_SIZE + node_id * self.page_size)
+        values = self.page.unpack(self.file.read(self.page_size))
+        count = values[1]
+        ids = values[2:2 + count]
+        flat = values[2 + self.capacity:2 + self.capacity + 4 * count]
+        return [values[0], [(ids[i], list(flat[4 * i:4 * i + 4])) for i in range(count)]]
+
+    # Writes one node to its page
+    def write(self, node_id, isnonleaf, entries):
+        self.file.seek(HEADER_SIZE + node_id * self.page_size)
+        self.file.write(encode_page(isnonleaf, entries, self.capacity))
+
+    # Returns the id of a page for a new node
+    def allocate(self):
+        if self.free:
+            return self.free.pop()
+
+        self.node_count += 1
+        return self.node_count - 1
+
+    # Releases the page of a removed node
+    def release(self, node_id):
+        self.file.seek(HEADER_SIZE + node_id * self.page_size)
+        self.file.write(encode_page(FREE_PAGE, [], self.capacity))
+        self.free.append(node_id)
+
+    # Chooses the path from the root to the node of the given level where a new entry goes
+    # Above the leaves the child needing the least area enlargement is chosen; for nodes whose children
+    # are leaves the child with the least overlap enlargement (R*-tree ChooseSubtree)
+    # Returns [(node_id, node), ...] from the root down
+    def choose_path(self, mbr, level):
+        node_id = self.root_id
+        node = self.read(node_id)
+        path = [(node_id, node)]
+
+        for node_level in range(self.height - 1, level, -1):
+            entries = node[1]
+
+            # A child that already contains the MBR needs no enlargement at all: take the smallest one
+            covering = [i for i, (_, entry_mbr) in enumerate(entries) if contains(entry_mbr, mbr)]
+
+            if covering:
+                def cost(i):
+                    return area(entries[i][1])
+
+            elif node_level == 1:
+                def cost(i):
+                    grown = enlarge(entries[i][1], mbr)
+                    return overlap_enlargement(entries, i, grown), area(grown) - area(entries[i][1]), area(entries[i][1])
+
+            else:
+                def cost(i):
+                    return area(enlarge(entries[i][1], mbr)) - area(entries[i][1]), area(entries[i][1])
+
+            node_id = entries[min(covering or range(len(entries)), key=cost)][0]
+            node = self.read(node_id)
+            path.append((node_id, node))
+
+        return path
+
+    # Inserts an entry (object or subtree) at the given level (0 = leaves)
+    # reinserted holds the levels that already had a forced reinsert during this insertion
+    def insert_entry(self, entry, level, reinserted):
+        path = self.choose_path(entry[1], level)
+        path[-1][1][1].append(entry)
+        self.adjust(path, level, reinserted)
+
+    # Writes the nodes of a path bottom-up, treating overflows and updating the parent MBRs
+    def adjust(self, path, level, reinserted):
+        pending = []
+
+        for depth in range(len(path) - 1, -1, -1):
+            node_id, (isnonleaf, entries) = path[depth]
+            node_level = level + (len(path) - 1 - depth)
+            sibling = None
+
+            if len(entries) > self.capacity:
+                # Forced reinsert: once per level and insertion, never at the root
+                if depth > 0 and node_level not in reinserted:
+                    reinserted.add(node_level)
+                    node_center = center(compute_mbr_union([mbr for _, mbr in entries]))
+
+                    def distance(entry):
+                        entry_center = center(entry[1])
+                        return (entry_center[0] - node_center[0]) ** 2 + (entry_center[1] - node_center[1]) ** 2
+
+                    entries.sort(key=distance)
+                    count = max(1, int(len(entries) * REINSERT_FRACTION))
+                    pending = [(entry, node_level) for entry in entries[-count:]]
+                    del entries[-count:]
+
+                else:
+                    first, second = rstar_split(entries, self.min_entries)
+                    entries[:] = first
+                    sibling = (self.allocate(), second)
+                    self.write(sibling[0], isnonleaf, second)
+
+            self.write(node_id, isnonleaf, entries)
+            node_mbr = compute_mbr_union([mbr for _, mbr in entries])
+
+            if depth > 0:
+                parent_entries = path[depth - 1][1][1]
+                index = next(i for i, (entry_id, _) in enumerate(parent_entries) if entry_id == node_id)
+                parent_entries[index] = (node_id, node_mbr)
+
+                if sibling is not None:
+                    parent_entries.append((sibling[0], compute_mbr_union([mbr for _, mbr in sibling[1]])))
+
+            # Root split: the tree grows by one level
+            elif sibling is not None:
+                root_id = self.allocate()
+                self.write(root_id, 1, [(node_id, node_mbr), (sibling[0], compute_mbr_union([mbr for _, mbr in sibling[1]]))])
+                self.root_id = root_id
+                self.height += 1
+
+        # Reinsert the removed entries, closest to the node center first
+        for entry, entry_level in pending:
+            self.insert_entry(entry, entry_level, reinserted)
+
+    # Inserts an object with its MBR [x_low, x_high, y_low, y_high]
+    def insert(self, object_id, mbr):
+        self.insert_entry((object_id, list(mbr)), 0, set())
+
+    # Finds the path from the root to the leaf holding the object (None if it is not in the tree)
+    def find_leaf(self, node_id, object_id, mbr, path):
+        node = self.read(node_id)
+        path.append((node_id, node))
+
+        for entry_id, entry_mbr in node[1]:
+            if node[0]:
+                if contains(entry_mbr, mbr) and self.find_leaf(entry_id, object_id, mbr, path):
+                    return True
+
+            elif entry_id == object_id:
+                return True
+
+        path.pop()
+        return False
+
+    # Deletes an object; returns False if it is not in the tree
+    # Underfull nodes are removed and their entries reinserted at their level (CondenseTree)
+    def delete(self, object_id, mbr):
+        path = []
+
+        if not self.find_leaf(self.root_id, object_id, mbr, path):
+            return False
+
+        leaf = path[-1][1][1]
+        leaf[:] = [entry for entry in leaf if entry[0] != object_id]
+        orphans = []
+
+        for depth in range(len(path) - 1, 0, -1):
+            node_id, (isnonleaf, entries) = path[depth]
+            parent_entries = path[depth - 1][1][1]
+            index = next(i for i, (entry_id, _) in enumerate(parent_entries) if entry_id == node_id)
+
+            if len(entries) < self.min_entries:
+                node_level = len(path) - 1 - depth
+                orphans.extend((entry, node_level) for entry in entries)
+                del parent_entries[index]
+                self.release(node_id)
+
+            else:
+                self.write(node_id, isnonleaf, entries)
+                parent_entries[index] = (node_id, compute_mbr_union([mbr for _, mbr in entries]))
+
+        root_id, (isnonleaf, entries) = path[0]
+        self.write(root_id, isnonleaf, entries)
+
+        # A non-leaf root with a single child is replaced by the child
+        while isnonleaf and len(entries) == 1:
+            self.release(self.root_id)
+            self.root_id = entries[0][0]
+            self.height -= 1
+            isnonleaf, entries = self.read(self.root_id)
+
+        for entry, level in orphans:
+            # The tree may have become lower than the level of the orphaned subtree; reinsert its objects then
+            if level >= self.height:
+                self.reinsert_objects(entry[0], level)
+
+            else:
+                self.insert_entry(entry, level, set())
+
+        return True
+
+    # Reinserts all objects of a removed subtree one by one
+    def reinsert_objects(self, node_id, level):
+        isnonleaf, entries = self.read(node_id)
+        self.release(node_id)
+
+        for entry in entries:
+            if isnonleaf:
+                self.reinsert_objects(entry[0], level - 1)
+
+            else:
+                self.insert(*entry)
+
+    def close(self):
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, VERSION, self.capacity, self.node_count, self.root_id, self.height))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+
+# Verifies the structure of the tree: node fill, MBR containment and equal leaf depth
+# Returns the object ids stored in the leaves
+def check(rtree):
+    objects = []
+
+    def visit(node_id, mbr, depth):
+        isnonleaf, entries = rtree.read(node_id)
+
+        if node_id != rtree.root_id and not rtree.min_entries <= len(entries) <= rtree.capacity:
+            raise AssertionError(f"node {node_id} has {len(entries)} entries")
+
+        if mbr is not None and entries and compute_mbr_union([entry_mbr for _, entry_mbr in entries]) != list(mbr):
+            raise AssertionError(f"parent MBR of node {node_id} is not tight")
+
+        if not isnonleaf and depth != rtree.height - 1:
+            raise AssertionError(f"leaf {node_id} at depth {depth}, height {rtree.height}")
+
+        for entry_id, entry_mbr in entries:
+            if isnonleaf:
+                visit(entry_id, entry_mbr, depth + 1)
+
+            else:
+                objects.append(entry_id)
+
+    visit(rtree.root_id, None, 0)
+    return objects
+
+
+
+# Compares dynamic inserts and deletes with a full bulk rebuild
+# The tree is bulk loaded with all but `updates` objects, which are then inserted one by one and deleted again
+def benchmark(coords_file, offsets_file, updates, path="Rtree_update.bin"):
+    entries = object_entries(read_coords(coords_file), read_offsets(offsets_file))
+    random.Random(0).shuffle(entries)
+    updates = min(updates, len(entries) - 1)
+    base, changes = entries[updates:], entries[:updates]
+
+    start = time.perf_counter()
+    levels = build_rtree(entries)
+    write_rtree([node for level in levels for node in level], path, len(levels))
+    rebuild = time.perf_counter() - start
+    print(f"bulk rebuild of {len(entries)} objects: {rebuild:.4f} s")
+
+    levels = build_rtree(base)
+    write_rtree([node for level in levels for node in level], path, len(levels))
+
+    with UpdatableRtree(path) as rtree:
+        start = time.perf_counter()
+
+        for object_id, mbr in changes:
+            rtree.insert(object_id, mbr)
+
+        insert_time = time.perf_counter() - start
+        print(f"{len(changes)} inserts: {insert_time:.4f} s, {len(changes) / insert_time:,.0f} inserts/s")
+        assert sorted(check(rtree)) == sorted(object_id for object_id, _ in entries)
+
+        start = time.perf_counter()
+
+        for object_id, mbr in changes:
+            assert rtree.delete(object_id, mbr)
+
+        delete_time = time.perf_counter() - start
+        print(f"{len(changes)} deletes: {delete_time:.4f} s, {len(changes) / delete_time:,.0f} deletes/s")
+        assert sorted(check(rtree)) == sorted(object_id for object_id, _ in base)
+
+    print(f"one bulk rebuild takes as long as {rebuild * len(changes) / insert_time:,.0f} inserts or {rebuild * len(changes) / delete_time:,.0f} deletes")
+    os.remove(path)
+
+
+
+# Applies the updates of a file to a binary R-tree in place
+# Each line is "insert object_id x_low y_low x_high y_high" or "delete object_id x_low y_low x_high y_high"
+def apply_updates(rtree_file, updates_file):
+    with UpdatableRtree(rtree_file) as rtree, open(updates_file, 'r') as f:
+        for line in f:
+            if not line.strip():
+                continue
+
+            operation, object_id, x_low, y_low, x_high, y_high = line.split()
+            mbr = [float(x_low), float(x_high), float(y_low), float(y_high)]
+
+            if operation == "insert":
+                rtree.insert(int(object_id), mbr)
+
+            elif not rtree.delete(int(object_id), mbr):
+                print(f"object {object_id} not found")
+
+        print(f"{rtree.node_count - len(rtree.free)} nodes, height {rtree.height}")
+
+
+
+# MAIN function
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        apply_updates(sys.argv[1], sys.argv[2])
+
+    elif len(sys.argv) in (4, 5) and sys.argv[1] == "benchmark":
+        benchmark(sys.argv[2], sys.argv[3], int(sys.argv[4]) if len(sys.argv) == 5 else 1000)
+
+    else:
+        print("Usage: python rtree_update.py Rtree.bin updates.txt | benchmark coords.txt offsets.txt [updates]")
+        sys.exit()
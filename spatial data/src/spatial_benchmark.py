@@ -0,0 +1,192 @@
+# Author: Gkovaris Christos-Grigorios
+
+
+
+# Importing required modules
+import os
+import sys
+import math
+import time
+import random
+import tempfile
+from rtree_builder import STRATEGIES, read_coords, read_offsets, object_entries, build_rtree, write_levels, center
+from range_query import load_rtree, range_query
+from knn_query import knn_search
+from instrumentation import InstrumentedQueries, LatencyHistogram, profiled
+
+
+
+# Area of the synthetic datasets [x_low, x_high, y_low, y_high] (roughly the extent of the sample data)
+EXTENT = [-125.0, -66.0, 24.0, 50.0]
+
+# Number of cluster centres of the clustered datasets and the spread of the objects around them
+# (standard deviation as a fraction of the extent)
+CLUSTERS = 12
+CLUSTER_SPREAD = 0.03
+
+# Mean radius of the synthetic polygons as a fraction of the extent
+POLYGON_RADIUS = 0.001
+
+# Default benchmark settings
+DEFAULT_QUERIES = 1000
+DEFAULT_K = 10
+DEFAULT_SELECTIVITY = 0.0005
+DEFAULT_SEED = 42
+
+
+
+# Returns a random polygon (list of (x, y) vertices) around a centre: 3 to 12 vertices at sorted angles and jittered radii
+def random_polygon(rng, x, y, radius):
+    angles = sorted(rng.uniform(0, 2 * math.pi) for _ in range(rng.randint(3, 12)))
+    return [(x + radius * rng.uniform(0.5, 1.0) * math.cos(a), y + radius * rng.uniform(0.5, 1.0) * math.sin(a)) for a in angles]
+
+
+
+# Returns the centre of an object, uniform over the extent or around one of the cluster centres
+def random_centre(rng, distribution, clusters):
+    x_low, x_high, y_low, y_high = EXTENT
+
+    if distribution == "uniform":
+        return rng.uniform(x_low, x_high), rng.uniform(y_low, y_high)
+
+    cx, cy = rng.choice(clusters)
+    x = rng.gauss(cx, CLUSTER_SPREAD * (x_high - x_low))
+    y = rng.gauss(cy, CLUSTER_SPREAD * (y_high - y_low))
+    return min(max(x, x_low), x_high), min(max(y, y_low), y_high)
+
+
+
+# Writes a synthetic dataset of count polygons in the coords.txt / offsets.txt format of the sample data
+# The same seed always produces the same files
+def generate_dataset(coords_file, offsets_file, count, distribution, seed=DEFAULT_SEED):
+    if distribution not in ("uniform", "clustered"):
+        raise ValueError(f"unknown distribution {distribution}, expected uniform or clustered")
+
+    rng = random.Random(seed)
+    x_low, x_high, y_low, y_high = EXTENT
+    clusters = [(rng.uniform(x_low, x_high), rng.uniform(y_low, y_high)) for _ in range(CLUSTERS)]
+    radius = POLYGON_RADIUS * (x_high - x_low)
+    offset = 0
+
+    with open(coords_file, 'w') as coords, open(offsets_file, 'w') as offsets:
+        for obj_id in range(count):
+            x, y = random_centre(rng, distribution, clusters)
+            polygon = random_polygon(rng, x, y, rng.expovariate(1 / radius))
+            coords.writelines(f"{px:.6f},{py:.6f}\n" for px, py in polygon)
+            offsets.write(f"{obj_id},{offset},{offset + len(polygon) - 1}\n")
+            offset += len(polygon)
+
+
+
+# Writes the query files: windows covering the given fraction of the extent and kNN points,
+# both centred on random objects so that the queries follow the data distribution
+def generate_queries(entries, range_file, knn_file, count, selectivity=DEFAULT_SELECTIVITY, seed=DEFAULT_SEED):
+    rng = random.Random(seed + 1)
+    x_low, x_high, y_low, y_high = EXTENT
+    half_width = (x_high - x_low) * math.sqrt(selectivity) / 2
+    half_height = (y_high - y_low) * math.sqrt(selectivity) / 2
+
+    with open(range_file, 'w') as windows, open(knn_file, 'w') as points:
+        for _ in range(count):
+            x, y = center(rng.choice(entries)[1])
+            windows.write(f"{x - half_width:.6f} {y - half_height:.6f} {x + half_width:.6f} {y + half_height:.6f}\n")
+            x, y = center(rng.choice(entries)[1])
+            points.write(f"{x + rng.uniform(-half_width, half_width):.6f} {y + rng.uniform(-half_height, half_height):.6f}\n")
+
+
+
+# Builds the R-tree of a dataset with the functions of rtree_builder.py and writes it in the text or binary format
+# Returns the (object_id, MBR) entries of the dataset
+def build_tree(coords_file, offsets_file, rtree_file, strategy):
+    entries = object_entries(read_coords(coords_file), read_offsets(offsets_file))
+    write_levels(build_rtree(entries, strategy), rtree_file)
+    return entries
+
+
+
+# Runs every query with the uninstrumented query function and returns the latency histogram
+def time_queries(function, queries):
+    latencies = LatencyHistogram()
+
+    for query in queries:
+        start = time.perf_counter()
+        function(query)
+        latencies.add(time.perf_counter() - start)
+
+    return latencies
+
+
+
+# Generates a dataset, builds its tree and runs the range and kNN workloads
+# Latencies come from the plain query functions; the node access counters from a second, instrumented pass
+def benchmark(distribution, count, directory, queries=DEFAULT_QUERIES, k=DEFAULT_K, strategy="zorder",
+              selectivity=DEFAULT_SELECTIVITY, seed=DEFAULT_SEED, binary=False):
+    coords_file = os.path.join(directory, "coords.txt")
+    offsets_file = os.path.join(directory, "offsets.txt")
+    rtree_file = os.path.join(directory, "Rtree.bin" if binary else "Rtree.txt")
+    range_file = os.path.join(directory, "Rqueries.txt")
+    knn_file = os.path.join(directory, "NNqueries.txt")
+
+    start = time.perf_counter()
+    generate_dataset(coords_file, offsets_file, count, distribution, seed)
+    print(f"{'generate (' + distribution + ', ' + str(count) + ' objects):':<40} {time.perf_counter() - start:.3f} s")
+
+    start = time.perf_counter()
+    entries = build_tree(coords_file, offsets_file, rtree_file, strategy)
+    print(f"{'build (' + strategy + ', ' + os.path.basename(rtree_file) + '):':<40} {time.perf_counter() - start:.3f} s")
+
+    generate_queries(entries, range_file, knn_file, queries, selectivity, seed)
+
+    with open(range_file, 'r') as f:
+        windows = [[x_low, x_high, y_low, y_high] for x_low, y_low, x_high, y_high in (map(float, line.split()) for line in f)]
+
+    with open(knn_file, 'r') as f:
+        points = [tuple(map(float, line.split())) for line in f]
+
+    rtree = load_rtree(rtree_file)
+    instrumented = InstrumentedQueries(rtree)
+    root_id = instrumented.root_id
+
+    workloads = (
+        ("range", windows, lambda rect: range_query(root_id, rect, rtree, []), instrumented.run_range),
+        (f"knn (k={k})", points, lambda point: knn_search(root_id, point, k, rtree), lambda point: instrumented.run_knn(point, k)),
+    )
+
+    for name, workload, function, counted in workloads:
+        summary = time_queries(function, workload).summary()
+        totals = [counted(query)[1] for query in workload]
+        nodes = sum(counters.nodes_visited for counters in totals) / len(totals)
+        tests = sum(counters.mbr_tests for counters in totals) / len(totals)
+        results = sum(counters.results for counters in totals) / len(totals)
+        print(f"{name + ':':<40} {summary['throughput']:.0f} queries/s, p50 {summary['p50_ms']:.3f} ms, p99 {summary['p99_ms']:.3f} ms, "
+              f"{nodes:.1f} nodes, {tests:.1f} MBR tests, {results:.1f} results per query")
+
+    if hasattr(rtree, "close"):
+        rtree.close()
+
+
+
+# MAIN function
+if __name__ == "__main__":
+    options = dict(arg[2:].split("=", 1) for arg in sys.argv[1:] if arg.startswith("--") and "=" in arg)
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    known = {"queries", "k", "strategy", "selectivity", "seed", "format", "dir", "profile"}
+
+    if len(args) != 2 or args[0] not in ("uniform", "clustered") or set(options) - known \
+            or options.get("strategy", "zorder") not in STRATEGIES or options.get("format", "txt") not in ("txt", "bin"):
+        print("Usage: python spatial_benchmark.py uniform|clustered objects [--queries=N] [--k=K] [--strategy=zorder|str|hilbert]\n"
+              "       [--selectivity=FRACTION] [--seed=S] [--format=txt|bin] [--dir=DIR] [--profile=FILE]")
+        sys.exit()
+
+    settings = (args[0], int(args[1]))
+    parameters = (int(options.get("queries", DEFAULT_QUERIES)), int(options.get("k", DEFAULT_K)), options.get("strategy", "zorder"),
+                  float(options.get("selectivity", DEFAULT_SELECTIVITY)), int(options.get("seed", DEFAULT_SEED)), options.get("format") == "bin")
+
+    # The generated files are kept in --dir, otherwise they are removed at the end
+    if "dir" in options:
+        os.makedirs(options["dir"], exist_ok=True)
+        profiled(options.get("profile"), benchmark, *settings, options["dir"], *parameters)
+
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            profiled(options.get("profile"), benchmark, *settings, directory, *parameters)
@@ -0,0 +1,210 @@
+# Author: Gkovaris Christos-Grigorios
+
+
+
+# Importing required modules
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from range_query import load_rtree, mbr_intersects
+from rtree_builder import compute_mbr_union
+from rtree_file import RtreeFile
+
+
+
+# Number of node pairs handed to every worker process, so that the work is balanced
+PAIRS_PER_WORKER = 8
+
+# Trees opened by a worker process, by file name (every worker opens each tree once)
+open_trees = {}
+
+
+
+# Returns the id of the root node of a loaded tree
+def root_of(rtree):
+    return rtree.root_id if isinstance(rtree, RtreeFile) else max(rtree.keys())
+
+
+
+# Returns the intersection of two intersecting MBRs
+def mbr_intersection(mbr1, mbr2):
+    return [max(mbr1[0], mbr2[0]), min(mbr1[1], mbr2[1]), max(mbr1[2], mbr2[2]), min(mbr1[3], mbr2[3])]
+
+
+
+# Plane sweep over the entries of two nodes: both lists are sorted by x_low and the entry with the
+# smallest x_low is paired with the entries of the other list that start before it ends on the x axis
+# Returns the pairs (entry of the first list, entry of the second list) whose MBRs intersect
+def sweep_pairs(entries_a, entries_b):
+    entries_a = sorted(entries_a, key=lambda entry: entry[1][0])
+    entries_b = sorted(entries_b, key=lambda entry: entry[1][0])
+    pairs = []
+    i = j = 0
+
+    while i < len(entries_a) and j < len(entries_b):
+        if entries_a[i][1][0] <= entries_b[j][1][0]:
+            entry = entries_a[i]
+            x_high, y_low, y_high = entry[1][1], entry[1][2], entry[1][3]
+            k = j
+
+            while k < len(entries_b) and entries_b[k][1][0] <= x_high:
+                mbr = entries_b[k][1]
+
+                if mbr[2] <= y_high and mbr[3] >= y_low:
+                    pairs.append((entry, entries_b[k]))
+
+                k += 1
+
+            i += 1
+
+        else:
+            entry = entries_b[j]
+            x_high, y_low, y_high = entry[1][1], entry[1][2], entry[1][3]
+            k = i
+
+            while k < len(entries_a) and entries_a[k][1][0] <= x_high:
+                mbr = entries_a[k][1]
+
+                if mbr[2] <= y_high and mbr[3] >= y_low:
+                    pairs.append((entries_a[k], entry))
+
+                k += 1
+
+            j += 1
+
+    return pairs
+
+
+
+# Synchronized depth-first traversal of two trees from the given node pairs (node_a, mbr_a, node_b, mbr_b)
+# Only the entries that intersect the common area of the two nodes take part in the plane sweep;
+# when the trees have different heights, the deeper tree is descended alone until the levels meet
+# Returns the (object id of tree A, object id of tree B) pairs whose MBRs intersect
+def join_nodes(tree_a, tree_b, node_pairs):
+    stack = list(node_pairs)
+    results = []
+
+    while stack:
+        node_a, mbr_a, node_b, mbr_b = stack.pop()
+        a = tree_a[node_a]
+        b = tree_b[node_b]
+        common = mbr_intersection(mbr_a, mbr_b)
+
+        # A leaf of tree A meets a non-leaf node of tree B: descend tree B only
+        if not a["isnonleaf"] and b["isnonleaf"]:
+            for entry_id, entry_mbr in b["entries"]:
+                if mbr_intersects(entry_mbr, common):
+                    stack.append((node_a, mbr_a, entry_id, entry_mbr))
+
+            continue
+
+        if a["isnonleaf"] and not b["isnonleaf"]:
+            for entry_id, entry_mbr in a["entries"]:
+                if mbr_intersects(entry_mbr, common):
+                    stack.append((entry_id, entry_mbr, node_b, mbr_b))
+
+            continue
+
+        entries_a = [entry for entry in a["entries"] if mbr_intersects(entry[1], common)]
+        entries_b = [entry for entry in b["entries"] if mbr_intersects(entry[1], common)]
+        pairs = sweep_pairs(entries_a, entries_b)
+
+        if a["isnonleaf"]:
+            stack.extend((entry_a[0], entry_a[1], entry_b[0], entry_b[1]) for entry_a, entry_b in pairs)
+
+        else:
+            results.extend((entry_a[0], entry_b[0]) for entry_a, entry_b in pairs)
+
+    return results
+
+
+
+# Returns the root pair of the join, or no pair when the two trees do not overlap at all
+def root_pairs(tree_a, tree_b):
+    root_a, root_b = root_of(tree_a), root_of(tree_b)
+    mbr_a = compute_mbr_union([mbr for _, mbr in tree_a[root_a]["entries"]])
+    mbr_b = compute_mbr_union([mbr for _, mbr in tree_b[root_b]["entries"]])
+    return [(root_a, mbr_a, root_b, mbr_b)] if mbr_intersects(mbr_a, mbr_b) else []
+
+
+
+# Expands the top node pairs level by level until there are at least count pairs (or the leaves are reached)
+def top_pairs(tree_a, tree_b, count):
+    pairs = root_pairs(tree_a, tree_b)
+
+    while 0 < len(pairs) < count:
+        expanded = []
+
+        for node_a, mbr_a, node_b, mbr_b in pairs:
+            a = tree_a[node_a]
+            b = tree_b[node_b]
+
+            # Leaf pairs cannot be split further
+            if not a["isnonleaf"] and not b["isnonleaf"]:
+                return pairs
+
+            entries_a = a["entries"] if a["isnonleaf"] else [(node_a, mbr_a)]
+            entries_b = b["entries"] if b["isnonleaf"] else [(node_b, mbr_b)]
+            common = mbr_intersection(mbr_a, mbr_b)
+            expanded.extend(
+                (entry_a[0], entry_a[1], entry_b[0], entry_b[1])
+                for entry_a, entry_b in sweep_pairs(
+                    [entry for entry in entries_a if mbr_intersects(entry[1], common)],
+                    [entry for entry in entries_b if mbr_intersects(entry[1], common)],
+                )
+            )
+
+        pairs = expanded
+
+    return pairs
+
+
+
+# Joins one partition of node pairs (executed in a worker process)
+def join_partition(file_a, file_b, node_pairs):
+    for path in (file_a, file_b):
+        if path not in open_trees:
+            open_trees[path] = load_rtree(path)
+
+    return join_nodes(open_trees[file_a], open_trees[file_b], node_pairs)
+
+
+
+# Spatial join of two R-tree files: returns the sorted (object id of A, object id of B) pairs with intersecting MBRs
+# With several workers the top node pairs are split round-robin into partitions joined by separate processes
+def spatial_join(file_a, file_b, workers=1):
+    tree_a = load_rtree(file_a)
+    tree_b = load_rtree(file_b)
+
+    if workers <= 1:
+        results = join_nodes(tree_a, tree_b, root_pairs(tree_a, tree_b))
+
+    else:
+        pairs = top_pairs(tree_a, tree_b, workers * PAIRS_PER_WORKER)
+        partitions = [pairs[i::workers * PAIRS_PER_WORKER] for i in range(workers * PAIRS_PER_WORKER)]
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(join_partition, file_a, file_b, partition) for partition in partitions if partition]
+            results = [pair for future in futures for pair in future.result()]
+
+    results.sort()
+    return results
+
+
+
+# MAIN function
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--workers=")]
+    workers = [int(arg.split("=", 1)[1]) for arg in sys.argv[1:] if arg.startswith("--workers=")]
+
+    if len(args) != 2:
+        print("Usage: python spatial_join.py RtreeA.txt RtreeB.txt [--workers=N]")
+        sys.exit()
+
+    start = time.perf_counter()
+    pairs = spatial_join(args[0], args[1], workers[-1] if workers else 1)
+
+    for id_a, id_b in pairs:
+        print(f"{id_a},{id_b}")
+
+    print(f"{len(pairs)} pairs in {time.perf_counter() - start:.2f} s", file=sys.stderr)
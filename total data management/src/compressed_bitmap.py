@@ -0,0 +1,135 @@
+# Author: Gkovaris Christos-Grigorios
+
+
+
+import base64
+import numpy as np
+
+
+
+# Values are split into a 16-bit key (the high bits) and a container holding their low 16 bits
+CONTAINER_BITS = 16
+CONTAINER_MASK = (1 << CONTAINER_BITS) - 1
+
+# Containers with up to this many values are sorted uint16 arrays, larger ones are bitmaps
+# (4096 values take 8 KB either way)
+ARRAY_LIMIT = 4096
+
+
+
+# Returns the sorted low values (uint16) set in the words of a bitmap container
+def bitmap_positions(words):
+    return np.flatnonzero(np.unpackbits(words.astype('<u8').view(np.uint8), bitorder='little')).astype(np.uint16)
+
+
+
+# Returns the words of a bitmap container with the given low values set
+def positions_bitmap(values):
+    bits = np.zeros(1 << CONTAINER_BITS, dtype=bool)
+    bits[values] = True
+    return np.packbits(bits, bitorder='little').view('<u8').astype(np.uint64)
+
+
+
+# Returns the container of a sorted array of low values: (kind, data, cardinality)
+# where kind is "a" for an array container and "b" for a bitmap container
+def make_container(values):
+    if len(values) > ARRAY_LIMIT:
+        return ("b", positions_bitmap(values), len(values))
+
+    return ("a", values.astype(np.uint16), len(values))
+
+
+
+# Intersects two containers of the same key
+def intersect_containers(c1, c2):
+    if c1[0] == "a" and c2[0] == "a":
+        return make_container(np.intersect1d(c1[1], c2[1], assume_unique=True))
+
+    # An array against a bitmap keeps the array values whose bit is set
+    if c1[0] == "a" or c2[0] == "a":
+        values, words = (c1[1], c2[1]) if c1[0] == "a" else (c2[1], c1[1])
+        keep = (words[values >> 6] >> (values & 63).astype(np.uint64)) & np.uint64(1)
+        return make_container(values[keep.astype(bool)])
+
+    return make_container(bitmap_positions(c1[1] & c2[1]))
+
+
+
+# Roaring-style compressed bitmap of non-negative integers (transaction ids)
+# The values are grouped by key; every non-empty group is a NumPy container, an array while it is sparse
+# and a bitmap once it is dense, so the size follows the number of values and not the largest one
+class CompressedBitmap:
+    def __init__(self, containers=None):
+        self.containers = containers or {}
+        self.count = sum(container[2] for container in self.containers.values())
+
+    # Builds a bitmap from sorted, distinct values
+    @classmethod
+    def from_sorted(cls, values):
+        values = np.asarray(values, dtype=np.int64)
+        keys = values >> CONTAINER_BITS
+        bounds = np.flatnonzero(np.diff(keys)) + 1
+        containers = {}
+
+        for part in np.split(values, bounds):
+            if len(part):
+                containers[int(part[0] >> CONTAINER_BITS)] = make_container(part & CONTAINER_MASK)
+
+        return cls(containers)
+
+    def __len__(self):
+        return self.count
+
+    # Intersection: only the keys present in both bitmaps are visited
+    def __and__(self, other):
+        small, large = (self, other) if len(self.containers) <= len(other.containers) else (other, self)
+        containers = {}
+
+        for key, container in small.containers.items():
+            if key in large.containers:
+                result = intersect_containers(container, large.containers[key])
+
+                if result[2]:
+                    containers[key] = result
+
+        return CompressedBitmap(containers)
+
+    # Returns the values in increasing order as an int64 array
+    def to_array(self):
+        parts = []
+
+        for key in sorted(self.containers):
+            kind, data, _ = self.containers[key]
+            low = data if kind == "a" else bitmap_positions(data)
+            parts.append((key << CONTAINER_BITS) | low.astype(np.int64))
+
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+
+    def __iter__(self):
+        return iter(self.to_array().tolist())
+
+    # Text form: one "key:kind:base64" group per container, the base64 holding the little-endian
+    # uint16 values of an array container or the uint64 words of a bitmap container
+    def serialize(self):
+        groups = []
+
+        for key in sorted(self.containers):
+            kind, data, _ = self.containers[key]
+            raw = data.astype('<u2' if kind == "a" else '<u8').tobytes()
+            groups.append(f"{key}:{kind}:{base64.b64encode(raw).decode('ascii')}")
+
+        return " ".join(groups)
+
+    @classmethod
+    def deserialize(cls, text):
+        containers = {}
+
+        for group in text.split():
+            key, kind, payload = group.split(":")
+            data = np.frombuffer(base64.b64decode(payload), dtype='<u2' if kind == "a" else '<u8')
+            data = data.astype(np.uint16 if kind == "a" else np.uint64)
+            count = len(data) if kind == "a" else len(bitmap_positions(data))
+            containers[int(key)] = (kind, data, count)
+
+        return cls(containers)
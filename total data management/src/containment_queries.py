@@ -5,6 +5,19 @@
 import sys
 import time
 import ast
+import math
+import numpy as np
+from compressed_bitmap import CompressedBitmap
+from posting_lists import PostingList, intersect_postings
+
+
+
+# Default width in bits of the hashed signatures (a multiple of 64)
+DEFAULT_SIGNATURE_BITS = 128
+
+# Constants of the splitmix64 mixing function used to hash items
+HASH_GAMMA = 0x9E3779B97F4A7C15
+HASH_MIX = (0xBF58476D1CE4E5B9, 0x94D049BB133111EB)
 
 
 
@@ -50,40 +63,134 @@ def search_signature(index, pattern):
 
 
 
-# Creates a bitslice index: each item maps to a bitmap indicating presence across transactions
+# Returns the bit positions (uint64 array of shape (len(items), hashes)) each item sets in a signature of the given width
+def item_positions(items, bits, hashes):
+    items = np.asarray(items, dtype=np.int64).astype(np.uint64)[:, None]
+    
+    # splitmix64 of (item, hash function) with wrapping 64-bit arithmetic, so the positions of different items are independent
+    z = (items * np.uint64(hashes) + np.arange(hashes, dtype=np.uint64) + np.uint64(1)) * np.uint64(HASH_GAMMA)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(HASH_MIX[0])
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(HASH_MIX[1])
+    return (z ^ (z >> np.uint64(31))) % np.uint64(bits)
+
+
+
+# Returns the signature (uint64 words) of a set of items
+def item_signature(items, bits, hashes):
+    words = np.zeros(bits // 64, dtype=np.uint64)
+    
+    if items:
+        positions = item_positions(sorted(items), bits, hashes).ravel()
+        np.bitwise_or.at(words, positions >> np.uint64(6), np.uint64(1) << (positions & np.uint64(63)))
+    
+    return words
+
+
+
+# Creates a fixed-width signature file with superimposed coding: every item sets `hashes` bits chosen by hashing,
+# and a transaction's signature is the OR of the codes of its items, stored as one row of a uint64 matrix
+# The default number of hash functions, bits * ln 2 / average transaction size, leaves about half the bits set
+def make_hashed_signature_index(data, bits=DEFAULT_SIGNATURE_BITS, hashes=None):
+    if bits <= 0 or bits % 64:
+        raise ValueError(f"the signature width must be a positive multiple of 64, not {bits}")
+    
+    if hashes is None:
+        average = sum(len(entry) for entry in data) / max(len(data), 1)
+        hashes = max(1, round(bits * math.log(2) / max(average, 1)))
+    
+    tids = np.repeat(np.arange(len(data)), [len(entry) for entry in data])
+    items = [item for entry in data for item in entry]
+    matrix = np.zeros((len(data), bits // 64), dtype=np.uint64)
+    
+    if items:
+        positions = item_positions(items, bits, hashes)
+        rows = np.repeat(tids, hashes)
+        positions = positions.ravel()
+        np.bitwise_or.at(matrix, (rows, positions >> np.uint64(6)), np.uint64(1) << (positions & np.uint64(63)))
+    
+    # Saves the signature matrix to a file
+    np.save("hsigfile.npy", matrix)
+    
+    return matrix, bits, hashes, data
+
+
+
+# Scans all signatures at once for the bits of the query signature, then verifies the candidates against
+# the transactions to remove the false drops (signatures that match although the transaction does not)
+# When a list is given, appends (candidates, matches, false drops, false-drop rate) of the query to it;
+# the false-drop rate is the fraction of non-matching transactions that passed the signature test
+def search_hashed_signature(index, pattern, drops=None):
+    matrix, bits, hashes, data = index
+    query_mask = item_signature(pattern, bits, hashes)
+    candidates = np.flatnonzero(((matrix & query_mask) == query_mask).all(axis=1))
+    matches = {tid for tid in candidates.tolist() if pattern <= data[tid]}
+    
+    if drops is not None:
+        false_drops = len(candidates) - len(matches)
+        rejected = len(data) - len(matches)
+        drops.append((len(candidates), len(matches), false_drops, false_drops / rejected if rejected else 0.0))
+    
+    return matches
+
+
+
+# Creates a bitslice index: each item maps to a compressed bitmap indicating presence across transactions
 def make_bitslice_index(data):
-    index = dict()
+    tids = dict()
     
+    # Transaction IDs are appended in increasing order, so every list is already sorted
     for i in range(len(data)):
         for token in data[i]:
-            index[token] = index.get(token, 0) | (1 << i)
+            tids.setdefault(token, []).append(i)
+    
+    index = {token: CompressedBitmap.from_sorted(tids[token]) for token in tids}
     
-    # Saves the bitslice index to a file
+    # Saves the bitslice index to a file, one compressed bitmap per item
     with open("bitslice.txt", "w") as output:
         for token in sorted(index):
-            output.write(f"{token}: {index[token]}\n")
+            output.write(f"{token}: {index[token].serialize()}\n")
     
     return index
 
 
 
-# Starts with a bitmap with all bits set (assuming all transactions match)
+# Reads a bitslice index saved by make_bitslice_index
+def load_bitslice_index(filepath):
+    with open(filepath, 'r') as file:
+        return {int(token): CompressedBitmap.deserialize(bitmap) for token, bitmap in (line.split(":", 1) for line in file if line.strip())}
+
+
+
+# ANDs the bitmaps of all pattern items, the sparsest first so intermediate results stay small
 def search_bitslice(index, pattern, total):
-    bitmap = (1 << total) - 1
+    # An empty pattern is contained in every transaction
+    if not pattern:
+        return set(range(total))
+    
+    bitmaps = []
     
-    # ANDs the bitmaps of all pattern items to find common transactions
     for item in pattern:
         if item not in index:
             return set()
         
-        bitmap &= index[item]
+        bitmaps.append(index[item])
     
-    # Returns transaction IDs (indices) for which the resulting bit is still set
-    return {i for i in range(total) if bitmap & (1 << i)}
+    bitmaps.sort(key=len)
+    bitmap = bitmaps[0]
+    
+    for other in bitmaps[1:]:
+        if not bitmap:
+            break
+        
+        bitmap &= other
+    
+    # Returns transaction IDs (indices) whose bit is still set
+    return set(bitmap)
 
 
 
-# Builds inverted index: each item maps to list of transaction IDs where it appears
+# Builds inverted index: each item maps to the sorted list of transaction IDs where it appears,
+# kept as a compressed posting list
 def make_inverted_index(data):
     inverted = dict()
     
@@ -96,12 +203,19 @@ def make_inverted_index(data):
         for key in sorted(inverted):
             output.write(f"{key}: {sorted(inverted[key])}\n")
     
-    return inverted
+    # Transaction IDs are appended in increasing order, so every list is already sorted
+    return {key: PostingList(inverted[key]) for key in inverted}
 
 
 
-# Computes the intersection of multiple lists (as sets)
+# Computes the intersection of multiple sorted posting lists, shortest first with galloping search
 def intersect_sorted(lists):
+    return intersect_postings(lists)
+
+
+
+# Computes the intersection of multiple lists (as sets), kept as the baseline of posting_lists.py
+def intersect_sets(lists):
     if not lists:
         return set()
     
@@ -119,20 +233,22 @@ def search_inverted(index, pattern):
     involved = []
     for token in pattern:
         if token not in index:
-            return set()
+            return []
         
         involved.append(index[token])
     
-    # Returns intersection of posting lists
+    # Returns the sorted intersection of the posting lists
     return intersect_sorted(involved)
 
 
 
 # Label and function mapping for method IDs
-def dispatch(method_id, trans, queries, query_idx):
-    label = ["Naive", "Signature", "Bitslice", "Inverted"]
-    method = [naive_search, search_signature, search_bitslice, search_inverted]
-    builder = [None, make_signature_index, make_bitslice_index, make_inverted_index]
+def dispatch(method_id, trans, queries, query_idx, bits=DEFAULT_SIGNATURE_BITS, hashes=None):
+    label = ["Naive", "Signature", "Bitslice", "Inverted", "Hashed Signature"]
+    method = [naive_search, search_signature, search_bitslice, search_inverted, search_hashed_signature]
+    builder = [None, make_signature_index, make_bitslice_index, make_inverted_index,
+               lambda data: make_hashed_signature_index(data, bits, hashes)]
+    drops = []
 
     obj = None
     
@@ -148,6 +264,9 @@ def dispatch(method_id, trans, queries, query_idx):
         elif method_id == 2:
             return method[method_id](obj, q, len(trans))
         
+        elif method_id == 4:
+            return method[method_id](obj, q, drops)
+        
         else:
             return method[method_id](obj, q)
 
@@ -165,20 +284,33 @@ def dispatch(method_id, trans, queries, query_idx):
     
     end = time.time()
     print(f"{label[method_id]} Method computation time = {end - start:.4f} seconds")
+    
+    # Reports the false drops of the hashed signature file per query
+    if method_id == 4:
+        print(f"{obj[1]}-bit signatures, {obj[2]} hash functions per item")
+        
+        for i, (candidates, matches, false_drops, rate) in zip(range(len(queries)) if query_idx == -1 else [query_idx], drops):
+            print(f"Query {i}: candidates {candidates}, matches {matches}, false drops {false_drops}, false-drop rate {rate:.6f}")
 
 
 
 if __name__ == "__main__":
+    # Options of the hashed signature file: --bits=WIDTH and --hashes=K
+    options = {arg.split("=", 1)[0]: int(arg.split("=", 1)[1]) for arg in sys.argv[1:] if arg.startswith("--")}
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+
     # Expects exactly 4 command-line arguments
-    if len(sys.argv) != 5:
-        print("Usage: python containment_queries.py <transactions_file> <queries_file> <query_id> <method>")
+    if len(args) != 4 or set(options) - {"--bits", "--hashes"}:
+        print("Usage: python containment_queries.py <transactions_file> <queries_file> <query_id> <method> [--bits=WIDTH] [--hashes=K]")
         sys.exit(1)
 
     # Parse command-line arguments
-    transactions_file = sys.argv[1]
-    queries_file = sys.argv[2]
-    query_id = int(sys.argv[3])
-    method_id = int(sys.argv[4])
+    transactions_file = args[0]
+    queries_file = args[1]
+    query_id = int(args[2])
+    method_id = int(args[3])
+    bits = options.get("--bits", DEFAULT_SIGNATURE_BITS)
+    hashes = options.get("--hashes")
 
     # Load data
     transactions = load_data(transactions_file)
@@ -186,8 +318,8 @@ if __name__ == "__main__":
 
     # Execute requested method(s)
     if method_id == -1:
-        for m in range(4):
-            dispatch(m, transactions, queries, query_id)
+        for m in range(5):
+            dispatch(m, transactions, queries, query_id, bits, hashes)
     
     else:
-        dispatch(method_id, transactions, queries, query_id)
\ No newline at end of file
+        dispatch(method_id, transactions, queries, query_id, bits, hashes)
\ No newline at end of file
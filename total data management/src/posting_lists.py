@@ -0,0 +1,155 @@
+# Author: Gkovaris Christos-Grigorios
+
+
+
+import sys
+import time
+import numpy as np
+
+
+
+# Number of transaction IDs per compressed block (one skip pointer per block)
+BLOCK_SIZE = 128
+
+
+
+# Sorted posting list compressed in blocks of BLOCK_SIZE transaction IDs (frame of reference)
+# The skip table keeps the first and last ID of every block as uint32 (the IDs are transaction numbers); the IDs themselves
+# are stored as the gaps from the previous ID of their block (0 for the first), in the narrowest unsigned type that holds the largest gap
+# (1 byte per ID for the frequent items), so a search decodes only the blocks whose range can hold its IDs
+class PostingList:
+    def __init__(self, tids):
+        tids = np.asarray(tids, dtype=np.int64)
+        self.count = len(tids)
+        self.firsts = tids[::BLOCK_SIZE].astype(np.uint32)
+        self.lasts = tids[np.minimum(np.arange(BLOCK_SIZE - 1, self.count + BLOCK_SIZE - 1, BLOCK_SIZE), self.count - 1)].astype(np.uint32)
+        gaps = np.diff(tids, prepend=tids[:1])
+        gaps[::BLOCK_SIZE] = 0
+        largest = int(gaps.max()) if self.count else 0
+        self.gaps = gaps.astype(np.uint8 if largest < 1 << 8 else np.uint16 if largest < 1 << 16 else np.uint32)
+
+    def __len__(self):
+        return self.count
+
+    # Returns the sorted IDs of the given blocks (an increasing array of block numbers) as an int64 array
+    # The gaps are summed up over all the blocks at once, then every block is shifted to start from its first ID
+    def decode(self, blocks):
+        sizes = np.minimum(BLOCK_SIZE, self.count - blocks * BLOCK_SIZE)
+        heads = np.cumsum(sizes) - sizes
+        values = np.cumsum(self.gaps[np.arange(sizes.sum()) + np.repeat(blocks * BLOCK_SIZE - heads, sizes)], dtype=np.int64)
+        return values + np.repeat(self.firsts[blocks] - values[heads], sizes)
+
+    # Returns all IDs in increasing order as an int64 array
+    def to_array(self):
+        if not self.count:
+            return np.zeros(0, dtype=np.int64)
+
+        values = np.cumsum(self.gaps, dtype=np.int64)
+        sizes = np.minimum(BLOCK_SIZE, self.count - np.arange(len(self.firsts)) * BLOCK_SIZE)
+        return values + np.repeat(self.firsts - values[::BLOCK_SIZE], sizes)
+
+    # Size of the compressed list in bytes (gaps and skip table)
+    def nbytes(self):
+        return self.gaps.nbytes + self.firsts.nbytes + self.lasts.nbytes
+
+
+
+# Keeps the sorted candidates (int64 array) that appear in a posting list
+# The skip table is searched for the block of every candidate, so only the blocks whose ID range holds a candidate
+# are decoded (a per-candidate galloping search in Python costs more than decoding the blocks with NumPy)
+def intersect_with(candidates, postings):
+    # Block of every candidate: the first block whose last ID is not smaller, if the candidate is not before its first ID
+    blocks = np.searchsorted(postings.lasts, candidates)
+    inside = blocks < len(postings.lasts)
+    inside[inside] = postings.firsts[blocks[inside]] <= candidates[inside]
+
+    if not inside.any():
+        return candidates[:0]
+
+    # The candidates are sorted, so their blocks are too: the distinct blocks are where the number changes
+    blocks = blocks[inside]
+    blocks = blocks[np.flatnonzero(np.diff(blocks, prepend=-1))]
+    values = postings.to_array() if len(blocks) == len(postings.lasts) else postings.decode(blocks)
+
+    # Both arrays are sorted: a candidate is kept when it is found at its insertion point
+    positions = np.minimum(np.searchsorted(values, candidates), len(values) - 1)
+    return candidates[values[positions] == candidates]
+
+
+
+# Intersects compressed posting lists, the shortest first so the candidates only shrink, and returns the sorted common IDs
+def intersect_postings(lists):
+    if not lists:
+        return []
+
+    lists = sorted(lists, key=len)
+    result = lists[0].to_array()
+
+    for postings in lists[1:]:
+        if not len(result):
+            break
+
+        result = intersect_with(result, postings)
+
+    return result.tolist()
+
+
+
+# Times every query of a workload with a search function and returns the elapsed seconds
+def timed(search, index, queries, repeat):
+    start = time.perf_counter()
+
+    for _ in range(repeat):
+        for q in queries:
+            search(index, q)
+
+    return time.perf_counter() - start
+
+
+
+# Compares the set-based intersection of plain posting lists with the compressed posting lists
+def benchmark(transactions_file, queries_file, repeat):
+    from containment_queries import load_data, intersect_sets
+
+    data = load_data(transactions_file)
+    queries = load_data(queries_file)
+    plain = dict()
+
+    for i in range(len(data)):
+        for val in data[i]:
+            plain.setdefault(val, []).append(i)
+
+    compressed = {key: PostingList(tids) for key, tids in plain.items()}
+
+    def search_sets(index, pattern):
+        if any(token not in index for token in pattern):
+            return set()
+
+        return intersect_sets([index[token] for token in pattern])
+
+    def search_postings(index, pattern):
+        if any(token not in index for token in pattern):
+            return []
+
+        return intersect_postings([index[token] for token in pattern])
+
+    # Both approaches must return the same transactions
+    for q in queries:
+        assert search_postings(compressed, q) == sorted(search_sets(plain, q))
+
+    tids = sum(len(tids) for tids in plain.values())
+    print(f"{'posting entries:':<34} {tids}")
+    print(f"{'uncompressed (4-byte IDs):':<34} {4 * tids} bytes")
+    print(f"{'compressed (gap blocks):':<34} {sum(p.nbytes() for p in compressed.values())} bytes")
+    print(f"{'set intersection:':<34} {timed(search_sets, plain, queries, repeat):.4f} s")
+    print(f"{'skip-pointer intersection:':<34} {timed(search_postings, compressed, queries, repeat):.4f} s")
+    print(f"{'sorted output (set + sort):':<34} {timed(lambda index, q: sorted(search_sets(index, q)), plain, queries, repeat):.4f} s")
+
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (3, 4):
+        print("Usage: python posting_lists.py <transactions_file> <queries_file> [repeat]")
+        sys.exit(1)
+
+    benchmark(sys.argv[1], sys.argv[2], int(sys.argv[3]) if len(sys.argv) == 4 else 10)